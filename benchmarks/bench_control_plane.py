@@ -0,0 +1,92 @@
+"""Cost of connecting engines through master.json versus control files.
+
+For every engine, the map writes a connect command and then every engine
+checks for its command once, as in the polling loop of EvalEngine:
+- master.json: the map reads and rewrites the whole file for every engine,
+  and every engine parses the whole file, O(engines^2) bytes in total
+- control files: the map atomically replaces the file of one engine, and
+  every engine only parses its own file, when it changed
+"""
+
+import sys
+import json
+import time
+import pathlib
+import argparse
+import tempfile
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+import tools.control
+
+
+def get_task(engine_index):
+    return {
+        "command": "connect",
+        "payload": {"master_host": "localhost", "master_port": engine_index},
+    }
+
+
+def bench_master_file(control_dir, engine_ids):
+    master_file_path = control_dir / "master.json"
+    master_file_path.write_text(json.dumps({"engines": {}}, indent=4))
+
+    start = time.perf_counter()
+    for engine_index, engine_id in enumerate(engine_ids):
+        master_dict = json.loads(master_file_path.read_text())
+        master_dict["engines"][engine_id] = {"task": get_task(engine_index)}
+        master_file_path.write_text(json.dumps(master_dict, indent=4))
+
+        # Every engine wakes up on the change and parses the whole file
+        for other_engine_id in engine_ids:
+            master_dict = json.loads(master_file_path.read_text())
+            master_dict["engines"].get(other_engine_id)
+
+    return time.perf_counter() - start
+
+
+def bench_control_files(control_dir, engine_ids):
+    readers = [
+        tools.control.JsonFileReader(
+            tools.control.get_control_file_path(control_dir, engine_id)
+        )
+        for engine_id in engine_ids
+    ]
+
+    start = time.perf_counter()
+    for engine_index, engine_id in enumerate(engine_ids):
+        tools.control.write_json_atomic(
+            tools.control.get_control_file_path(control_dir, engine_id),
+            {"id": engine_id, "version": 1, "task": get_task(engine_index)},
+        )
+
+        # Every engine wakes up on the change, only one parses its file
+        for reader in readers:
+            reader.read()
+
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--engines", type=int, nargs="+", default=[10, 50, 200]
+    )
+    args = parser.parse_args()
+
+    for n_engines in args.engines:
+        engine_ids = [f"engine-{index:08d}" for index in range(n_engines)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            master_time = bench_master_file(pathlib.Path(tmp_dir), engine_ids)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            control_time = bench_control_files(
+                pathlib.Path(tmp_dir), engine_ids
+            )
+        print(
+            f"{n_engines:>5} engines: master.json {1e3 * master_time:9.2f} ms"
+            f"  control files {1e3 * control_time:9.2f} ms  "
+            f"({master_time / control_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""Throughput of the map, engines and caller running together on localhost.
+
+The map, a number of EvalEngines and an oSparcFileMap caller talk over
+their files and transmitters as in a deployment, in a temporary
+directory. The engines run a stand-in for the evaluation that sleeps for
+a duration drawn from a distribution, seeded with the parameters, instead
+of simulating. The caller streams generations of random parameter sets
+and the benchmark reports:
+- tasks/s: tasks evaluated per second of wall time
+- overhead: worker time that isn't spent evaluating, per task
+- p50 and p99 latency: from submitting a generation to receiving a result
+- utilisation: fraction of the worker time spent evaluating
+
+The same generations are then evaluated by the stand-in in a local
+process pool with as many workers as the engines, which is the reference
+the results are divided by. With --baseline, those ratios are compared to
+the ones saved in that file by --save-baseline, and the exit status is 1
+if any got worse by more than --tolerance. As the reference is measured
+in the same run, the ratios don't depend on the speed of the machine.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import pathlib
+import logging
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent / "map"))
+sys.path.append(
+    str(pathlib.Path(__file__).resolve().parent.parent / "evaluator")
+)
+import tools.maps
+import tools.schema
+
+logging.disable(logging.INFO)
+
+# Evaluation time distribution of the stand-in, set before the engines are
+# forked
+distribution = "exponential"
+mean_duration = 0.02  # seconds
+# Results where lower is better, of the others higher is better
+LOWER_IS_BETTER = ["overhead_ms", "latency_p50_ms", "latency_p99_ms"]
+
+
+def get_duration(params):
+    """Evaluation time of params, the same in every process."""
+
+    rng = random.Random(repr(sorted(params.items())))
+    if distribution == "constant":
+        return mean_duration
+    elif distribution == "exponential":
+        return rng.expovariate(1.0 / mean_duration)
+    elif distribution == "lognormal":
+        # sigma 1, with the mean of the distribution at mean_duration
+        return rng.lognormvariate(math.log(mean_duration) - 0.5, 1.0)
+    else:
+        raise ValueError(f"Unknown distribution: {distribution}")
+
+
+def run_fake_batch(input_params_list, record=False, profile_path=None):
+    """Stand-in for evaluator.run_worker_timed_batch."""
+
+    results = []
+    for input_params in input_params_list:
+        start = time.perf_counter()
+        time.sleep(get_duration(input_params))
+        duration = time.perf_counter() - start
+
+        objs = dict.fromkeys(tools.schema.DEFAULT_OBJECTIVE_NAMES, duration)
+        results.append((objs, duration, None))
+
+    return results
+
+
+def run_map(root_dir):
+    os.environ["DY_SIDECAR_PATH_INPUTS"] = str(root_dir / "map_inputs")
+    os.environ["DY_SIDECAR_PATH_OUTPUTS"] = str(root_dir / "map_outputs")
+
+    import main
+
+    main.oSparcMap().start()
+
+
+def run_engine(root_dir, engine_index, n_workers):
+    os.environ["DY_SIDECAR_PATH_INPUTS"] = str(
+        root_dir / f"engine{engine_index}_inputs"
+    )
+    os.environ["DY_SIDECAR_PATH_OUTPUTS"] = str(
+        root_dir / f"engine{engine_index}_outputs"
+    )
+
+    import evaluator
+
+    engine = evaluator.EvalEngine(
+        f"evaluator{engine_index}",
+        n_workers=n_workers,
+        worker_initializer=None,
+        worker_function=run_fake_batch,
+    )
+    engine.start()
+
+
+def create_dirs(root_dir, n_engines):
+    """Lay out the directories like the Makefile, with the outputs of every
+    service linked to the inputs of the services it talks to."""
+
+    for dir_path in [
+        "map_inputs/input_2",
+        "map_outputs/output_1",
+        "map_outputs/output_2",
+    ]:
+        (root_dir / dir_path).mkdir(parents=True)
+
+    for engine_index in range(1, n_engines + 1):
+        outputs_dir = root_dir / f"engine{engine_index}_outputs" / "output_1"
+        outputs_dir.mkdir(parents=True)
+        (root_dir / f"engine{engine_index}_inputs").mkdir()
+        (root_dir / f"engine{engine_index}_inputs" / "input_2").symlink_to(
+            root_dir / "map_outputs" / "output_1"
+        )
+        (root_dir / "map_inputs" / f"input_{engine_index + 2}").symlink_to(
+            outputs_dir
+        )
+
+
+def run_generation(caller, rng, n_tasks):
+    """Return the latencies and the evaluation times of the tasks."""
+
+    params_set = [[rng.random(), rng.random()] for _ in range(n_tasks)]
+    start = time.perf_counter()
+    latencies = [
+        time.perf_counter() - start for _ in caller.evaluate_iter(params_set)
+    ]
+    durations = [
+        get_duration(caller.schema.get_params(params)) for params in params_set
+    ]
+
+    return latencies, durations
+
+
+def run_pool_generation(pool, schema, rng, n_tasks):
+    """Return the latencies and the evaluation times of the tasks, evaluated
+    by a process pool."""
+
+    params_set = [
+        [schema.get_params([rng.random(), rng.random()])]
+        for _ in range(n_tasks)
+    ]
+    start = time.perf_counter()
+    latencies = [
+        time.perf_counter() - start
+        for _ in pool.imap_unordered(run_fake_batch, params_set)
+    ]
+    durations = [get_duration(params) for (params,) in params_set]
+
+    return latencies, durations
+
+
+def get_percentile(values, percentile):
+    values = sorted(values)
+
+    return values[min(len(values) - 1, int(percentile / 100 * len(values)))]
+
+
+def bench_e2e(n_engines, n_workers, n_tasks, n_generations):
+    for name in ["map", "optimizer"] + [
+        f"evaluator{engine_index}" for engine_index in range(1, n_engines + 1)
+    ]:
+        os.environ[f"OSPARC_{name.upper()}_HOSTNAME"] = "localhost"
+    os.environ["OSPARC_MAP_CACHE_SIZE"] = "0"
+    os.environ["OSPARC_MAP_STORE_FILE"] = ""
+
+    context = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root_dir = pathlib.Path(tmp_dir)
+        create_dirs(root_dir, n_engines)
+
+        # Forked before the caller starts its threads, the engines can't
+        # be daemons since they start process pools
+        processes = [context.Process(target=run_map, args=(root_dir,))] + [
+            context.Process(
+                target=run_engine, args=(root_dir, engine_index, n_workers)
+            )
+            for engine_index in range(1, n_engines + 1)
+        ]
+        for process in processes:
+            process.start()
+
+        try:
+            caller = tools.maps.oSparcFileMap(
+                root_dir / "map_outputs" / "output_2" / "map.json",
+                root_dir / "map_inputs" / "input_2" / "caller.json",
+            )
+            rng = random.Random(1)
+
+            # Waits for the engines to connect and lets the map learn the
+            # evaluation times
+            run_generation(caller, rng, n_tasks)
+
+            results = measure_generations(
+                lambda: run_generation(caller, rng, n_tasks),
+                n_generations,
+                n_engines * n_workers,
+            )
+
+            del caller
+        finally:
+            for process in processes:
+                process.join(timeout=30)
+                if process.is_alive():
+                    process.terminate()
+
+    return results
+
+
+def bench_reference(n_engines, n_workers, n_tasks, n_generations):
+    """The results of bench_e2e for the same generations, evaluated by the
+    stand-in in a local process pool with as many workers as the
+    engines."""
+
+    schema = tools.schema.Schema()
+    rng = random.Random(1)
+    with multiprocessing.get_context("fork").Pool(
+        n_engines * n_workers
+    ) as pool:
+        # As bench_e2e, which uses the first generation to warm up
+        run_pool_generation(pool, schema, rng, n_tasks)
+
+        return measure_generations(
+            lambda: run_pool_generation(pool, schema, rng, n_tasks),
+            n_generations,
+            n_engines * n_workers,
+        )
+
+
+def measure_generations(run, n_generations, n_workers):
+    """Results of n_generations run by run, which returns the latencies and
+    evaluation times of a generation."""
+
+    latencies = []
+    durations = []
+    start = time.perf_counter()
+    for _ in range(n_generations):
+        generation_latencies, generation_durations = run()
+        latencies.extend(generation_latencies)
+        durations.extend(generation_durations)
+    elapsed = time.perf_counter() - start
+
+    worker_time = n_workers * elapsed
+
+    return {
+        "tasks_per_second": len(latencies) / elapsed,
+        "overhead_ms": 1e3 * (worker_time - sum(durations)) / len(latencies),
+        "latency_p50_ms": 1e3 * get_percentile(latencies, 50),
+        "latency_p99_ms": 1e3 * get_percentile(latencies, 99),
+        "utilisation": sum(durations) / worker_time,
+    }
+
+
+def format_results(results):
+    return (
+        f"{results['tasks_per_second']:.1f} tasks/s, "
+        f"overhead {results['overhead_ms']:.2f} ms/task, "
+        f"latency p50 {results['latency_p50_ms']:.1f} ms, "
+        f"p99 {results['latency_p99_ms']:.1f} ms, "
+        f"utilisation {results['utilisation']:.2f}"
+    )
+
+
+def get_ratios(results, reference):
+    return {name: value / reference[name] for name, value in results.items()}
+
+
+def compare_to_baseline(ratios, baseline, tolerance):
+    """Print the change of every ratio to the reference, return whether any
+    got worse by more than tolerance."""
+
+    regressed = False
+    for name, ratio in ratios.items():
+        if name not in baseline:
+            continue
+        change = ratio / baseline[name] - 1.0
+        worse = (
+            change > tolerance
+            if name in LOWER_IS_BETTER
+            else (change < -tolerance)
+        )
+        regressed = regressed or worse
+        print(
+            f"{name:>17}: {ratio:6.2f} x reference, baseline "
+            f"{baseline[name]:6.2f} x ({100 * change:+6.1f} %)"
+            f"{' REGRESSION' if worse else ''}"
+        )
+
+    return regressed
+
+
+def main():
+    global distribution, mean_duration
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--engines", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--tasks", type=int, default=64)
+    parser.add_argument("--generations", type=int, default=5)
+    parser.add_argument(
+        "--distribution",
+        choices=["constant", "exponential", "lognormal"],
+        default=distribution,
+    )
+    parser.add_argument(
+        "--mean",
+        type=float,
+        default=mean_duration,
+        help="mean evaluation time in seconds",
+    )
+    parser.add_argument("--baseline", type=pathlib.Path)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="save the ratios to --baseline instead of comparing",
+    )
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    distribution = args.distribution
+    mean_duration = args.mean
+
+    results = bench_e2e(
+        args.engines, args.workers, args.tasks, args.generations
+    )
+    reference = bench_reference(
+        args.engines, args.workers, args.tasks, args.generations
+    )
+    print(
+        f"{args.engines} engines x {args.workers} workers, "
+        f"{args.generations} x {args.tasks} tasks, {args.distribution} "
+        f"evaluation times of {1e3 * args.mean:.0f} ms: "
+        f"{format_results(results)}, reference process pool: "
+        f"{format_results(reference)}"
+    )
+
+    if args.baseline is None:
+        return
+    ratios = get_ratios(results, reference)
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(ratios, indent=4) + "\n")
+    elif compare_to_baseline(
+        ratios, json.loads(args.baseline.read_text()), args.tolerance
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
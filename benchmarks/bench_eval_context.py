@@ -0,0 +1,120 @@
+"""Per-task latency of run_eval with and without a reusable EvalContext,
+and with the warm start of the protocols from a shared resting prefix,
+without and with early stopping. Their scores are checked against the
+ones of the other variants, capped at the early stop score."""
+
+import sys
+import time
+import random
+import pathlib
+import logging
+import argparse
+import statistics
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+sys.path.append(
+    str(pathlib.Path(__file__).resolve().parent.parent / "evaluator")
+)
+import evaluator
+
+logging.getLogger("Evaluator").setLevel(logging.WARNING)
+
+
+def random_params(rng):
+    return {
+        "gnabar_hh": rng.uniform(0.05, 0.125),
+        "gkbar_hh": rng.uniform(0.01, 0.075),
+    }
+
+
+def time_tasks(params_list, eval_context_factory):
+    """Return the timings and the scores of the tasks."""
+
+    eval_context = eval_context_factory()
+
+    timings = []
+    scores = []
+    for params in params_list:
+        start = time.perf_counter()
+        scores.append(evaluator.run_eval(params, eval_context=eval_context))
+        timings.append(time.perf_counter() - start)
+
+    return timings, scores
+
+
+def report(label, timings):
+    print(
+        f"{label:>24}: mean {1e3 * statistics.mean(timings):8.2f} ms  "
+        f"median {1e3 * statistics.median(timings):8.2f} ms  "
+        f"({len(timings)} tasks)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--early-stop-score", type=float, default=50.0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    params_list = [random_params(rng) for _ in range(args.tasks)]
+
+    # Warm up NEURON and eFEL so that the first variant does not pay for
+    # the one-off imports
+    evaluator.run_eval(params_list[0])
+
+    before, _ = time_tasks(params_list, lambda: None)
+    report("rebuild per task", before)
+
+    after, _ = time_tasks(params_list, evaluator.EvalContext)
+    report("shared EvalContext", after)
+
+    not_isolated, scores = time_tasks(
+        params_list, lambda: evaluator.EvalContext(isolate_protocols=False)
+    )
+    report("shared, not isolated", not_isolated)
+
+    warm_start, warm_scores = time_tasks(
+        params_list,
+        lambda: evaluator.EvalContext(
+            isolate_protocols=False, warm_start=True
+        ),
+    )
+    report("shared, warm start", warm_start)
+    if warm_scores != scores:
+        sys.exit("The scores of the warm start differ")
+
+    early_stop, early_stop_scores = time_tasks(
+        params_list,
+        lambda: evaluator.EvalContext(
+            isolate_protocols=False,
+            warm_start=True,
+            early_stop_score=args.early_stop_score,
+        ),
+    )
+    report(f"early stop at {args.early_stop_score:g}", early_stop)
+    capped_scores = [
+        {
+            name: min(score, args.early_stop_score)
+            for name, score in task_scores.items()
+        }
+        for task_scores in scores
+    ]
+    if early_stop_scores != capped_scores:
+        sys.exit("The scores of the early stop differ")
+
+    for label, timings in [
+        ("speedup shared", after),
+        ("speedup not isolated", not_isolated),
+        ("speedup warm start", warm_start),
+        ("speedup early stop", early_stop),
+    ]:
+        print(
+            f"{label:>24}: "
+            f"{statistics.mean(before) / statistics.mean(timings):.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Hop latency of the fixed-interval polling loop versus the EventWaiter.
+
+Two hops are measured on localhost without any evaluation work:
+- a file written by one side and picked up by the loop of the other side,
+  like caller.json, engine.json and the engine control files
+- a delayed-reply request answered by a loop on the remote transmitter,
+  like the map and eval commands
+"""
+
+import sys
+import json
+import time
+import socket
+import pathlib
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+
+import osparc_control as oc
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+import tools.events
+
+logging.getLogger().setLevel(logging.WARNING)
+
+POLLING_WAIT = 0.1  # seconds
+
+
+def get_new_port():
+    tmp_sock = socket.socket()
+    tmp_sock.bind(("", 0))
+    new_port = tmp_sock.getsockname()[1]
+    tmp_sock.close()
+
+    return new_port
+
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    print(
+        f"{label:>28}: mean {1e3 * statistics.mean(latencies):7.2f} ms  "
+        f"p50 {1e3 * statistics.median(latencies):7.2f} ms  "
+        f"max {1e3 * latencies[-1]:7.2f} ms"
+    )
+
+
+def bench_file(event_driven, n_hops):
+    """Latency between writing a file and the loop reading it."""
+
+    latencies = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = pathlib.Path(tmp_dir) / "command.json"
+
+        waiter = tools.events.EventWaiter(fallback_wait=POLLING_WAIT)
+        if event_driven:
+            waiter.watch(tmp_dir)
+
+        def wait():
+            if event_driven:
+                waiter.wait()
+            else:
+                time.sleep(POLLING_WAIT)
+
+        for hop in range(n_hops):
+            # Write at a random point of the polling interval
+            timer = threading.Timer(
+                (hop * 0.37 % 1) * POLLING_WAIT,
+                lambda: file_path.write_text(
+                    json.dumps({"hop": hop, "time": time.perf_counter()})
+                ),
+            )
+            timer.start()
+
+            while True:
+                if file_path.exists():
+                    content = json.loads(file_path.read_text())
+                    if content["hop"] == hop:
+                        latencies.append(time.perf_counter() - content["time"])
+                        break
+                wait()
+            timer.join()
+
+        waiter.close()
+
+    return latencies
+
+
+def bench_transmitter(event_driven, n_hops):
+    """Round-trip latency of a request answered by a remote loop."""
+
+    manifest = oc.CommandManifest(
+        action="echo",
+        description="reply with the params",
+        params=[oc.CommandParameter(name="value", description="value")],
+        command_type=oc.CommandType.WITH_DELAYED_REPLY,
+    )
+
+    caller_port = get_new_port()
+    remote_port = get_new_port()
+
+    caller_waiter = tools.events.EventWaiter(fallback_wait=POLLING_WAIT)
+    remote_waiter = tools.events.EventWaiter(fallback_wait=POLLING_WAIT)
+
+    def create_transmitter(listen_port, remote_port, manifests, waiter):
+        if event_driven:
+            return tools.events.NotifyingTransmitter(
+                remote_host="localhost",
+                exposed_commands=manifests,
+                remote_port=remote_port,
+                listen_port=listen_port,
+                waiter=waiter,
+            )
+
+        return oc.PairedTransmitter(
+            remote_host="localhost",
+            exposed_commands=manifests,
+            remote_port=remote_port,
+            listen_port=listen_port,
+        )
+
+    def wait(waiter):
+        if event_driven:
+            waiter.wait()
+        else:
+            time.sleep(POLLING_WAIT)
+
+    caller = create_transmitter(caller_port, remote_port, [], caller_waiter)
+    remote = create_transmitter(
+        remote_port, caller_port, [manifest], remote_waiter
+    )
+    caller.start_background_sync()
+    remote.start_background_sync()
+
+    stop = threading.Event()
+
+    def remote_loop():
+        while not stop.is_set():
+            for command in remote.get_incoming_requests():
+                remote.reply_to_command(
+                    request_id=command.request_id,
+                    payload=command.params["value"],
+                )
+            wait(remote_waiter)
+
+    remote_thread = threading.Thread(target=remote_loop)
+    remote_thread.start()
+
+    latencies = []
+    for hop in range(n_hops):
+        start = time.perf_counter()
+        request_id = caller.request_with_delayed_reply(
+            "echo", params={"value": hop}
+        )
+        while True:
+            received, value = caller.check_for_reply(request_id)
+            if received:
+                assert value == hop
+                break
+            wait(caller_waiter)
+        latencies.append(time.perf_counter() - start)
+
+    stop.set()
+    remote_waiter.wake()
+    remote_thread.join()
+    caller.stop_background_sync()
+    remote.stop_background_sync()
+    caller_waiter.close()
+    remote_waiter.close()
+
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hops", type=int, default=20)
+    args = parser.parse_args()
+
+    report("file, polling loop", bench_file(False, args.hops))
+    report("file, event driven", bench_file(True, args.hops))
+    report("request, polling loop", bench_transmitter(False, args.hops))
+    report("request, event driven", bench_transmitter(True, args.hops))
+
+
+if __name__ == "__main__":
+    main()
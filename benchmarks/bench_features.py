@@ -0,0 +1,85 @@
+"""Feature extraction time per trace, of bluepyopt's ObjectivesCalculator
+and of the FeatureExtractor of an EvalContext for batch sizes 1 to 256.
+
+The traces are simulated once for random parameter sets, the scores of
+the FeatureExtractor are checked against the ones of bluepyopt.
+"""
+
+import sys
+import time
+import random
+import pathlib
+import logging
+import argparse
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+sys.path.append(
+    str(pathlib.Path(__file__).resolve().parent.parent / "evaluator")
+)
+import evaluator
+
+import bench_eval_context
+
+logging.getLogger("Evaluator").setLevel(logging.WARNING)
+
+
+def time_per_trace(calculate_scores, responses_list, batch_size):
+    """Return the scores and the extraction time per trace."""
+
+    scores = []
+    start = time.perf_counter()
+    for index in range(0, len(responses_list), batch_size):
+        scores.extend(
+            calculate_scores(responses_list[index : index + batch_size])
+        )
+    elapsed = time.perf_counter() - start
+    n_traces = sum(len(responses) for responses in responses_list)
+
+    return scores, elapsed / n_traces
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    eval_context = evaluator.EvalContext(
+        isolate_protocols=False, warm_start=True
+    )
+    responses_list = []
+    for _ in range(args.tasks):
+        params = bench_eval_context.random_params(rng)
+        responses, _ = eval_context.run_warm_protocols(params)
+        responses_list.append(responses)
+
+    scores, per_trace = time_per_trace(
+        lambda batch: [
+            eval_context.score_calc.calculate_scores(responses)
+            for responses in batch
+        ],
+        responses_list,
+        1,
+    )
+    print(f"{'bluepyopt':>16}: {1e3 * per_trace:7.3f} ms/trace")
+
+    batch_size = 1
+    while batch_size <= min(256, args.tasks):
+        batch_scores, batch_per_trace = time_per_trace(
+            eval_context.feature_extractor.calculate_scores,
+            responses_list,
+            batch_size,
+        )
+        if batch_scores != scores:
+            sys.exit(f"The scores of batches of {batch_size} differ")
+        print(
+            f"{f'batches of {batch_size}':>16}: "
+            f"{1e3 * batch_per_trace:7.3f} ms/trace "
+            f"({per_trace / batch_per_trace:.0f}x)"
+        )
+        batch_size *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Generation makespan of the map on engines of different speeds.
+
+Fake engines run their tasks on a virtual clock, in order, on n_workers
+workers. The evaluation time of a task is its cost, which grows
+exponentially with its first parameter, times the slowness of the engine.
+Engines that don't report evaluation times leave the map without a cost
+model, which is how it scheduled before. None of the engines fail, so
+speculative copies of late requests and blacklisted engines are false
+positives of the straggler deadlines.
+"""
+
+import os
+import sys
+import heapq
+import math
+import random
+import pathlib
+import logging
+import argparse
+import tempfile
+import types
+import uuid
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent / "map"))
+
+logging.disable(logging.INFO)
+
+# (n_workers, slowness)
+ENGINES = [(8, 1.0), (8, 3.0), (4, 1.5)]
+OBJECTIVE_NAMES = ["step1.Spikecount", "step2.Spikecount"]
+
+
+class VirtualClock:
+    def __init__(self):
+        """Constructor."""
+
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+
+class FakeEngineTransmitter:
+    """Runs eval_batch requests on a virtual clock."""
+
+    def __init__(self, clock, n_workers, slowness, report_durations):
+        """Constructor."""
+
+        self.clock = clock
+        self.slowness = slowness
+        self.report_durations = report_durations
+        self.worker_free_times = [0.0] * n_workers
+        # request_id -> (finish time, results)
+        self.requests = {}
+
+    def request_with_delayed_reply(self, action, params):
+        results = []
+        finish_time = self.clock.now
+        for task_id, task_params in params["tasks"]:
+            duration = self.slowness * get_cost(task_params)
+            start_time = max(
+                self.clock.now, heapq.heappop(self.worker_free_times)
+            )
+            heapq.heappush(self.worker_free_times, start_time + duration)
+            finish_time = max(finish_time, start_time + duration)
+
+            result = {
+                "task_id": task_id,
+                "objs": dict.fromkeys(OBJECTIVE_NAMES, 1.0),
+            }
+            if self.report_durations:
+                result["duration"] = duration
+            results.append(result)
+
+        # Unique over all engines, as the ids of osparc_control
+        request_id = str(uuid.uuid4())
+        self.requests[request_id] = (finish_time, results)
+
+        return request_id
+
+    def check_for_reply(self, request_id):
+        finish_time, results = self.requests[request_id]
+        if finish_time > self.clock.now:
+            return False, None
+
+        self.requests.pop(request_id)
+
+        return True, results
+
+    def next_finish_time(self):
+        return min(
+            (finish_time for finish_time, _ in self.requests.values()),
+            default=math.inf,
+        )
+
+
+def get_cost(params):
+    return 0.1 * math.exp(4.0 * params["gnabar_hh"])
+
+
+def create_map(tmp_dir, clock, report_durations):
+    os.environ["DY_SIDECAR_PATH_INPUTS"] = tmp_dir
+    os.environ["DY_SIDECAR_PATH_OUTPUTS"] = tmp_dir
+    os.environ["OSPARC_MAP_CACHE_SIZE"] = "0"
+    os.environ["OSPARC_MAP_STORE_FILE"] = ""
+
+    import main
+
+    main.time = types.SimpleNamespace(time=clock.time)
+
+    osparc_map = main.oSparcMap()
+    for engine_index, (n_workers, slowness) in enumerate(ENGINES):
+        engine_id = f"engine-{engine_index}"
+        osparc_map.engine_ids.append(engine_id)
+        osparc_map.engine_transmitters[engine_id] = FakeEngineTransmitter(
+            clock, n_workers, slowness, report_durations
+        )
+        osparc_map.engine_request_ids[engine_id] = {}
+        osparc_map.engine_n_workers[engine_id] = n_workers
+        osparc_map.engine_model_ids[engine_id] = None
+        osparc_map.engine_encodings[engine_id] = "lists"
+        osparc_map.engine_tracing[engine_id] = False
+
+    return osparc_map
+
+
+def run_generation(osparc_map, clock, map_input):
+    start_time = clock.now
+    osparc_map.populate_tasklist(map_input)
+    while True:
+        osparc_map.check_engine_transmitters()
+        if osparc_map.task_table.is_done():
+            return osparc_map.predicted_makespan, clock.now - start_time
+
+        clock.now = min(
+            transmitter.next_finish_time()
+            for transmitter in osparc_map.engine_transmitters.values()
+        )
+
+
+def bench_makespan(report_durations, n_generations, n_tasks):
+    rng = random.Random(1)
+    clock = VirtualClock()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        osparc_map = create_map(tmp_dir, clock, report_durations)
+        # (predicted, actual)
+        makespans = []
+        for _ in range(n_generations):
+            map_input = [
+                (task_id, [rng.random(), rng.random()])
+                for task_id in range(n_tasks)
+            ]
+            makespans.append(run_generation(osparc_map, clock, map_input))
+
+    return (
+        makespans,
+        osparc_map.straggler_monitor.stats(),
+        len(osparc_map.blacklisted_engines),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--generations", type=int, default=10)
+    parser.add_argument("--tasks", type=int, nargs="+", default=[20, 200])
+    args = parser.parse_args()
+
+    for n_tasks in args.tasks:
+        for label, report_durations in [
+            ("without cost model", False),
+            ("with cost model", True),
+        ]:
+            makespans, straggler_stats, n_blacklisted = bench_makespan(
+                report_durations, args.generations, n_tasks
+            )
+            # The first generation has no evaluation times to plan with
+            predicted, actual = zip(*makespans[1:])
+            predicted = (
+                f"{sum(predicted) / len(predicted):7.2f} s"
+                if None not in predicted
+                else "      -"
+            )
+            print(
+                f"{n_tasks:>5} tasks, {label:>18}: mean makespan "
+                f"{sum(actual) / len(actual):7.2f} s, predicted {predicted}, "
+                f"{straggler_stats['speculated_tasks']:3d} speculated tasks, "
+                f"{straggler_stats['speculative_wins']:3d} wins, "
+                f"{n_blacklisted} blacklisted engines"
+            )
+
+
+if __name__ == "__main__":
+    main()
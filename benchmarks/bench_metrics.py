@@ -0,0 +1,47 @@
+"""Cost of recording a metric, with the metrics disabled and enabled."""
+
+import sys
+import time
+import pathlib
+import argparse
+import tempfile
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+import tools.metrics
+
+
+def time_calls(function, n_calls):
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        function(0.5)
+
+    return (time.perf_counter() - start) / n_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label, file_path in [
+            ("disabled", None),
+            ("enabled", pathlib.Path(tmp_dir) / "bench.prom"),
+        ]:
+            metrics = tools.metrics.Metrics("bench", file_path=file_path)
+            counter = metrics.counter("total", "Counter")
+            histogram = metrics.histogram("seconds", "Histogram")
+
+            for kind, function in [
+                ("counter", counter.inc),
+                ("histogram", histogram.observe),
+            ]:
+                duration = time_calls(function, args.calls)
+                print(
+                    f"{label:>8} {kind:>9}: {1e9 * duration:7.1f} ns per call"
+                )
+            metrics.close()
+
+
+if __name__ == "__main__":
+    main()
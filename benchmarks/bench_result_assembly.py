@@ -0,0 +1,89 @@
+"""Assembly of the map output from finished tasks.
+
+- sorted tasks: the finished tasks are sorted by task_id and the objectives
+  are looked up by name for every task when the output is sent
+- result table: the objectives are written into the row of the task as
+  results arrive, the output is a slice of the table
+
+The result table moves work from the output to the arrivals, so the time
+per arrival is reported as well: it is paid while the other tasks of the
+request are still being evaluated.
+"""
+
+import sys
+import time
+import random
+import pathlib
+import argparse
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+import tools.schema
+
+OBJECTIVE_NAMES = tools.schema.DEFAULT_OBJECTIVE_NAMES
+
+
+def get_finished_tasks(n_tasks, rng):
+    tasks = [
+        {
+            "task_id": task_id,
+            "row": task_id,
+            "result": {name: rng.random() for name in OBJECTIVE_NAMES},
+        }
+        for task_id in range(n_tasks)
+    ]
+    # Tasks finish in any order
+    rng.shuffle(tasks)
+
+    return tasks
+
+
+def bench_sorted_tasks(tasks):
+    start = time.perf_counter()
+
+    tasks.sort(key=lambda task: task["task_id"])
+    objs = []
+    for task in tasks:
+        objs.append([task["result"][name] for name in OBJECTIVE_NAMES])
+
+    return time.perf_counter() - start, objs
+
+
+def bench_result_table(tasks):
+    table = tools.schema.ResultTable(OBJECTIVE_NAMES)
+    table.add_rows(list(range(len(tasks))))
+
+    # Done as the results arrive
+    arrival_start = time.perf_counter()
+    for task in tasks:
+        table.set_result(task["row"], task["result"])
+    arrival_time = time.perf_counter() - arrival_start
+
+    start = time.perf_counter()
+    objs = table.get_objs()
+
+    return time.perf_counter() - start, arrival_time, objs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--tasks", type=int, nargs="+", default=[1000, 10000, 100000]
+    )
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    for n_tasks in args.tasks:
+        tasks = get_finished_tasks(n_tasks, rng)
+        table_time, arrival_time, table_objs = bench_result_table(tasks)
+        sorted_time, sorted_objs = bench_sorted_tasks(tasks)
+        assert table_objs == sorted_objs
+
+        print(
+            f"{n_tasks:>7} tasks: sorted tasks {1e3 * sorted_time:8.2f} ms  "
+            f"result table {1e3 * table_time:8.2f} ms "
+            f"(+{1e6 * arrival_time / n_tasks:.2f} us per arrival)"
+        )
+
+
+if __name__ == "__main__":
+    main()
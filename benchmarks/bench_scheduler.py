@@ -0,0 +1,112 @@
+"""Scheduler overhead of the map per task, without any evaluation work.
+
+The map creates the tasks of one request, dispatches them to fake engines
+and collects their results, which the fake engines return immediately.
+The engines have N_ENGINES * N_WORKERS tasks in flight, as a large cluster
+would.
+"""
+
+import os
+import sys
+import time
+import pathlib
+import logging
+import argparse
+import tempfile
+import uuid
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent / "map"))
+
+logging.disable(logging.INFO)
+
+N_ENGINES = 64
+N_WORKERS = 32
+OBJECTIVE_NAMES = ["step1.Spikecount", "step2.Spikecount"]
+
+
+class FakeEngineTransmitter:
+    """Replies to every eval_batch request as soon as it is checked."""
+
+    def __init__(self):
+        """Constructor."""
+
+        self.requests = {}
+        self.n_results = 0
+
+    def request_with_delayed_reply(self, action, params):
+        # Unique over all engines, as the ids of osparc_control
+        request_id = str(uuid.uuid4())
+        self.requests[request_id] = params["tasks"]
+
+        return request_id
+
+    def check_for_reply(self, request_id):
+        tasks = self.requests.pop(request_id)
+        self.n_results += len(tasks)
+
+        return True, [
+            {"task_id": task_id, "objs": dict.fromkeys(OBJECTIVE_NAMES, 1.0)}
+            for task_id, _ in tasks
+        ]
+
+
+def create_map(tmp_dir):
+    os.environ["DY_SIDECAR_PATH_INPUTS"] = tmp_dir
+    os.environ["DY_SIDECAR_PATH_OUTPUTS"] = tmp_dir
+    os.environ["OSPARC_MAP_CACHE_SIZE"] = "0"
+    os.environ["OSPARC_MAP_STORE_FILE"] = ""
+
+    import main
+
+    osparc_map = main.oSparcMap()
+    for engine_index in range(N_ENGINES):
+        engine_id = f"engine-{engine_index}"
+        osparc_map.engine_ids.append(engine_id)
+        osparc_map.engine_transmitters[engine_id] = FakeEngineTransmitter()
+        osparc_map.engine_request_ids[engine_id] = {}
+        osparc_map.engine_n_workers[engine_id] = N_WORKERS
+        osparc_map.engine_model_ids[engine_id] = None
+        if hasattr(osparc_map, "engine_encodings"):
+            osparc_map.engine_encodings[engine_id] = "lists"
+            osparc_map.engine_tracing[engine_id] = False
+
+    return osparc_map
+
+
+def bench_scheduler(n_tasks):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        osparc_map = create_map(tmp_dir)
+        map_input = [(task_id, [0.1, 0.02]) for task_id in range(n_tasks)]
+        transmitters = osparc_map.engine_transmitters.values()
+
+        start = time.perf_counter()
+        osparc_map.populate_tasklist(map_input)
+        while sum(
+            transmitter.n_results for transmitter in transmitters
+        ) < n_tasks or any(
+            len(requests) != 0
+            for requests in osparc_map.engine_request_ids.values()
+        ):
+            osparc_map.check_engine_transmitters()
+
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--tasks", type=int, nargs="+", default=[1000, 10000, 100000]
+    )
+    args = parser.parse_args()
+
+    for n_tasks in args.tasks:
+        duration = bench_scheduler(n_tasks)
+        print(
+            f"{n_tasks:>7} tasks: {duration:8.3f} s  "
+            f"{1e6 * duration / n_tasks:8.2f} us/task"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Time for a new engine to register with the map and finish its first task.
+
+A map and a caller run as in bench_e2e, then an engine is started as a new
+`python evaluator1.py` process, with the real model, or forked by a fork
+server that is already running. The benchmark reports the time from
+starting the process to its engine.json being written, and to the caller
+receiving the result of a first task.
+"""
+
+import os
+import sys
+import time
+import pathlib
+import logging
+import argparse
+import statistics
+import subprocess
+import tempfile
+import multiprocessing
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+import tools.maps
+
+import bench_e2e
+
+EVALUATOR_DIR = pathlib.Path(__file__).resolve().parent.parent / "evaluator"
+
+logging.disable(logging.INFO)
+
+
+def wait_for_file(file_path, timeout=60.0):
+    end = time.perf_counter() + timeout
+    while not file_path.exists():
+        if time.perf_counter() > end:
+            raise TimeoutError(f"{file_path} wasn't written")
+        time.sleep(0.001)
+
+
+def time_startup(n_workers, forkserver_path=None):
+    """Return the time to register and to the first result of an engine."""
+
+    os.environ["OSPARC_MAP_HOSTNAME"] = "localhost"
+    os.environ["OSPARC_OPTIMIZER_HOSTNAME"] = "localhost"
+    os.environ["OSPARC_MAP_CACHE_SIZE"] = "0"
+    os.environ["OSPARC_MAP_STORE_FILE"] = ""
+
+    context = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root_dir = pathlib.Path(tmp_dir)
+        bench_e2e.create_dirs(root_dir, 1)
+        map_process = context.Process(
+            target=bench_e2e.run_map, args=(root_dir,)
+        )
+        map_process.start()
+
+        engine_process = None
+        try:
+            caller = tools.maps.oSparcFileMap(
+                root_dir / "map_outputs" / "output_2" / "map.json",
+                root_dir / "map_inputs" / "input_2" / "caller.json",
+            )
+
+            start = time.perf_counter()
+            engine_process = subprocess.Popen(
+                [sys.executable, "evaluator1.py"],
+                cwd=EVALUATOR_DIR,
+                env={
+                    **os.environ,
+                    "DY_SIDECAR_PATH_INPUTS": str(root_dir / "engine1_inputs"),
+                    "DY_SIDECAR_PATH_OUTPUTS": str(
+                        root_dir / "engine1_outputs"
+                    ),
+                    "OSPARC_EVALUATOR1_HOSTNAME": "localhost",
+                    "OSPARC_EVALUATOR_WORKERS": str(n_workers),
+                    "OSPARC_EVALUATOR_FORKSERVER": forkserver_path or "",
+                },
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            wait_for_file(
+                root_dir / "engine1_outputs" / "output_1" / "engine.json"
+            )
+            registered = time.perf_counter() - start
+            caller.evaluate([[0.1, 0.05]])
+            first_result = time.perf_counter() - start
+
+            del caller
+        finally:
+            map_process.join(timeout=30)
+            if map_process.is_alive():
+                map_process.terminate()
+            if engine_process is not None:
+                try:
+                    engine_process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    engine_process.terminate()
+
+    return registered, first_result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        forkserver_path = str(pathlib.Path(tmp_dir) / "evaluator.sock")
+        forkserver = subprocess.Popen(
+            [sys.executable, "forkserver.py", forkserver_path],
+            cwd=EVALUATOR_DIR,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_file(pathlib.Path(forkserver_path))
+            for label, path in [
+                ("new process", None),
+                ("fork server", forkserver_path),
+            ]:
+                registered, first_result = zip(
+                    *[
+                        time_startup(args.workers, path)
+                        for _ in range(args.repeats)
+                    ]
+                )
+                print(
+                    f"{label:>11}, {args.workers} workers: registered after "
+                    f"{statistics.median(registered):.3f} s, first result "
+                    f"after {statistics.median(first_result):.3f} s"
+                )
+        finally:
+            forkserver.terminate()
+            forkserver.wait()
+
+
+if __name__ == "__main__":
+    main()
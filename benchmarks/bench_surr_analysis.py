@@ -0,0 +1,243 @@
+"""Time and peak memory of the surrogate error analysis of a Dakota run.
+
+Synthetic finaldata{i}.dat and finaldatatruth{i}.dat files are written in
+Dakota's format, then analysed with the pandas read and float key merge of
+the former plot_surr.py, and with analyse_surr.py, whose RMS errors are
+checked against the pandas ones. The parse of the files, which is most of
+the time of the analysis, is also timed on its own, with numpy's loadtxt,
+pandas' C reader and the TableReader of analyse_surr.py. analyse_surr.py
+then follows files that are written while it runs, which checks that it
+stores every iteration, and that a file read while it grows is parsed
+once.
+"""
+
+import sys
+import time
+import pathlib
+import logging
+import argparse
+import tempfile
+import threading
+import tracemalloc
+
+import numpy as np
+import pandas
+
+sys.path.append(
+    str(pathlib.Path(__file__).resolve().parent.parent / "dakoptimizer")
+)
+import analyse_surr
+
+logging.getLogger("AnalyseSurr").setLevel(logging.WARNING)
+
+N_PARAMS = 2
+
+
+def write_iteration(run_dir, iteration, n_rows, rng):
+    params = rng.uniform([0.05, 0.01], [0.125, 0.075], size=(n_rows, 2))
+    truth = np.stack([params.sum(axis=1), params.prod(axis=1)], axis=1)
+    surrogate = truth * rng.uniform(0.9, 1.1, size=truth.shape)
+    for file_name, objs in [
+        (f"finaldata{iteration}.dat", surrogate),
+        (f"finaldatatruth{iteration}.dat", truth),
+    ]:
+        np.savetxt(
+            run_dir / file_name,
+            np.concatenate([params, objs], axis=1),
+            fmt="%.16e",
+            delimiter="\t",
+        )
+
+
+def analyse_pandas(run_dir, n_iterations):
+    """RMS errors of the iterations, as the former plot_surr.py."""
+
+    rms = []
+    for iteration in range(1, n_iterations + 1):
+        data = pandas.read_csv(
+            run_dir / f"finaldata{iteration}.dat",
+            sep=r"\s+",
+            header=None,
+            names=["x1", "x2", "f1", "f2"],
+        )
+        data_truth = pandas.read_csv(
+            run_dir / f"finaldatatruth{iteration}.dat",
+            sep=r"\s+",
+            header=None,
+            names=["x1", "x2", "f1truth", "f2truth"],
+        )
+        merged = pandas.merge(data, data_truth, how="left", on=["x1", "x2"])
+        rms.append(
+            [
+                ((merged.f1 - merged.f1truth) ** 2).mean() ** 0.5,
+                ((merged.f2 - merged.f2truth) ** 2).mean() ** 0.5,
+            ]
+        )
+
+    return np.array(rms)
+
+
+def analyse_incremental(run_dir, n_iterations):
+    store = analyse_surr.SurrErrorStore(run_dir / "surr_errors.sqlite")
+    analyse_surr.analyse(run_dir, store, n_params=N_PARAMS)
+    store.close()
+
+
+def get_stored_rms(run_dir):
+    store = analyse_surr.SurrErrorStore(run_dir / "surr_errors.sqlite")
+    rms = np.array([stored["rms"] for stored in store.get_iterations()])
+    store.close()
+
+    return rms
+
+
+def get_file_paths(run_dir, n_iterations):
+    return [
+        run_dir / f"{file_name}{iteration}.dat"
+        for iteration in range(1, n_iterations + 1)
+        for file_name in ["finaldata", "finaldatatruth"]
+    ]
+
+
+def parse_loadtxt(run_dir, n_iterations):
+    return [
+        np.loadtxt(file_path, ndmin=2)
+        for file_path in get_file_paths(run_dir, n_iterations)
+    ]
+
+
+def parse_pandas(run_dir, n_iterations):
+    return [
+        pandas.read_csv(
+            file_path, sep=r"\s+", header=None, engine="c"
+        ).to_numpy()
+        for file_path in get_file_paths(run_dir, n_iterations)
+    ]
+
+
+def parse_table_reader(run_dir, n_iterations):
+    return [
+        analyse_surr.TableReader(file_path).read()
+        for file_path in get_file_paths(run_dir, n_iterations)
+    ]
+
+
+def measure(analysis, run_dir, n_iterations):
+    """Return the result, time and peak memory of an analysis."""
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = analysis(run_dir, n_iterations)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, elapsed, peak
+
+
+def check_follow(n_iterations, n_rows, write_interval):
+    """Follow iterations that are written while the analysis runs."""
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run_dir = pathlib.Path(tmp_dir)
+        rng = np.random.default_rng(2)
+
+        def write_iterations():
+            for iteration in range(1, n_iterations + 1):
+                time.sleep(write_interval)
+                write_iteration(run_dir, iteration, n_rows, rng)
+
+        writer = threading.Thread(target=write_iterations)
+        writer.start()
+        store = analyse_surr.SurrErrorStore(run_dir / "surr_errors.sqlite")
+        analyse_surr.analyse(
+            run_dir,
+            store,
+            n_params=N_PARAMS,
+            follow=True,
+            poll_interval=write_interval / 5,
+            max_iterations=n_iterations,
+        )
+        writer.join()
+        followed = [stored["iteration"] for stored in store.get_iterations()]
+        store.close()
+
+    if followed != list(range(1, n_iterations + 1)):
+        sys.exit(f"Followed iterations {followed}")
+    print(f"followed {n_iterations} iterations written during the analysis")
+
+
+def check_growing_file(n_rows, n_reads):
+    """Read a file at n_reads sizes while it is written, return the time of
+    the reads."""
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = pathlib.Path(tmp_dir) / "finaldata1.dat"
+        rng = np.random.default_rng(3)
+        rows = rng.uniform(size=(n_rows, N_PARAMS + 2))
+        np.savetxt(file_path, rows, fmt="%.16e", delimiter="\t")
+        data = file_path.read_bytes()
+        file_path.write_bytes(b"")
+
+        reader = analyse_surr.TableReader(file_path)
+        elapsed = 0.0
+        for end in np.linspace(0, len(data), n_reads + 1)[1:].astype(int):
+            with open(file_path, "ab") as table_file:
+                table_file.write(data[file_path.stat().st_size : end])
+            start = time.perf_counter()
+            table = reader.read()
+            elapsed += time.perf_counter() - start
+
+    if table is None or not np.array_equal(table, rows):
+        sys.exit("The growing file was read wrong")
+    print(
+        f"{n_reads} reads of a growing file of {n_rows} rows: "
+        f"{1e3 * elapsed:.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=49)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for n_rows in [10, 1000, 10000]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            run_dir = pathlib.Path(tmp_dir)
+            rng = np.random.default_rng(args.seed)
+            for iteration in range(1, args.iterations + 1):
+                write_iteration(run_dir, iteration, n_rows, rng)
+
+            pandas_rms, pandas_time, pandas_peak = measure(
+                analyse_pandas, run_dir, args.iterations
+            )
+            _, elapsed, peak = measure(
+                analyse_incremental, run_dir, args.iterations
+            )
+            if not np.allclose(
+                get_stored_rms(run_dir), pandas_rms, rtol=1e-12
+            ):
+                sys.exit(f"The RMS errors of {n_rows} rows differ")
+            print(
+                f"{args.iterations} iterations of {n_rows:5d} rows: pandas "
+                f"{1e3 * pandas_time:7.1f} ms, {pandas_peak / 1e6:6.2f} MB"
+                f", incremental {1e3 * elapsed:7.1f} ms, "
+                f"{peak / 1e6:6.2f} MB"
+            )
+            parse_times = [
+                measure(parse, run_dir, args.iterations)[1]
+                for parse in [parse_loadtxt, parse_pandas, parse_table_reader]
+            ]
+            print(
+                "    parse: loadtxt {:7.1f} ms, pandas {:7.1f} ms, table "
+                "reader {:7.1f} ms".format(*(1e3 * t for t in parse_times))
+            )
+
+    check_follow(10, 10, 0.05)
+    check_growing_file(10000, 1)
+    check_growing_file(10000, 100)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Evaluations saved by the map's pre-screen versus optimisation quality.
+
+bluepyopt's DEAPOptimisation optimises the simple cell model, as the bp
+optimizer does, with a map function that screens the parameter sets with
+a tools.surrogate.PreScreen, as the map does, and evaluates the others
+with an EvalContext. For every pre-screen setting, the benchmark reports:
+- evaluations: parameter sets that were simulated
+- saved: fraction of the parameter sets that were screened instead
+- false screens: screened parameter sets that weren't above the
+  thresholds on every objective once simulated, which are simulated for
+  the report only
+- best: lowest sum of the objectives of the simulated parameter sets
+- final: mean sum of the simulated objectives of the final population
+"""
+
+import sys
+import time
+import pathlib
+import logging
+import argparse
+import statistics
+
+import numpy as np
+
+import bluepyopt as bpopt
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+sys.path.append(
+    str(pathlib.Path(__file__).resolve().parent.parent / "evaluator")
+)
+import tools.schema
+import tools.surrogate
+import evaluator
+
+logging.getLogger("Evaluator").setLevel(logging.WARNING)
+# The generation log of bluepyopt's DEAP algorithm
+logging.getLogger("__main__").setLevel(logging.WARNING)
+
+# (quantile, confidence), None without pre-screen
+SETTINGS = [None, (0.75, 2.0), (0.75, 1.0), (0.5, 1.0)]
+
+
+class Evaluator(bpopt.evaluators.Evaluator):
+    """Evaluator of DEAPOptimisation whose evaluations are all run by the
+    map function."""
+
+    def init_simulator_and_evaluate_with_lists(
+        self, param_list=None, target="scores"
+    ):
+        raise NotImplementedError
+
+
+class ScreeningMap:
+    """Map function of DEAPOptimisation that screens like the map."""
+
+    def __init__(self, eval_context, prescreen):
+        """Constructor."""
+
+        self.eval_context = eval_context
+        self.prescreen = prescreen
+        self.n_evaluations = 0
+        self.n_screened = 0
+        self.n_false_screens = 0
+        self.best = np.inf
+        self.screen_time = 0.0
+
+    def evaluate(self, param_values):
+        scores = self.eval_context.evaluate(
+            tools.schema.Schema().get_params(param_values)
+        )
+
+        return [scores[name] for name in tools.schema.DEFAULT_OBJECTIVE_NAMES]
+
+    def __call__(self, _, param_rows):
+        param_rows = [list(param_values) for param_values in param_rows]
+
+        screened = np.zeros(len(param_rows), dtype=bool)
+        if self.prescreen is not None:
+            start = time.perf_counter()
+            screened, predictions = self.prescreen.screen(param_rows)
+            self.screen_time += time.perf_counter() - start
+
+        objs_rows = []
+        evaluated_rows = []
+        for index, param_values in enumerate(param_rows):
+            objs = self.evaluate(param_values)
+            if screened[index]:
+                self.n_screened += 1
+                if not np.all(objs > self.prescreen.thresholds):
+                    self.n_false_screens += 1
+                objs_rows.append(predictions[index].tolist())
+            else:
+                self.n_evaluations += 1
+                self.best = min(self.best, sum(objs))
+                evaluated_rows.append((param_values, objs))
+                objs_rows.append(objs)
+
+        if self.prescreen is not None:
+            self.prescreen.add_samples(
+                [param_values for param_values, _ in evaluated_rows],
+                [objs for _, objs in evaluated_rows],
+            )
+
+        return objs_rows
+
+
+def run_optimisation(eval_context, setting, seed, offspring_size, max_ngen):
+    prescreen = None
+    if setting is not None:
+        quantile, confidence = setting
+        prescreen = tools.surrogate.PreScreen(
+            quantile=quantile, confidence=confidence
+        )
+    screening_map = ScreeningMap(eval_context, prescreen)
+
+    optimisation = bpopt.optimisations.DEAPOptimisation(
+        evaluator=Evaluator(
+            params=[
+                bpopt.parameters.Parameter("gnabar_hh", bounds=[0.05, 0.125]),
+                bpopt.parameters.Parameter("gkbar_hh", bounds=[0.01, 0.075]),
+            ],
+            objectives=[
+                bpopt.objectives.Objective(name)
+                for name in tools.schema.DEFAULT_OBJECTIVE_NAMES
+            ],
+        ),
+        offspring_size=offspring_size,
+        map_function=screening_map,
+        seed=seed,
+    )
+    final_pop, _, _, _ = optimisation.run(max_ngen=max_ngen)
+    final = statistics.mean(
+        sum(screening_map.evaluate(list(individual)))
+        for individual in final_pop
+    )
+
+    return screening_map, final
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--offspring", type=int, default=32)
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--seeds", type=int, default=2)
+    args = parser.parse_args()
+
+    eval_context = evaluator.EvalContext(
+        isolate_protocols=False, warm_start=True
+    )
+
+    for setting in SETTINGS:
+        runs = [
+            run_optimisation(
+                eval_context, setting, seed, args.offspring, args.generations
+            )
+            for seed in range(1, args.seeds + 1)
+        ]
+        n_evaluations = sum(run.n_evaluations for run, _ in runs)
+        n_screened = sum(run.n_screened for run, _ in runs)
+        label = (
+            "no pre-screen"
+            if setting is None
+            else f"quantile {setting[0]}, {setting[1]} std"
+        )
+        print(
+            f"{label:>22}: {n_evaluations / len(runs):6.1f} evaluations, "
+            f"saved {100 * n_screened / (n_evaluations + n_screened):4.1f} "
+            f"%, false screens "
+            f"{sum(run.n_false_screens for run, _ in runs) / len(runs):4.1f}"
+            f", best {statistics.mean(run.best for run, _ in runs):6.2f}, "
+            f"final {statistics.mean(final for _, final in runs):6.2f}, "
+            f"screening "
+            f"{1e3 * sum(run.screen_time for run, _ in runs) / len(runs):5.0f}"
+            " ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
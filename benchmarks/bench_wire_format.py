@@ -0,0 +1,112 @@
+"""Serialisation of map parameters and engine results, lists versus packed.
+
+Every payload goes through the encoding, the osparc_control message
+serialisation and back, as it does between two transmitters.
+"""
+
+import sys
+import time
+import random
+import pathlib
+import argparse
+import statistics
+
+import osparc_control as oc
+import osparc_control.models
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+import tools.schema
+import tools.wire
+
+PARAM_NAMES = tools.schema.DEFAULT_PARAM_NAMES
+OBJECTIVE_NAMES = tools.schema.DEFAULT_OBJECTIVE_NAMES
+
+
+def send(payload):
+    """Serialise and deserialise payload as a command reply."""
+
+    raw = oc.models.CommandReply(reply_id="0", payload=payload).to_bytes()
+
+    return oc.models.CommandReply.from_bytes(raw).payload, len(raw)
+
+
+def params_lists(params_list):
+    payload, size = send(params_list)
+
+    return [(task_id, values) for task_id, values in payload], size
+
+
+def params_packed(params_list):
+    packed = tools.wire.pack_rows(
+        PARAM_NAMES,
+        [task_id for task_id, _ in params_list],
+        [values for _, values in params_list],
+    )
+    payload, size = send(packed)
+    _, task_ids, values = tools.wire.unpack_rows(payload)
+
+    return list(zip(task_ids.tolist(), values.tolist())), size
+
+
+def results_lists(results):
+    payload, size = send(
+        [{"task_id": task_id, "objs": objs} for task_id, objs in results]
+    )
+
+    return [(result["task_id"], result["objs"]) for result in payload], size
+
+
+def results_packed(results):
+    packed = tools.wire.pack_dicts(
+        [task_id for task_id, _ in results], [objs for _, objs in results]
+    )
+    payload, size = send(packed)
+
+    return tools.wire.unpack_dicts(payload), size
+
+
+def time_function(function, data, n_repeats):
+    timings = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        output, size = function(data)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings), size, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    params_list = [
+        (task_id, [rng.random() for _ in PARAM_NAMES])
+        for task_id in range(args.rows)
+    ]
+    results = [
+        (task_id, {name: rng.random() for name in OBJECTIVE_NAMES})
+        for task_id in range(args.rows)
+    ]
+
+    for label, data, functions in [
+        ("map params", params_list, [params_lists, params_packed]),
+        ("eval_batch results", results, [results_lists, results_packed]),
+    ]:
+        outputs = []
+        for encoding, function in zip(["lists", "packed"], functions):
+            duration, size, output = time_function(
+                function, data, args.repeats
+            )
+            outputs.append(output)
+            print(
+                f"{label:>18}, {encoding:>6}: {1e3 * duration:8.2f} ms  "
+                f"{size / 1e3:8.1f} kB  ({args.rows} rows)"
+            )
+        assert outputs[0] == outputs[1]
+
+
+if __name__ == "__main__":
+    main()
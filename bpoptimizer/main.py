@@ -1,5 +1,7 @@
 import os
 import sys
+import time
+import random
 
 from pathlib import Path
 
@@ -14,6 +16,11 @@ sys.path.append(str(Path(__file__).resolve().parent.parent))
 import tools.maps
 
 POLLING_WAIT = 0.1  # second
+OFFSPRING_SIZE = 3
+MAX_NGEN = 10
+# Evaluations in flight per worker of the engines in steady-state mode, a
+# worker that finishes has its next task queued already
+IN_FLIGHT_PER_WORKER = 2
 
 
 def main():
@@ -26,9 +33,15 @@ def main():
     caller_file_path = main_outputs_dir / "output_1" / "caller.json"
 
     map_object = tools.maps.oSparcFileMap(map_file_path, caller_file_path)
-    map_function = map_object.map_function
 
-    optimizer = Optimizer(map=map_function)
+    # "generational" or "steady_state"
+    mode = os.environ.get("OSPARC_OPTIMIZER_MODE", "generational")
+    if mode == "generational":
+        optimizer = Optimizer(map=map_object.map_function)
+    elif mode == "steady_state":
+        optimizer = SteadyStateOptimizer(map_object=map_object)
+    else:
+        raise ValueError(f"Unknown optimizer mode: {mode}")
     final_pop = optimizer.start()
 
     return final_pop
@@ -71,14 +84,135 @@ class Optimizer:
         logger.info("Starting optimization")
 
         optimisation = bpopt.optimisations.DEAPOptimisation(
-            evaluator=self.evaluator, offspring_size=3, map_function=self.map
+            evaluator=self.evaluator,
+            offspring_size=OFFSPRING_SIZE,
+            map_function=self.map,
         )
 
-        final_pop, hall_of_fame, logs, hist = optimisation.run(max_ngen=10)
+        start_time = time.time()
+        final_pop, hall_of_fame, logs, hist = optimisation.run(
+            max_ngen=MAX_NGEN
+        )
+        log_evaluation_rate(
+            sum(logs.select("nevals")), time.time() - start_time
+        )
         logger.info(f"Optimization done: {final_pop}")
 
         return final_pop
 
 
+class SteadyStateOptimizer(Optimizer):
+    """Asynchronous steady-state evolution.
+
+    Instead of waiting for a whole generation, a new individual is
+    submitted to the map as soon as one returns, so that the workers of
+    all engines are always busy. Every returned individual joins the
+    population, which is then reduced to offspring_size by the selector
+    of DEAPOptimisation. The run evaluates as many individuals as the
+    generational mode.
+
+    The number of evaluations in flight is n_in_flight, or
+    OSPARC_OPTIMIZER_IN_FLIGHT, if set, and otherwise IN_FLIGHT_PER_WORKER
+    per worker of the engines, as the map reports with every poll, and
+    OFFSPRING_SIZE before the first poll.
+    """
+
+    def __init__(self, map_object, n_in_flight=None):
+        """Constructor."""
+
+        super().__init__(map=map_object.map_function)
+
+        self.map_object = map_object
+        if n_in_flight is None:
+            n_in_flight = os.environ.get("OSPARC_OPTIMIZER_IN_FLIGHT")
+        self.n_in_flight = int(n_in_flight) if n_in_flight else None
+        self.max_evals = OFFSPRING_SIZE * MAX_NGEN
+
+    def get_n_in_flight(self):
+        """Number of evaluations to keep in flight."""
+
+        if self.n_in_flight is not None:
+            return self.n_in_flight
+        if self.map_object.n_workers is None:
+            return OFFSPRING_SIZE
+
+        # Engines can all have left for a moment
+        return IN_FLIGHT_PER_WORKER * max(1, self.map_object.n_workers)
+
+    def start(self):
+        logger.info("Starting steady-state optimization")
+
+        optimisation = bpopt.optimisations.DEAPOptimisation(
+            evaluator=self.evaluator,
+            offspring_size=OFFSPRING_SIZE,
+            map_function=self.map,
+        )
+        toolbox = optimisation.toolbox
+
+        population = []
+        # task_id -> individual being evaluated
+        pending_individuals = {}
+        n_submitted = 0
+
+        start_time = time.time()
+        while True:
+            n_new = min(
+                self.get_n_in_flight() - len(pending_individuals),
+                self.max_evals - n_submitted,
+            )
+            if n_new > 0:
+                individuals = self.get_new_individuals(
+                    toolbox, optimisation, population, n_new
+                )
+                params_list = []
+                for individual in individuals:
+                    pending_individuals[n_submitted] = individual
+                    params_list.append((n_submitted, list(individual)))
+                    n_submitted += 1
+                self.map_object.submit(params_list)
+
+            if len(pending_individuals) == 0:
+                break
+
+            results, _ = self.map_object.poll()
+            for task_id, objs in results:
+                individual = pending_individuals.pop(task_id)
+                individual.fitness.values = objs
+                population.append(individual)
+
+            if len(population) > OFFSPRING_SIZE:
+                population = toolbox.select(population, OFFSPRING_SIZE)
+            optimisation.hof.update(population)
+
+        log_evaluation_rate(n_submitted, time.time() - start_time)
+        final_pop = [list(individual) for individual in population]
+        logger.info(f"Optimization done: {final_pop}")
+
+        return final_pop
+
+    def get_new_individuals(self, toolbox, optimisation, population, n_new):
+        """Random individuals until the population is full, offspring of
+        the population after that."""
+
+        if len(population) < OFFSPRING_SIZE:
+            return toolbox.population(n=n_new)
+
+        parents = [random.choice(population) for _ in range(n_new)]
+        offspring = toolbox.variate(
+            parents, toolbox, optimisation.cxpb, optimisation.mutpb
+        )
+        for individual in offspring:
+            del individual.fitness.values
+
+        return offspring
+
+
+def log_evaluation_rate(n_evals, elapsed):
+    logger.info(
+        f"Evaluated {n_evals} individuals in {elapsed:.2f} s, "
+        f"{n_evals / elapsed:.2f} evaluations/s"
+    )
+
+
 if __name__ == "__main__":
     main()
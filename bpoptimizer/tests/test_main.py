@@ -3,6 +3,7 @@ import unittest.mock as mock
 import sys
 sys.path.append(".")
 import json
+import random
 
 import main
 
@@ -37,3 +38,96 @@ def test_main(mocked_exists, mocked_unlink):
         [0.1098333304539681, 0.02657948667306241],
         [0.11090795157113967, 0.02657948667306241],
         [0.11090795157113967, 0.024593577932680303]]
+
+
+class StubMap:
+    """Stand-in for tools.maps.oSparcFileMap in streaming mode, a poll
+    returns one of the submitted tasks, in a random order."""
+
+    def __init__(self, n_workers=None):
+        self.rng = random.Random(1)
+        # Reported by the polls
+        self.n_workers = None
+        self.engine_n_workers = n_workers
+        # task_id -> params
+        self.pending = {}
+        self.submitted = []
+        # Tasks in flight at every poll
+        self.n_in_flight = []
+
+    def map_function(self, *map_input):
+        raise AssertionError("A steady-state optimizer only streams")
+
+    def submit(self, params_list):
+        for task_id, params in params_list:
+            assert task_id not in self.pending
+            self.pending[task_id] = params
+            self.submitted.append(params)
+
+    def poll(self):
+        self.n_in_flight.append(len(self.pending))
+        self.n_workers = self.engine_n_workers
+        task_id = self.rng.choice(sorted(self.pending))
+        params = self.pending.pop(task_id)
+        objs = [abs(params[0] - 0.1), abs(params[1] - 0.03)]
+
+        return [(task_id, objs)], len(self.pending) == 0
+
+
+def test_steady_state(monkeypatch):
+    monkeypatch.setenv('DY_SIDECAR_PATH_INPUTS', 'tests/test-inputs')
+    monkeypatch.setenv('DY_SIDECAR_PATH_OUTPUTS', 'tests/test-outputs')
+    monkeypatch.setenv('OSPARC_OPTIMIZER_MODE', 'steady_state')
+    monkeypatch.setenv('OSPARC_OPTIMIZER_IN_FLIGHT', '5')
+    stub_map = StubMap()
+    monkeypatch.setattr(
+        main.tools.maps, 'oSparcFileMap', lambda *args: stub_map)
+    # The population each new individual is made from
+    populations = []
+    get_new_individuals = main.SteadyStateOptimizer.get_new_individuals
+
+    def record_population(self, toolbox, optimisation, population, n_new):
+        populations.append([list(individual) for individual in population])
+        return get_new_individuals(
+            self, toolbox, optimisation, population, n_new)
+
+    monkeypatch.setattr(
+        main.SteadyStateOptimizer, 'get_new_individuals', record_population)
+
+    final_pop = main.main()
+
+    # Every result is replaced right away, up to the in-flight limit
+    n_evals = main.OFFSPRING_SIZE * main.MAX_NGEN
+    assert len(stub_map.submitted) == n_evals
+    assert stub_map.n_in_flight == [
+        min(5, n_evals - n_returned) for n_returned in range(n_evals)]
+    # and made from the population as it is then, which every result
+    # joins without waiting for the others
+    assert len(populations) == n_evals - 5 + 1
+    assert [len(population) for population in populations[:4]] == [
+        0, 1, 2, main.OFFSPRING_SIZE]
+    offspring = stub_map.submitted[5:]
+    assert any(
+        individual in offspring
+        for population in populations for individual in population)
+    assert len(final_pop) == main.OFFSPRING_SIZE
+    assert all(individual in stub_map.submitted for individual in final_pop)
+
+
+def test_steady_state_keeps_workers_busy(monkeypatch):
+    monkeypatch.setenv('DY_SIDECAR_PATH_INPUTS', 'tests/test-inputs')
+    monkeypatch.setenv('DY_SIDECAR_PATH_OUTPUTS', 'tests/test-outputs')
+    monkeypatch.setenv('OSPARC_OPTIMIZER_MODE', 'steady_state')
+    monkeypatch.delenv('OSPARC_OPTIMIZER_IN_FLIGHT', raising=False)
+    stub_map = StubMap(n_workers=4)
+    monkeypatch.setattr(
+        main.tools.maps, 'oSparcFileMap', lambda *args: stub_map)
+
+    main.main()
+
+    # Until the first poll tells the number of workers of the engines
+    n_evals = main.OFFSPRING_SIZE * main.MAX_NGEN
+    n_in_flight = main.IN_FLIGHT_PER_WORKER * 4
+    assert stub_map.n_in_flight == [main.OFFSPRING_SIZE] + [
+        min(n_in_flight, n_evals - n_returned)
+        for n_returned in range(1, n_evals)]
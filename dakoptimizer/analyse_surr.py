@@ -0,0 +1,320 @@
+"""Incremental analysis of the surrogate errors of a Dakota run.
+
+At every iteration i of surrogate_based_global, Dakota writes the final
+population of the surrogate optimisation to finaldata{i}.dat, and the
+same points evaluated with the true model to finaldatatruth{i}.dat, in the
+same order. This script reads every iteration once, as soon as both of its
+files are complete, pairs their rows by index, updates the RMS errors of
+the objectives and appends the iteration to an SQLite store, which
+plot_surr.py plots. With --follow it keeps polling the run directory while
+Dakota runs, and a restarted analysis resumes after the last stored
+iteration.
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import pathlib
+import argparse
+import warnings
+import collections
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("AnalyseSurr")
+
+DEFAULT_STORE_FILE_NAME = "surr_errors.sqlite"
+DEFAULT_N_PARAMS = 2
+DEFAULT_WINDOW = 5
+DEFAULT_POLL_INTERVAL = 1.0  # s
+# Relative tolerance of the parameter values of paired rows
+PARAM_RTOL = 1e-6
+
+
+class TableReader:
+    """Rows of whitespace separated numbers of a file that is being written.
+
+    Every read parses only the lines completed since the previous one, so a
+    file that is read while it is written is parsed once. The lines are
+    parsed in a single pass over their bytes, into a flat array that is
+    reshaped to the number of columns of the first line.
+    """
+
+    def __init__(self, file_path):
+        """Constructor."""
+
+        self.file_path = file_path
+        self.reset()
+
+    def reset(self):
+        # Bytes of the complete lines parsed so far
+        self.offset = 0
+        self.n_columns = None
+        # Arrays of the rows of every read
+        self.chunks = []
+
+    def read(self):
+        """Return the rows of the file, None while it is missing, empty or
+        its last line incomplete."""
+
+        try:
+            with open(self.file_path, "rb") as table_file:
+                if os.fstat(table_file.fileno()).st_size < self.offset:
+                    # Written again from the start
+                    self.reset()
+                table_file.seek(self.offset)
+                data = table_file.read()
+        except FileNotFoundError:
+            return None
+
+        end = data.rfind(b"\n") + 1
+        if end > 0:
+            self.chunks.append(self.parse(data[:end]))
+            self.offset += end
+        if self.offset == 0 or end != len(data):
+            return None
+
+        if len(self.chunks) > 1:
+            self.chunks = [np.concatenate(self.chunks)]
+
+        return self.chunks[0]
+
+    def parse(self, lines):
+        if self.n_columns is None:
+            self.n_columns = len(lines[: lines.index(b"\n")].split())
+        n_rows = lines.count(b"\n")
+
+        with warnings.catch_warnings():
+            # Raised instead of stopping at the first value that isn't a
+            # number
+            warnings.simplefilter("error", DeprecationWarning)
+            try:
+                values = np.fromstring(lines, dtype=np.float64, sep=" ")
+            except DeprecationWarning:
+                values = None
+        if values is None or len(values) != n_rows * self.n_columns:
+            raise ValueError(
+                f"{self.file_path} isn't a table of {self.n_columns} "
+                f"columns after byte {self.offset}"
+            )
+
+        return values.reshape(n_rows, self.n_columns)
+
+
+def get_errors(surrogate, truth, n_params):
+    """Errors of the surrogate objectives of every row of surrogate, NaN
+    where the row of truth with the same index is missing or has other
+    parameter values."""
+
+    n_rows = min(len(surrogate), len(truth))
+    errors = np.full((len(surrogate), surrogate.shape[1] - n_params), np.nan)
+    paired = np.all(
+        np.isclose(
+            surrogate[:n_rows, :n_params],
+            truth[:n_rows, :n_params],
+            rtol=PARAM_RTOL,
+            atol=0.0,
+        ),
+        axis=1,
+    )
+    errors[:n_rows][paired] = (
+        surrogate[:n_rows, n_params:] - truth[:n_rows, n_params:]
+    )[paired]
+
+    return errors
+
+
+class RollingRms:
+    """RMS errors of the objectives over the last window iterations.
+
+    NaN errors, of rows without a true value, are left out.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        """Constructor."""
+
+        # (sums of squared errors, counts) of every iteration
+        self.iterations = collections.deque(maxlen=window)
+
+    def add(self, errors):
+        """Add the errors of an iteration, return its RMS errors."""
+
+        finite = np.isfinite(errors)
+        sq_error_sums = np.sum(np.where(finite, errors, 0.0) ** 2, axis=0)
+        counts = np.sum(finite, axis=0)
+        self.iterations.append((sq_error_sums, counts))
+
+        return get_rms(sq_error_sums, counts)
+
+    def get(self):
+        return get_rms(
+            sum(sq_error_sums for sq_error_sums, _ in self.iterations),
+            sum(counts for _, counts in self.iterations),
+        )
+
+
+def get_rms(sq_error_sums, counts):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.sqrt(sq_error_sums / counts)
+
+
+class SurrErrorStore:
+    """Iterations of the analysis in an SQLite database, their errors and
+    RMS errors as float64 blobs."""
+
+    def __init__(self, store_file_path):
+        """Constructor."""
+
+        self.store_file_path = store_file_path
+        self.connection = sqlite3.connect(str(store_file_path))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS iterations ("
+            "iteration INTEGER PRIMARY KEY, "
+            "n_objs INTEGER NOT NULL, "
+            "errors BLOB NOT NULL, "
+            "rms BLOB NOT NULL, "
+            "rolling_rms BLOB NOT NULL)"
+        )
+        self.connection.commit()
+
+    def add_iteration(self, iteration, errors, rms, rolling_rms):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO iterations VALUES (?, ?, ?, ?, ?)",
+                (
+                    iteration,
+                    errors.shape[1],
+                    errors.astype(np.float64).tobytes(),
+                    rms.astype(np.float64).tobytes(),
+                    rolling_rms.astype(np.float64).tobytes(),
+                ),
+            )
+
+    def get_iterations(self):
+        """Dicts of the stored iterations, in order."""
+
+        rows = self.connection.execute(
+            "SELECT * FROM iterations ORDER BY iteration"
+        ).fetchall()
+
+        return [
+            {
+                "iteration": iteration,
+                "errors": np.frombuffer(errors).reshape(-1, n_objs),
+                "rms": np.frombuffer(rms),
+                "rolling_rms": np.frombuffer(rolling_rms),
+            }
+            for iteration, n_objs, errors, rms, rolling_rms in rows
+        ]
+
+    def close(self):
+        self.connection.close()
+
+
+def analyse(
+    run_dir,
+    store,
+    n_params=DEFAULT_N_PARAMS,
+    window=DEFAULT_WINDOW,
+    follow=False,
+    poll_interval=DEFAULT_POLL_INTERVAL,
+    max_iterations=None,
+):
+    """Store the iterations of run_dir that aren't in store yet.
+
+    Without follow, stops at the first incomplete iteration. With follow,
+    an iteration is read once the sizes of its files are unchanged for a
+    poll interval, until max_iterations.
+    """
+
+    rolling_rms = RollingRms(window)
+    iteration = 1
+    for stored in store.get_iterations():
+        rolling_rms.add(stored["errors"])
+        iteration = stored["iteration"] + 1
+
+    readers = None
+    last_sizes = None
+    while max_iterations is None or iteration <= max_iterations:
+        if readers is None:
+            readers = [
+                TableReader(run_dir / f"finaldata{iteration}.dat"),
+                TableReader(run_dir / f"finaldatatruth{iteration}.dat"),
+            ]
+        # Files that are being written are parsed as they grow
+        tables = [reader.read() for reader in readers]
+        sizes = [reader.offset for reader in readers]
+        is_stable = not follow or sizes == last_sizes
+        last_sizes = sizes
+
+        if not is_stable or any(table is None for table in tables):
+            if not follow:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        surrogate, truth = tables
+        errors = get_errors(surrogate, truth, n_params)
+        n_unpaired = int(np.sum(np.isnan(errors[:, 0])))
+        if n_unpaired > 0:
+            logger.warning(
+                f"Iteration {iteration}: {n_unpaired} of {len(surrogate)} "
+                "rows have no true value"
+            )
+        rms = rolling_rms.add(errors)
+        store.add_iteration(iteration, errors, rms, rolling_rms.get())
+        logger.info(
+            f"Iteration {iteration}: RMS errors {rms.tolist()}, "
+            f"over the last {len(rolling_rms.iterations)} iterations "
+            f"{rolling_rms.get().tolist()}"
+        )
+        iteration += 1
+        readers = None
+        last_sizes = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--run-dir", type=pathlib.Path, default=".")
+    parser.add_argument(
+        "--store",
+        type=pathlib.Path,
+        default=DEFAULT_STORE_FILE_NAME,
+        help="SQLite file of the analysis, relative to the run directory",
+    )
+    parser.add_argument("--params", type=int, default=DEFAULT_N_PARAMS)
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=DEFAULT_WINDOW,
+        help="iterations of the rolling RMS errors",
+    )
+    parser.add_argument("--follow", action="store_true")
+    parser.add_argument(
+        "--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL
+    )
+    parser.add_argument("--max-iterations", type=int, default=None)
+    args = parser.parse_args()
+
+    store = SurrErrorStore(args.run_dir / args.store)
+    try:
+        analyse(
+            args.run_dir,
+            store,
+            n_params=args.params,
+            window=args.window,
+            follow=args.follow,
+            poll_interval=args.poll_interval,
+            max_iterations=args.max_iterations,
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
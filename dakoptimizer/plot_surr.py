@@ -1,61 +1,68 @@
-import pandas
-import matplotlib.pyplot as plt
-
+import pathlib
+import argparse
 
-# fig_f1 = plt.Figure()
-# fig_f2 = plt.Figure()
-
-fig1, axes = plt.subplots(2, 1)
-fig2, axes_rms = plt.subplots(1, 1)
+import numpy as np
+import matplotlib.pyplot as plt
 
-rms_f1 = []
-rms_f2 = []
+import analyse_surr
 
-for iteration in range(1, 50):
-    cols = ["x1", "x2", "f1", "f2"]
 
-    data = pandas.read_csv(
-        f"finaldata{iteration}.dat",
-        delim_whitespace=True,
-        header=None,
-        names=cols,
+def main():
+    parser = argparse.ArgumentParser(
+        description="Plot the surrogate errors of a Dakota run, after "
+        "analysing the iterations that analyse_surr.py hasn't stored yet"
     )
-
-    cols = ["x1", "x2", "f1truth", "f2truth"]
-
-    data_truth = pandas.read_csv(
-        f"finaldatatruth{iteration}.dat",
-        delim_whitespace=True,
-        header=None,
-        names=cols,
+    parser.add_argument("--run-dir", type=pathlib.Path, default=".")
+    parser.add_argument(
+        "--store",
+        type=pathlib.Path,
+        default=analyse_surr.DEFAULT_STORE_FILE_NAME,
+        help="SQLite file of the analysis, relative to the run directory",
     )
-
-    merged = pandas.merge(data, data_truth, how="left", on=["x1", "x2"])
-
-    # merged[["f1", "f1truth"]].plot.line(ax=axes[0])
-    # merged[["f2", "f2truth"]].plot.line(ax=axes[1])
-
-    axes[0].plot(abs(merged["f1"] - merged["f1truth"]), label=iteration)
-    axes[1].plot(abs(merged["f2"] - merged["f2truth"]), label=iteration)
-
-    rms_f1.append(((merged.f1 - merged.f1truth) ** 2).mean() ** 0.5)
-    rms_f2.append(((merged.f2 - merged.f2truth) ** 2).mean() ** 0.5)
-    # plt.scatter((data["f1"], data["f2"]), "o")
-
-for ax in axes:
-    # ax.set_ylim([0, 100])
-    ax.set_yscale("log")
-    ax.legend()
-    # ax.get_legend().remove()
-
-axes_rms.plot(rms_f1, label="f1")
-axes_rms.plot(rms_f2, label="f2")
-
-for ax in [axes_rms]:
-    ax.set_yscale("log")
-    ax.legend()
-    ax.set_ylabel("RMS error")
-    ax.set_xlabel("iteration")
-
-
-plt.show()
+    parser.add_argument(
+        "--params", type=int, default=analyse_surr.DEFAULT_N_PARAMS
+    )
+    args = parser.parse_args()
+
+    store = analyse_surr.SurrErrorStore(args.run_dir / args.store)
+    try:
+        analyse_surr.analyse(args.run_dir, store, n_params=args.params)
+        iterations = store.get_iterations()
+    finally:
+        store.close()
+
+    fig1, axes = plt.subplots(2, 1)
+    fig2, axes_rms = plt.subplots(1, 1)
+
+    for stored in iterations:
+        for index, ax in enumerate(axes):
+            ax.plot(abs(stored["errors"][:, index]), label=stored["iteration"])
+
+    for ax in axes:
+        ax.set_yscale("log")
+        ax.legend()
+
+    numbers = [stored["iteration"] for stored in iterations]
+    rms = np.array([stored["rms"] for stored in iterations])
+    rolling_rms = np.array([stored["rolling_rms"] for stored in iterations])
+    for index in range(rms.shape[1] if len(iterations) > 0 else 0):
+        (line,) = axes_rms.plot(numbers, rms[:, index], label=f"f{index + 1}")
+        axes_rms.plot(
+            numbers,
+            rolling_rms[:, index],
+            linestyle="--",
+            color=line.get_color(),
+            label=f"f{index + 1}, rolling",
+        )
+
+    for ax in [axes_rms]:
+        ax.set_yscale("log")
+        ax.legend()
+        ax.set_ylabel("RMS error")
+        ax.set_xlabel("iteration")
+
+    plt.show()
+
+
+if __name__ == "__main__":
+    main()
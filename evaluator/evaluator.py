@@ -1,34 +1,239 @@
 import os
 import sys
-import json
-import pathlib
+import math
 import time
+import pathlib
 import uuid
+import hashlib
+import functools
+import traceback
+import collections
 import logging
+import cProfile
 import osparc_control as oc
 import socket
+import multiprocessing
+import concurrent.futures
 
 sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+import tools.control
+import tools.events
+import tools.metrics
 import tools.network
+import tools.profiling
+import tools.schema
+import tools.tracing
+import tools.wire
 
-import bluepyopt.ephys as ephys
+import features
 
 DEFAULT_POLLING_WAIT = 0.1  # seconds
+DEFAULT_MORPH_PATH = pathlib.Path(__file__).resolve().parent / "simple.swc"
+# eFEL's default Threshold, at which the Spikecount features count spikes
+SPIKE_THRESHOLD = -20.0  # mV
+# Score of every objective of a task whose evaluation failed, the default
+# max_score of bluepyopt's eFELFeature
+FAILED_SCORE = 250.0
+# Start method of the process pools created once the engine runs threads,
+# see check_pools
+RESTART_START_METHOD = "forkserver"
+# Tasks evaluated together by a worker. Larger batches barely speed up the
+# feature extraction further, but leave the workers unbalanced at the end
+# of a generation
+MAX_WORKER_BATCH_SIZE = 2
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Evaluator")
 
+# bluepyopt.ephys, which loads NEURON and eFEL, imported by import_ephys
+# once the engine registered
+ephys = None
+# Evaluation context of a process pool worker, see init_worker
+worker_eval_context = None
+# Time of building worker_eval_context, recorded with the first evaluation
+worker_setup_timer = None
+# NrnSimulator subclass defined by create_simulator once ephys is imported
+TimedNrnSimulator = None
+
+
+def main(name, on_workers_started=None):
+    """Main.
 
-def main(name):
-    """Main."""
+    on_workers_started is called once the workers are forked, e.g. to start
+    threads that the workers mustn't inherit.
+    """
 
     engine = EvalEngine(name)
-    engine.start()
+    engine.start(on_workers_started)
+
+
+def get_model_id(morph_path=DEFAULT_MORPH_PATH, early_stop_score=None):
+    """Hash of the model definition, results are only shared between
+    engines with the same model id. Capped scores differ from the others,
+    so early_stop_score is part of it."""
+
+    model_hash = hashlib.sha256()
+    model_hash.update(pathlib.Path(__file__).read_bytes())
+    model_hash.update(pathlib.Path(features.__file__).read_bytes())
+    model_hash.update(pathlib.Path(morph_path).read_bytes())
+    if early_stop_score is not None:
+        model_hash.update(f"early_stop_score={early_stop_score}".encode())
+
+    return model_hash.hexdigest()
+
+
+def get_default_n_workers():
+    if "OSPARC_EVALUATOR_WORKERS" in os.environ:
+        return int(os.environ["OSPARC_EVALUATOR_WORKERS"])
+
+    return len(os.sched_getaffinity(0))
+
+
+def get_early_stop_score():
+    """Score at which the workers stop simulating a protocol, set with
+    OSPARC_EVALUATOR_EARLY_STOP_SCORE, None if early stopping is off."""
+
+    early_stop_score = os.environ.get("OSPARC_EVALUATOR_EARLY_STOP_SCORE")
+
+    return float(early_stop_score) if early_stop_score else None
+
+
+def import_ephys():
+    global ephys
+
+    if ephys is None:
+        import bluepyopt.ephys as ephys
+
+
+def init_worker(objective_names=None):
+    """Build the evaluation context of a process pool worker.
+
+    Every worker keeps its own NEURON instance and reuses it for all the
+    evaluations it runs. A warm-up evaluation loads what NEURON and eFEL
+    only load on first use, so that the first task isn't slower. Workers
+    forked from a process with a context, see forkserver.py, inherit it,
+    with the early stop score and the objective names of their engine,
+    all the objectives of the context if objective_names is None.
+    """
+
+    global worker_eval_context, worker_setup_timer
+
+    if worker_eval_context is None:
+        # The worker is a long-lived process that only runs evaluations,
+        # so the protocols don't need to be isolated in forked
+        # subprocesses
+        worker_setup_timer = tools.profiling.PhaseTimer()
+        with worker_setup_timer.phase("setup"):
+            worker_eval_context = EvalContext(
+                isolate_protocols=False, warm_start=True
+            )
+            worker_eval_context.warm_up()
+
+    worker_eval_context.early_stop_score = get_early_stop_score()
+    worker_eval_context.set_objective_names(objective_names)
+
+
+def run_worker_eval(input_params, timer=None):
+    return run_eval(
+        input_params, eval_context=worker_eval_context, timer=timer
+    )
+
+
+def run_worker_timed_batch(input_params_list, record=False, profile_path=None):
+    """Return, for every parameter dict of input_params_list, its
+    objectives, its evaluation time in the worker, which the map uses to
+    predict the cost of tasks, and what the worker recorded, or the
+    exception its evaluation raised.
+
+    The parameter dicts are evaluated together, see
+    EvalContext.evaluate_batch. If that raises, they are evaluated one at a
+    time, so that only the failing ones get an exception.
+
+    With record, the worker records its pid, the start time of the
+    evaluation, with the first parameter dict the PhaseTimer of the phases
+    of the batch, None otherwise, and the size of the batch. With
+    profile_path, a cProfile of the batch is written there.
+    """
+
+    global worker_setup_timer
+
+    timer = None
+    if record:
+        timer = worker_setup_timer or tools.profiling.PhaseTimer()
+        worker_setup_timer = None
+    profile = cProfile.Profile() if profile_path is not None else None
+
+    start_time = time.time()
+    durations = []
+    if profile is not None:
+        profile.enable()
+    try:
+        objs_list = worker_eval_context.evaluate_batch(
+            input_params_list, timer=timer, durations=durations
+        )
+    except Exception as error:
+        if len(input_params_list) == 1:
+            # Sent back with the traceback of the worker, as a type that
+            # unpickles in the engine
+            return [RuntimeError("".join(traceback.format_exception(error)))]
+        return [
+            result
+            for input_params in input_params_list
+            for result in run_worker_timed_batch([input_params], record)
+        ]
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(profile_path)
+
+    if not record:
+        return [
+            (objs, duration, None)
+            for objs, duration in zip(objs_list, durations)
+        ]
+
+    results = []
+    for objs, duration in zip(objs_list, durations):
+        results.append(
+            (
+                objs,
+                duration,
+                (os.getpid(), start_time, timer, len(input_params_list)),
+            )
+        )
+        start_time += duration
+        timer = None
+
+    return results
+
+
+def is_lost(future):
+    """Whether the task of future was lost with a broken process pool."""
+
+    return future.done() and isinstance(
+        future.exception(), concurrent.futures.process.BrokenProcessPool
+    )
 
 
 class EvalEngine:
-    def __init__(self, name, polling_wait=DEFAULT_POLLING_WAIT):
-        """Constructor."""
+    def __init__(
+        self,
+        name,
+        polling_wait=DEFAULT_POLLING_WAIT,
+        n_workers=None,
+        worker_initializer=init_worker,
+        worker_function=run_worker_timed_batch,
+        objective_names=tools.schema.DEFAULT_OBJECTIVE_NAMES,
+    ):
+        """Constructor.
+
+        The process pool workers run worker_initializer once, with
+        objective_names, and worker_function for every batch of tasks,
+        which benchmarks replace with stand-ins that don't simulate, see
+        run_worker_timed_batch. Only the objectives of objective_names are
+        evaluated. A task whose evaluation fails gets FAILED_SCORE for
+        every one of them, and is marked as failed in the reply.
+        """
 
         self.name = name
         self.id = str(uuid.uuid4())
@@ -38,27 +243,169 @@ class EvalEngine:
         self.input2_dir = pathlib.Path(
             os.environ["DY_SIDECAR_PATH_INPUTS"]
         ) / pathlib.Path("input_2")
-        self.master_file_path = self.input2_dir / "master.json"
+        # Written by the map to send commands to this engine only
+        self.control_file_reader = tools.control.JsonFileReader(
+            tools.control.get_control_file_path(self.input2_dir, self.id)
+        )
         self.engine_file_path = self.output1_dir / "engine.json"
         self.status = "connecting"
         self.polling_wait = polling_wait
+        self.waiter = tools.events.EventWaiter(fallback_wait=polling_wait)
         self.transmitter = None
+        self.n_workers = (
+            n_workers if n_workers is not None else get_default_n_workers()
+        )
+        self.pool = None
+        self.worker_initializer = worker_initializer
+        self.worker_function = worker_function
+        self.objective_names = list(objective_names)
+        # request_id -> (receive time, batch or not, list of (task_id,
+        # params), list of futures, trace ids or None), a future per task,
+        # which returns the objectives, the evaluation time and what the
+        # worker recorded
+        self.pending_requests = {}
+        # Single worker pool that evaluates the tasks lost with a broken
+        # pool again, one at a time, see check_pools
+        self.quarantine_pool = None
+        # (futures of the request, index, params) of the lost tasks
+        self.quarantined_tasks = collections.deque()
+        # Future of the lost task that the quarantine pool evaluates
+        self.quarantined_future = None
+        # Of eval_batch tasks and results, chosen by the map at connect
+        self.encoding = tools.wire.LISTS_ENCODING
+        # Whether the map sends the trace ids of the tasks, set at connect
+        self.tracing = False
+
+        # Spans of the requests and evaluations, written when
+        # OSPARC_TRACE_DIR is set
+        self.tracer = tools.tracing.from_env("engine", self.id)
+        self.tracer.name_thread(0, "loop")
+        # Workers whose thread has been named in the trace
+        self.traced_pids = set()
+        # Time spent in the phases of the evaluations, written when
+        # OSPARC_PROFILE_DIR is set
+        self.profiler = tools.profiling.from_env("engine", self.id)
+
+        # Exported when OSPARC_METRICS_DIR or OSPARC_METRICS_PORT is set
+        self.metrics = tools.metrics.from_env("engine", self.id)
+        self.tasks_metric = self.metrics.counter(
+            "tasks_total", "Tasks received from the map"
+        )
+        self.evaluation_metric = self.metrics.histogram(
+            "evaluation_seconds", "Evaluation time of a task in a worker"
+        )
+        self.request_metric = self.metrics.histogram(
+            "request_seconds", "Time from receiving a request to its reply"
+        )
+        self.idle_metric = self.metrics.counter(
+            "idle_seconds_total",
+            "Worker-seconds in which a worker had no task",
+        )
+        # The batches finish in the executor's thread, only that thread
+        # counts finished batches
+        self.n_submitted_batches = 0
+        self.n_finished_batches = 0
+        self.idle_update_time = None
 
-    def start(self) -> None:
+    def start(self, on_workers_started=None) -> None:
         """Start engine."""
 
+        self.waiter.watch(self.input2_dir)
+        self.waiter.watch(self.output1_dir)
+
         self.create_engine_file()
+        self.start_pool()
+        # The server thread is started after the workers are forked
+        if on_workers_started is not None:
+            on_workers_started()
+        self.metrics.start()
 
         while True:
             if self.status == "stopping":
                 break
 
-            self.check_master_file()
+            self.check_engine_file()
+            self.check_control_file()
             self.check_transmitter()
+            self.update_idle_time()
+
+            self.metrics.export()
+            self.tracer.export()
+            self.profiler.export()
 
-            time.sleep(self.polling_wait)
+            self.waiter.wait()
 
         self.stop_transmitter()
+        self.stop_pool()
+        self.stop_quarantine_pool()
+        self.waiter.close()
+        self.metrics.close()
+        self.tracer.close()
+        self.profiler.close()
+        if self.profiler.enabled:
+            logger.info(
+                f"Engine {self.id} profile: {self.profiler.get_stats()}"
+            )
+
+        # Lets the map know this engine left
+        self.status = "stopped"
+        self.submit_status()
+
+    def start_pool(self, start_method="fork"):
+        """Start the workers, which build their evaluation contexts while
+        the engine connects to the map."""
+
+        # Shared by the forked workers instead of imported by each of them
+        if self.worker_initializer is init_worker and start_method == "fork":
+            import_ephys()
+
+        # The workers are forked before the transmitter starts its threads,
+        # with the fork context all of them are forked by the first submit
+        self.pool = self.create_pool(self.n_workers, start_method)
+        self.pool.submit(int)
+
+        logger.info(
+            f"Engine {self.id} started {self.n_workers} workers with "
+            f"{start_method}"
+        )
+
+    def create_pool(self, n_workers, start_method="fork"):
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=self.worker_initializer,
+            initargs=(self.objective_names,),
+        )
+
+    def set_objective_names(self, objective_names):
+        """Only evaluate the objectives of objective_names, those of the
+        schema of the caller of the map.
+
+        The workers get them when they start, so running pools are started
+        again, with RESTART_START_METHOD as the engine runs threads.
+        """
+
+        objective_names = list(objective_names)
+        if objective_names == self.objective_names:
+            return
+        self.objective_names = objective_names
+        logger.info(f"Engine {self.id} evaluates {objective_names}")
+
+        if self.pool is not None:
+            self.stop_pool()
+            self.start_pool(start_method=RESTART_START_METHOD)
+        if self.quarantined_future is None:
+            self.stop_quarantine_pool()
+
+    def stop_pool(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def stop_quarantine_pool(self):
+        if self.quarantine_pool is not None:
+            self.quarantine_pool.shutdown(cancel_futures=True)
+            self.quarantine_pool = None
 
     def stop_transmitter(self):
         if self.transmitter is not None:
@@ -66,21 +413,48 @@ class EvalEngine:
             self.transmitter = None
 
     def create_transmitter(self, remote_host, remote_port):
+        trace_params = (
+            [
+                oc.CommandParameter(
+                    name=tools.tracing.TRACE_PARAM,
+                    description="trace id of the task, a list of them for "
+                    "eval_batch",
+                )
+            ]
+            if self.tracing
+            else []
+        )
+
         self.eval_manifest = oc.CommandManifest(
             action="eval",
             description="evaluate parameters and return objectives",
             params=[
                 oc.CommandParameter(name="task_id", description="task_id"),
                 oc.CommandParameter(name="params", description="parameters"),
-            ],
+            ]
+            + trace_params,
+            command_type=oc.CommandType.WITH_DELAYED_REPLY,
+        )
+
+        self.eval_batch_manifest = oc.CommandManifest(
+            action="eval_batch",
+            description="evaluate a list of (task_id, parameters) and return "
+            "a list of objectives",
+            params=[
+                oc.CommandParameter(
+                    name="tasks", description="list of (task_id, parameters)"
+                ),
+            ]
+            + trace_params,
             command_type=oc.CommandType.WITH_DELAYED_REPLY,
         )
 
-        self.transmitter = oc.PairedTransmitter(
+        self.transmitter = tools.events.NotifyingTransmitter(
             remote_host=remote_host,
-            exposed_commands=[self.eval_manifest],
+            exposed_commands=[self.eval_manifest, self.eval_batch_manifest],
             remote_port=remote_port,
             listen_port=int(self.listen_port),
+            waiter=self.waiter,
         )
 
     def start_transmitter(self, remote_host, remote_port):
@@ -90,7 +464,8 @@ class EvalEngine:
 
         logger.info(
             f"Started engine {self.id} listening at port {self.listen_port} "
-            f"for input from {remote_host}:{remote_port}"
+            f"for input from {remote_host}:{remote_port}, encoding: "
+            f"{self.encoding}, tracing: {self.tracing}"
         )
 
         self.status = "ready"
@@ -102,13 +477,340 @@ class EvalEngine:
 
         for command in self.transmitter.get_incoming_requests():
             logger.debug(f"Engine {self.id} received command: {command}")
+            trace_ids = command.params.get(tools.tracing.TRACE_PARAM)
             if command.action == self.eval_manifest.action:
-                params = command.params["params"]
-                task_id = command.params["task_id"]
-                objs = run_eval(params)
-                self.transmitter.reply_to_command(
-                    request_id=command.request_id,
-                    payload={"task_id": task_id, "objs": objs},
+                tasks = [(command.params["task_id"], command.params["params"])]
+                self.submit_tasks(
+                    command.request_id,
+                    tasks,
+                    batch=False,
+                    trace_ids=[trace_ids] if self.tracing else None,
+                )
+            elif command.action == self.eval_batch_manifest.action:
+                tasks = command.params["tasks"]
+                if self.encoding == tools.wire.PACKED_ENCODING:
+                    tasks = tools.wire.unpack_dicts(tasks)
+                self.submit_tasks(
+                    command.request_id, tasks, batch=True, trace_ids=trace_ids
+                )
+
+        self.reply_finished_requests()
+
+    def submit_tasks(self, request_id, tasks, batch, trace_ids=None):
+        """Queue the tasks of a request on the process pool.
+
+        The tasks are split into batches of up to MAX_WORKER_BATCH_SIZE
+        tasks, and into at least a batch per idle worker, and a worker
+        evaluates the tasks of a batch together.
+        """
+
+        n_idle_workers = self.n_workers - (
+            self.n_submitted_batches - self.n_finished_batches
+        )
+        batch_size = min(
+            MAX_WORKER_BATCH_SIZE,
+            math.ceil(len(tasks) / max(1, n_idle_workers)),
+        )
+        futures = []
+        for start in range(0, len(tasks), batch_size):
+            futures.extend(
+                self.submit_batch(
+                    self.pool,
+                    [
+                        params
+                        for _, params in tasks[start : start + batch_size]
+                    ],
+                )
+            )
+        self.pending_requests[request_id] = (
+            time.time(),
+            batch,
+            tasks,
+            futures,
+            trace_ids,
+        )
+        self.tasks_metric.inc(len(futures))
+
+    def submit_batch(self, pool, params_list):
+        """Submit a batch of tasks to pool, return a future per task, a
+        broken pool loses them."""
+
+        futures = [concurrent.futures.Future() for _ in params_list]
+        record = self.tracer.enabled or self.profiler.enabled
+        try:
+            batch_future = pool.submit(
+                self.worker_function,
+                params_list,
+                record,
+                self.profiler.get_profile_path(len(params_list)),
+            )
+        except concurrent.futures.process.BrokenProcessPool as error:
+            # The pool broke since check_pools
+            for future in futures:
+                future.set_exception(error)
+            return futures
+        batch_future.add_done_callback(
+            functools.partial(self.finish_batch, futures)
+        )
+        self.n_submitted_batches += 1
+
+        return futures
+
+    def finish_batch(self, futures, batch_future):
+        """Pass the results of a batch on to the futures of its tasks."""
+
+        try:
+            results = batch_future.result()
+        except Exception as error:
+            results = [error] * len(futures)
+        for future, result in zip(futures, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+        self.n_finished_batches += 1
+        self.waiter.wake()
+
+    def update_idle_time(self):
+        """Add the worker-seconds without a task since the last update."""
+
+        now = time.time()
+        if self.idle_update_time is not None:
+            n_busy_workers = min(
+                self.n_submitted_batches - self.n_finished_batches,
+                self.n_workers,
+            )
+            self.idle_metric.inc(
+                (now - self.idle_update_time)
+                * (self.n_workers - n_busy_workers)
+            )
+        self.idle_update_time = now
+
+    def check_pools(self):
+        """Restart the process pool once one of its workers died, and
+        evaluate the tasks it lost again, one at a time, in the quarantine
+        pool.
+
+        A dead worker breaks its pool, which fails all of its tasks. One of
+        them likely killed the worker, but which one is unknown. In the
+        quarantine pool, the task that breaks it is the only one running,
+        so it gets the failed scores instead of breaking the pool of the
+        other tasks.
+
+        By now the transmitter and the executors run threads, and a process
+        forked from them can deadlock on a lock another thread held, so
+        these pools get their workers from a multiprocessing fork server,
+        RESTART_START_METHOD. Its workers build their evaluation contexts
+        from scratch.
+        """
+
+        lost_futures = [
+            future
+            for _, _, _, futures, _ in self.pending_requests.values()
+            for future in futures
+            if is_lost(future)
+        ]
+        if any(
+            future is not self.quarantined_future for future in lost_futures
+        ):
+            # Once the broken pool is shut down, all of its tasks have failed
+            self.stop_pool()
+            self.start_pool(start_method=RESTART_START_METHOD)
+        if self.quarantined_future in lost_futures:
+            self.stop_quarantine_pool()
+
+        n_quarantined = len(self.quarantined_tasks)
+        for _, _, tasks, futures, _ in self.pending_requests.values():
+            for index, ((task_id, params), future) in enumerate(
+                zip(tasks, futures)
+            ):
+                if not is_lost(future):
+                    continue
+                if future is self.quarantined_future:
+                    futures[index] = concurrent.futures.Future()
+                    futures[index].set_exception(
+                        RuntimeError("The task killed its worker")
+                    )
+                    self.quarantined_future = None
+                else:
+                    # Pending until the quarantine pool evaluates it
+                    futures[index] = concurrent.futures.Future()
+                    self.quarantined_tasks.append((futures, index, params))
+        if len(self.quarantined_tasks) > n_quarantined:
+            logger.error(
+                f"Engine {self.id} lost a worker, restarted its pool and "
+                f"quarantined {len(self.quarantined_tasks) - n_quarantined} "
+                "tasks"
+            )
+
+        if (
+            self.quarantined_future is not None
+            and not self.quarantined_future.done()
+        ):
+            return
+        self.quarantined_future = None
+        if len(self.quarantined_tasks) == 0:
+            self.stop_quarantine_pool()
+            return
+
+        if self.quarantine_pool is None:
+            self.quarantine_pool = self.create_pool(1, RESTART_START_METHOD)
+        futures, index, params = self.quarantined_tasks.popleft()
+        (futures[index],) = self.submit_batch(self.quarantine_pool, [params])
+        self.quarantined_future = futures[index]
+
+    def get_failed_result(self):
+        """Result of a task whose evaluation failed, without an evaluation
+        time."""
+
+        return dict.fromkeys(self.objective_names, FAILED_SCORE), None, None
+
+    def get_task_result(self, task_id, future):
+        """Return the result of the future of a task and whether its
+        evaluation failed, the failed result if it raised.
+
+        The map passes the failed scores on to the caller, but doesn't
+        cache or store them as results of the model.
+        """
+
+        try:
+            return (*future.result(), False)
+        except Exception:
+            logger.exception(
+                f"Engine {self.id} failed to evaluate task {task_id}, "
+                "replying with failed scores"
+            )
+            return (*self.get_failed_result(), True)
+
+    def reply_finished_requests(self):
+        """Reply to every request whose tasks have all been evaluated."""
+
+        self.check_pools()
+
+        for request_id, (
+            receive_time,
+            batch,
+            tasks,
+            futures,
+            trace_ids,
+        ) in list(self.pending_requests.items()):
+            # Lost tasks are evaluated again, see check_pools
+            if not all(
+                future.done() and not is_lost(future) for future in futures
+            ):
+                continue
+
+            task_ids = [task_id for task_id, _ in tasks]
+            objs, durations, worker_records, failed = zip(
+                *[
+                    self.get_task_result(task_id, future)
+                    for task_id, future in zip(task_ids, futures)
+                ]
+            )
+            # The map takes no evaluation times from a request with a
+            # failed task
+            timed = None not in durations
+            if batch and self.encoding == tools.wire.PACKED_ENCODING:
+                payload = tools.wire.pack_dicts(
+                    task_ids,
+                    objs,
+                    durations=durations if timed else None,
+                    failed=failed if any(failed) else None,
+                )
+            else:
+                results = [
+                    {
+                        "task_id": task_id,
+                        "objs": task_objs,
+                        "duration": duration,
+                        "failed": task_failed,
+                    }
+                    for task_id, task_objs, duration, task_failed in zip(
+                        task_ids, objs, durations, failed
+                    )
+                ]
+                payload = results if batch else results[0]
+            self.transmitter.reply_to_command(
+                request_id=request_id, payload=payload
+            )
+            self.pending_requests.pop(request_id)
+
+            self.request_metric.observe(time.time() - receive_time)
+            if self.metrics.enabled:
+                for duration in durations:
+                    if duration is not None:
+                        self.evaluation_metric.observe(duration)
+            if self.profiler.enabled:
+                for duration, worker_record in zip(durations, worker_records):
+                    # The phases of a batch are recorded with its first task
+                    if worker_record is not None:
+                        _, _, timer, batch_size = worker_record
+                        self.profiler.add_evaluation(
+                            duration,
+                            timer.times if timer is not None else {},
+                            batch_size,
+                        )
+            if self.tracer.enabled:
+                self.trace_request(
+                    request_id,
+                    receive_time,
+                    task_ids,
+                    trace_ids or [None] * len(task_ids),
+                    durations,
+                    worker_records,
+                )
+
+    def trace_request(
+        self,
+        request_id,
+        receive_time,
+        task_ids,
+        trace_ids,
+        durations,
+        worker_records,
+    ):
+        """Record the spans of a request and of the evaluations of its
+        tasks, on a thread per worker."""
+
+        self.tracer.add_async_span(
+            "eval_batch",
+            receive_time,
+            time.time(),
+            request_id,
+            task_ids=task_ids,
+            trace_ids=sorted(set(trace_ids), key=str),
+        )
+        for task_id, trace_id, duration, worker_record in zip(
+            task_ids, trace_ids, durations, worker_records
+        ):
+            # A failed evaluation has no record
+            if worker_record is None:
+                continue
+            pid, start_time, timer, _ = worker_record
+            if pid not in self.traced_pids:
+                self.traced_pids.add(pid)
+                self.tracer.name_thread(pid, f"worker {pid}")
+
+            self.tracer.add_async_span(
+                "queued",
+                receive_time,
+                start_time,
+                f"{request_id}:{task_id}",
+                task_id=task_id,
+                trace_id=trace_id,
+            )
+            spans = (timer.spans if timer is not None else []) + [
+                ("evaluate", start_time, start_time + duration)
+            ]
+            for name, start, end in spans:
+                self.tracer.add_span(
+                    name,
+                    start,
+                    end,
+                    tid=pid,
+                    task_id=task_id,
+                    trace_id=trace_id,
                 )
 
     def create_engine_file(self) -> None:
@@ -125,10 +827,39 @@ class EvalEngine:
             "payload": {
                 "engine_host": tools.network.get_osparc_hostname(self.name),
                 "engine_port": self.listen_port,
+                "n_workers": self.n_workers,
+                "model_id": get_model_id(
+                    early_stop_score=get_early_stop_score()
+                ),
+                "encodings": tools.wire.SUPPORTED_ENCODINGS,
+                "tracing": True,
             },
         }
 
-        self.engine_file_path.write_text(json.dumps(engine_dict, indent=2))
+        tools.control.write_json_atomic(self.engine_file_path, engine_dict)
+
+    def check_engine_file(self):
+        """Register again if the engine file was deleted, as a starting map
+        deletes the engine files it finds.
+
+        A map that restarted while this engine was connected won't reply
+        to it, so the engine drops its transmitter and the requests of the
+        old map, and waits for the connect command of the new one, whose
+        control file versions start again.
+        """
+
+        if self.engine_file_path.exists():
+            return
+
+        logger.info(f"Engine {self.id} writing its engine file again")
+        if self.status != "connecting":
+            self.stop_transmitter()
+            self.pending_requests.clear()
+            self.status = "connecting"
+        self.control_file_reader = tools.control.JsonFileReader(
+            self.control_file_reader.file_path
+        )
+        self.create_engine_file()
 
     def submit_result(self, task_id, result) -> None:
         """Create engine file."""
@@ -140,7 +871,7 @@ class EvalEngine:
             "payload": result,
         }
 
-        self.engine_file_path.write_text(json.dumps(engine_dict, indent=2))
+        tools.control.write_json_atomic(self.engine_file_path, engine_dict)
 
     def submit_status(self) -> None:
         """Create engine file."""
@@ -150,191 +881,505 @@ class EvalEngine:
             "status": self.status,
         }
 
-        self.engine_file_path.write_text(json.dumps(engine_dict, indent=2))
-
-    def read_master_dict(self) -> dict:
-        master_dict = json.loads(self.master_file_path.read_text())
-
-        return master_dict
+        tools.control.write_json_atomic(self.engine_file_path, engine_dict)
 
     def run_payload(self, payload):
         engine_dict = {
             "id": self.id,
             "status": self.status,
         }
-        self.engine_file_path.write_text(json.dumps(engine_dict, indent=2))
+        tools.control.write_json_atomic(self.engine_file_path, engine_dict)
 
-        return run_eval(payload)
+        return self.pool.submit(run_worker_eval, payload).result()
 
-    def check_master_file(self) -> None:
+    def check_control_file(self) -> None:
         logger.debug(
-            f"Engine {self.id}: Checking for master file at "
-            f"{self.master_file_path}"
-        )
-
-        if self.master_file_path.exists():
-            master_dict = self.read_master_dict()
-            if self.id in master_dict["engines"]:
-                if "task" in master_dict["engines"][self.id]:
-                    task_dict = master_dict["engines"][self.id]["task"]
-                    command = task_dict["command"]
-                    if command == "stop":
-                        self.status = "stopping"
-                    elif command == "connect":
-                        if self.status == "connecting":
-                            payload = task_dict["payload"]
-
-                            self.start_transmitter(
-                                payload["master_host"], payload["master_port"]
-                            )
-                    else:
-                        raise ValueError(
-                            f"Received unknown command: {command}"
-                        )
+            f"Engine {self.id}: Checking for control file at "
+            f"{self.control_file_reader.file_path}"
+        )
 
+        control_dict = self.control_file_reader.read()
+        if control_dict is None:
+            return
 
-def run_eval(input_params):
+        task_dict = control_dict["task"]
+        command = task_dict["command"]
+        if command == "stop":
+            self.status = "stopping"
+        elif command == "connect":
+            payload = task_dict["payload"]
+            # The map connects an engine again when the schema of its
+            # caller arrives later
+            self.set_objective_names(
+                payload.get("objective_names", self.objective_names)
+            )
+            if self.status == "connecting":
+                self.encoding = payload.get(
+                    "encoding", tools.wire.LISTS_ENCODING
+                )
+                self.tracing = payload.get("tracing", False)
 
-    logger.info(f"Running evaluation of {input_params}")
-    logger.debug("Starting simplecell")
+                self.start_transmitter(
+                    payload["master_host"], payload["master_port"]
+                )
+        else:
+            raise ValueError(f"Received unknown command: {command}")
 
-    logger.debug("I am running in the directory: ", os.getcwd())
 
-    logger.debug("Setting up simple cell model")
+def create_simulator():
+    """NEURON simulator that times its runs as the simulate phase of its
+    timer."""
 
-    morph = ephys.morphologies.NrnFileMorphology("simple.swc")
+    global TimedNrnSimulator
 
-    somatic_loc = ephys.locations.NrnSeclistLocation(
-        "somatic", seclist_name="somatic"
-    )
+    if TimedNrnSimulator is None:
 
-    hh_mech = ephys.mechanisms.NrnMODMechanism(
-        name="hh", suffix="hh", locations=[somatic_loc]
-    )
+        class TimedNrnSimulator(ephys.simulators.NrnSimulator):
+            timer = tools.profiling.NULL_TIMER
 
-    hh_mech = ephys.mechanisms.NrnMODMechanism(
-        name="hh", suffix="hh", locations=[somatic_loc]
-    )
+            def run(self, *args, **kwargs):
+                with self.timer.phase("simulate"):
+                    return super().run(*args, **kwargs)
 
-    cm_param = ephys.parameters.NrnSectionParameter(
-        name="cm",
-        param_name="cm",
-        value=1.0,
-        locations=[somatic_loc],
-        frozen=True,
-    )
+        # Pickled with the isolated protocols by its module level name
+        TimedNrnSimulator.__qualname__ = "TimedNrnSimulator"
 
-    gnabar_param = ephys.parameters.NrnSectionParameter(
-        name="gnabar_hh",
-        param_name="gnabar_hh",
-        locations=[somatic_loc],
-        bounds=[0.05, 0.125],
-        frozen=False,
-    )
-    gkbar_param = ephys.parameters.NrnSectionParameter(
-        name="gkbar_hh",
-        param_name="gkbar_hh",
-        bounds=[0.01, 0.075],
-        locations=[somatic_loc],
-        frozen=False,
-    )
+    return TimedNrnSimulator()
 
-    simple_cell = ephys.models.CellModel(
-        name="simple_cell",
-        morph=morph,
-        mechs=[hh_mech],
-        params=[cm_param, gnabar_param, gkbar_param],
-    )
 
-    logger.debug("#############################")
-    logger.debug("Simple neuron has been set up")
-    logger.debug("#############################")
+class SpikeMonitor:
+    """Counts the spikes of a segment, and stops the NEURON run once there
+    are max_spikes of them."""
 
-    logger.debug(simple_cell)
+    def __init__(self, h, segment, threshold=SPIKE_THRESHOLD):
+        """Constructor."""
 
-    logger.debug("Setting up stimulation protocols")
-    soma_loc = ephys.locations.NrnSeclistCompLocation(
-        name="soma", seclist_name="somatic", sec_index=0, comp_x=0.5
-    )
+        self.h = h
+        self.n_spikes = 0
+        self.max_spikes = None
+        self.netcon = h.NetCon(segment._ref_v, None, sec=segment.sec)
+        self.netcon.threshold = threshold
+        self.netcon.record(self.count_spike)
+
+    def count_spike(self):
+        self.n_spikes += 1
+        if self.max_spikes is not None and self.n_spikes >= self.max_spikes:
+            self.h.stoprun = 1
+
+    def is_stopped(self):
+        return self.max_spikes is not None and self.n_spikes >= self.max_spikes
+
+
+class EvalContext:
+    """Cell model, protocols and fitness calculator shared by evaluations.
+
+    Building these objects is more expensive than a single simulation of the
+    simple cell, so an engine creates one context at startup and only passes
+    new parameter values for every task.
+    """
+
+    def __init__(
+        self,
+        morph_path=DEFAULT_MORPH_PATH,
+        isolate_protocols=None,
+        warm_start=False,
+        early_stop_score=None,
+        objective_names=None,
+    ):
+        """Constructor.
 
-    sweep_protocols = []
+        With warm_start, the step protocols are run in this process from a
+        shared resting prefix, see run_warm_protocols. With
+        early_stop_score, the scores are capped at it, and a protocol is
+        stopped as soon as the spikes it fired are enough for the score of
+        its Spikecount to reach the cap, which needs warm_start. Only the
+        objectives of objective_names are scored, see set_objective_names.
+        """
 
-    for protocol_name, amplitude in [("step1", 0.01), ("step2", 0.05)]:
-        stim = ephys.stimuli.NrnSquarePulse(
-            step_amplitude=amplitude,
-            step_delay=100,
-            step_duration=50,
-            location=soma_loc,
-            total_duration=200,
+        if early_stop_score is not None and not warm_start:
+            raise ValueError("Early stopping needs warm_start")
+
+        logger.debug("Setting up simple cell model")
+
+        import_ephys()
+
+        morph = ephys.morphologies.NrnFileMorphology(str(morph_path))
+
+        somatic_loc = ephys.locations.NrnSeclistLocation(
+            "somatic", seclist_name="somatic"
         )
-        rec = ephys.recordings.CompRecording(
-            name="%s.soma.v" % protocol_name, location=soma_loc, variable="v"
+
+        hh_mech = ephys.mechanisms.NrnMODMechanism(
+            name="hh", suffix="hh", locations=[somatic_loc]
         )
-        protocol = ephys.protocols.SweepProtocol(protocol_name, [stim], [rec])
-        sweep_protocols.append(protocol)
-    twostep_protocol = ephys.protocols.SequenceProtocol(
-        "twostep", protocols=sweep_protocols
-    )
 
-    logger.debug("#######################################")
-    logger.debug("Stimulation protocols have been set up ")
-    logger.debug("#######################################")
-
-    logger.debug(twostep_protocol)
-
-    logger.debug("Setting up objectives")
-    efel_feature_means = {
-        "step1": {"Spikecount": 1},
-        "step2": {"Spikecount": 5},
-    }
-
-    objectives = []
-
-    for protocol in sweep_protocols:
-        stim_start = protocol.stimuli[0].step_delay
-        stim_end = stim_start + protocol.stimuli[0].step_duration
-        for efel_feature_name, mean in efel_feature_means[
-            protocol.name
-        ].items():
-            feature_name = "%s.%s" % (protocol.name, efel_feature_name)
-            feature = ephys.efeatures.eFELFeature(
-                feature_name,
-                efel_feature_name=efel_feature_name,
-                recording_names={"": "%s.soma.v" % protocol.name},
-                stim_start=stim_start,
-                stim_end=stim_end,
-                exp_mean=mean,
-                exp_std=0.05 * mean,
+        cm_param = ephys.parameters.NrnSectionParameter(
+            name="cm",
+            param_name="cm",
+            value=1.0,
+            locations=[somatic_loc],
+            frozen=True,
+        )
+
+        gnabar_param = ephys.parameters.NrnSectionParameter(
+            name="gnabar_hh",
+            param_name="gnabar_hh",
+            locations=[somatic_loc],
+            bounds=[0.05, 0.125],
+            frozen=False,
+        )
+        gkbar_param = ephys.parameters.NrnSectionParameter(
+            name="gkbar_hh",
+            param_name="gkbar_hh",
+            bounds=[0.01, 0.075],
+            locations=[somatic_loc],
+            frozen=False,
+        )
+
+        self.cell_model = ephys.models.CellModel(
+            name="simple_cell",
+            morph=morph,
+            mechs=[hh_mech],
+            params=[cm_param, gnabar_param, gkbar_param],
+        )
+
+        logger.debug("#############################")
+        logger.debug("Simple neuron has been set up")
+        logger.debug("#############################")
+
+        logger.debug(self.cell_model)
+
+        logger.debug("Setting up stimulation protocols")
+        soma_loc = ephys.locations.NrnSeclistCompLocation(
+            name="soma", seclist_name="somatic", sec_index=0, comp_x=0.5
+        )
+
+        self.sweep_protocols = []
+
+        for protocol_name, amplitude in [("step1", 0.01), ("step2", 0.05)]:
+            stim = ephys.stimuli.NrnSquarePulse(
+                step_amplitude=amplitude,
+                step_delay=100,
+                step_duration=50,
+                location=soma_loc,
+                total_duration=200,
+            )
+            rec = ephys.recordings.CompRecording(
+                name="%s.soma.v" % protocol_name,
+                location=soma_loc,
+                variable="v",
             )
-            objective = ephys.objectives.SingletonObjective(
-                feature_name, feature
+            protocol = ephys.protocols.SweepProtocol(
+                protocol_name, [stim], [rec]
             )
-            objectives.append(objective)
+            self.sweep_protocols.append(protocol)
+        self.twostep_protocol = ephys.protocols.SequenceProtocol(
+            "twostep", protocols=self.sweep_protocols
+        )
+
+        logger.debug("#######################################")
+        logger.debug("Stimulation protocols have been set up ")
+        logger.debug("#######################################")
 
-    logger.debug("############################")
-    logger.debug("Objectives have been set up ")
-    logger.debug("############################")
+        logger.debug(self.twostep_protocol)
 
-    logger.debug("Setting up fitness calculator")
+        logger.debug("Setting up objectives")
+        efel_feature_means = {
+            "step1": {"Spikecount": 1},
+            "step2": {"Spikecount": 5},
+        }
 
-    score_calc = ephys.objectivescalculators.ObjectivesCalculator(objectives)
+        objectives = []
+        # protocol name -> Spikecount objective
+        self.spikecount_objectives = {}
+
+        for protocol in self.sweep_protocols:
+            stim_start = protocol.stimuli[0].step_delay
+            stim_end = stim_start + protocol.stimuli[0].step_duration
+            for efel_feature_name, mean in efel_feature_means[
+                protocol.name
+            ].items():
+                feature_name = "%s.%s" % (protocol.name, efel_feature_name)
+                feature = ephys.efeatures.eFELFeature(
+                    feature_name,
+                    efel_feature_name=efel_feature_name,
+                    recording_names={"": "%s.soma.v" % protocol.name},
+                    stim_start=stim_start,
+                    stim_end=stim_end,
+                    exp_mean=mean,
+                    exp_std=0.05 * mean,
+                )
+                objective = ephys.objectives.SingletonObjective(
+                    feature_name, feature
+                )
+                objectives.append(objective)
+                if efel_feature_name == "Spikecount":
+                    self.spikecount_objectives[protocol.name] = objective
 
-    nrn = ephys.simulators.NrnSimulator()
+        logger.debug("############################")
+        logger.debug("Objectives have been set up ")
+        logger.debug("############################")
 
-    cell_evaluator = ephys.evaluators.CellEvaluator(
-        cell_model=simple_cell,
-        param_names=["gnabar_hh", "gkbar_hh"],
-        fitness_protocols={twostep_protocol.name: twostep_protocol},
-        fitness_calculator=score_calc,
-        sim=nrn,
-    )
+        logger.debug("Setting up fitness calculator")
+
+        self.score_calc = ephys.objectivescalculators.ObjectivesCalculator(
+            objectives
+        )
+        self.objectives = objectives
+        self.objective_names = None
+        self.feature_extractor = None
+        self.set_objective_names(objective_names)
+
+        self.nrn = create_simulator()
+        self.warm_start = warm_start
+        self.early_stop_score = early_stop_score
+
+        self.cell_evaluator = ephys.evaluators.CellEvaluator(
+            cell_model=self.cell_model,
+            param_names=["gnabar_hh", "gkbar_hh"],
+            fitness_protocols={
+                self.twostep_protocol.name: self.twostep_protocol
+            },
+            fitness_calculator=self.score_calc,
+            sim=self.nrn,
+            isolate_protocols=isolate_protocols,
+        )
+
+        logger.debug("####################################")
+        logger.debug("Fitness calculator have been set up ")
+        logger.debug("####################################")
+
+    def set_objective_names(self, objective_names=None):
+        """Only score the objectives of objective_names, e.g. those of the
+        schema of the map, all of them with None.
+
+        The FeatureExtractor only extracts the features of these
+        objectives.
+        """
+
+        if objective_names is None:
+            objective_names = [objective.name for objective in self.objectives]
+        objective_names = list(objective_names)
+        if objective_names == self.objective_names:
+            return
+
+        objectives = {
+            objective.name: objective for objective in self.objectives
+        }
+        unknown_names = set(objective_names) - set(objectives)
+        if len(unknown_names) != 0:
+            raise ValueError(f"Unknown objectives: {sorted(unknown_names)}")
+
+        self.objective_names = objective_names
+        self.feature_extractor = features.FeatureExtractor(
+            [objectives[name] for name in objective_names]
+        )
+
+    def evaluate(self, input_params, timer=None):
+        """Evaluate one parameter dict, return the scores."""
+
+        return self.evaluate_batch([input_params], timer=timer)[0]
+
+    def evaluate_batch(self, input_params_list, timer=None, durations=None):
+        """Evaluate parameter dicts, return their scores.
+
+        The protocols are run for every parameter dict, then the
+        FeatureExtractor scores the traces of all of them together. With a
+        PhaseTimer, the time of the protocols is split into the NEURON
+        simulation and the instantiation of the model around it, and the
+        feature extraction is timed. With a list durations, the evaluation
+        time of every parameter dict is appended to it, the time of its
+        protocols and an equal share of the feature extraction.
+        """
+
+        timer = timer if timer is not None else tools.profiling.NULL_TIMER
+        self.nrn.timer = timer
+
+        responses_list = []
+        stopped_protocols_list = []
+        protocol_times = []
+        with timer.phase("instantiate"):
+            for input_params in input_params_list:
+                start = time.perf_counter()
+                stopped_protocols = set()
+                if self.warm_start:
+                    responses, stopped_protocols = self.run_warm_protocols(
+                        input_params
+                    )
+                else:
+                    responses = self.cell_evaluator.run_protocols(
+                        self.cell_evaluator.fitness_protocols.values(),
+                        input_params,
+                    )
+                responses_list.append(responses)
+                stopped_protocols_list.append(stopped_protocols)
+                protocol_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with timer.phase("features"):
+            scores_list = self.feature_extractor.calculate_scores(
+                responses_list
+            )
+        if durations is not None:
+            features_time = (time.perf_counter() - start) / max(
+                1, len(input_params_list)
+            )
+            durations.extend(
+                protocol_time + features_time
+                for protocol_time in protocol_times
+            )
+
+        if self.early_stop_score is not None:
+            for scores, stopped_protocols in zip(
+                scores_list, stopped_protocols_list
+            ):
+                for name in scores:
+                    scores[name] = min(scores[name], self.early_stop_score)
+                for protocol_name in stopped_protocols:
+                    objective = self.spikecount_objectives[protocol_name]
+                    if objective.name in scores:
+                        scores[objective.name] = self.early_stop_score
+
+        return scores_list
+
+    def get_max_spikes(self, protocol):
+        """Number of spikes from which the score of the Spikecount of
+        protocol is at least early_stop_score, None if it has none."""
+
+        objective = self.spikecount_objectives.get(protocol.name)
+        if self.early_stop_score is None or objective is None:
+            return None
+
+        feature = objective.features[0]
+
+        return math.ceil(
+            feature.exp_mean + self.early_stop_score * feature.exp_std
+        )
+
+    def run_warm_protocols(self, input_params):
+        """Run the step protocols from one simulation of the resting cell,
+        return their responses and the names of the protocols that were
+        stopped early.
+
+        The protocols only differ in the amplitude of a pulse at the same
+        delay, so the cell is instantiated once, simulated up to the delay
+        and its state saved with SaveState. Every protocol then restores
+        that state, sets its amplitude and only simulates from the delay
+        on, its trace continuing the recording of the shared prefix.
+
+        The scores are those of run_protocols, the traces after the delay
+        agree with its traces to the tolerance of CVode, which is
+        reinitialised at the restored state.
+
+        With early_stop_score, a SpikeMonitor stops a protocol once it
+        fired get_max_spikes spikes, the protocol then has no response.
+        The prefix runs until all the protocols would be stopped.
+        """
+
+        h = self.nrn.neuron.h
+        first_protocol = self.sweep_protocols[0]
+        stim = first_protocol.stimuli[0]
+        rec = first_protocol.recordings[0]
+
+        self.cell_model.freeze(input_params)
+        self.cell_model.instantiate(sim=self.nrn)
+        first_protocol.instantiate(sim=self.nrn, cell_model=self.cell_model)
+
+        monitor = None
+        max_spikes = {
+            protocol.name: self.get_max_spikes(protocol)
+            for protocol in self.sweep_protocols
+        }
+        if None not in max_spikes.values():
+            monitor = SpikeMonitor(
+                h,
+                stim.location.instantiate(
+                    sim=self.nrn, icell=self.cell_model.icell
+                ),
+            )
+            monitor.max_spikes = max(max_spikes.values())
+
+        responses = {}
+        stopped_protocols = set()
+        try:
+            self.nrn.run(
+                stim.step_delay, cvode_active=first_protocol.cvode_active
+            )
+            state = h.SaveState()
+            state.save()
+            # The continued runs record the time of the restored state again
+            n_prefix = len(rec.tvector) - 1
+            n_prefix_spikes = monitor.n_spikes if monitor is not None else 0
+
+            for protocol in self.sweep_protocols:
+                if monitor is not None:
+                    monitor.n_spikes = n_prefix_spikes
+                    monitor.max_spikes = max_spikes[protocol.name]
+                    if monitor.is_stopped():
+                        stopped_protocols.add(protocol.name)
+                        continue
+
+                stim.iclamp.amp = protocol.stimuli[0].step_amplitude
+                with self.nrn.timer.phase("simulate"):
+                    state.restore()
+                    h.tstop = protocol.total_duration
+                    h.cvode.re_init()
+                    rec.tvector.resize(n_prefix)
+                    rec.varvector.resize(n_prefix)
+                    h.continuerun(protocol.total_duration)
+
+                if monitor is not None and monitor.is_stopped():
+                    stopped_protocols.add(protocol.name)
+                    continue
+
+                name = protocol.recordings[0].name
+                responses[name] = {
+                    "time": rec.tvector.as_numpy().copy(),
+                    "voltage": rec.varvector.as_numpy().copy(),
+                }
+        except (RuntimeError, ephys.simulators.NrnSimulatorException):
+            logger.debug(
+                f"Running the protocols of {input_params} generated an "
+                "exception, returning None in responses"
+            )
+            responses = {
+                protocol.recordings[0].name: None
+                for protocol in self.sweep_protocols
+            }
+            stopped_protocols = set()
+        finally:
+            # The NetCon of the monitor refers to the cell
+            monitor = None
+            first_protocol.destroy(sim=self.nrn)
+            self.cell_model.destroy(sim=self.nrn)
+            self.cell_model.unfreeze(input_params.keys())
+
+        return responses, stopped_protocols
+
+    def warm_up(self):
+        """Evaluate the parameters in the middle of their bounds."""
+
+        self.evaluate(
+            {
+                param.name: sum(param.bounds) / 2
+                for param in self.cell_evaluator.params
+            }
+        )
+
+
+def run_eval(input_params, eval_context=None, timer=None):
+
+    logger.info(f"Running evaluation of {input_params}")
+    logger.debug("Starting simplecell")
+
+    logger.debug(f"I am running in the directory: {os.getcwd()}")
 
-    logger.debug("####################################")
-    logger.debug("Fitness calculator have been set up ")
-    logger.debug("####################################")
+    if eval_context is None:
+        with (timer or tools.profiling.NULL_TIMER).phase("setup"):
+            eval_context = EvalContext()
 
     logger.debug("Running test evaluation:")
-    scores = cell_evaluator.evaluate_with_dicts(input_params)
+    scores = eval_context.evaluate(input_params, timer=timer)
     logger.debug(f"Scores: {scores}")
 
     logger.debug("###############################")
@@ -345,4 +1390,5 @@ def run_eval(input_params):
 
 
 if __name__ == "__main__":
-    main()
+    # e.g. python evaluator.py evaluator3
+    main(sys.argv[1])
@@ -1,3 +1,5 @@
-import evaluator
+import forkserver
 
-evaluator.main("evaluator2")
+# The workers of the multiprocessing fork server import this module
+if __name__ == "__main__":
+    forkserver.run_engine("evaluator2")
@@ -0,0 +1,153 @@
+"""Batched eFEL feature extraction for the objectives of an EvalContext.
+
+bluepyopt's eFELFeature scores one trace per call and resets eFEL around
+it, which reinitialises eFEL's C++ core every time. That takes longer than
+extracting the Spikecount of a trace. FeatureExtractor instead copies the
+traces of a batch of evaluations into buffers that it reuses between
+batches, and extracts the features that the objectives name from all of
+them with one efel.get_feature_values call per recording and stimulus
+window, which doesn't reinitialise eFEL.
+"""
+
+import numpy as np
+
+# Rows of a trace buffer
+TIME_ROW = 0
+VOLTAGE_ROW = 1
+
+
+class FeatureExtractor:
+    """Scores of SingletonObjectives of eFELFeatures, for a batch of
+    responses at a time.
+
+    The features have to use eFEL's default settings, their scores are
+    those of eFELFeature.calculate_score without trace check.
+    """
+
+    def __init__(self, objectives):
+        """Constructor."""
+
+        self.objective_names = [objective.name for objective in objectives]
+        # (recording name, stim start, stim end) -> list of (objective
+        # name, feature)
+        self.trace_features = {}
+        for objective in objectives:
+            (feature,) = objective.features
+            if (
+                feature.threshold is not None
+                or feature.stimulus_current is not None
+                or feature.interp_step is not None
+                or feature.double_settings
+                or feature.int_settings
+                or feature.string_settings
+            ):
+                raise ValueError(
+                    f"Feature {feature.name} doesn't use the default eFEL "
+                    "settings"
+                )
+            key = (
+                feature.recording_names[""],
+                feature.stim_start,
+                feature.stim_end,
+            )
+            self.trace_features.setdefault(key, []).append(
+                (objective.name, feature)
+            )
+        # (recording name, stim start, stim end) -> buffer of shape (2,
+        # traces, samples), grown to the largest batch
+        self.buffers = {}
+
+    def get_buffer(self, key, n_traces, n_samples):
+        """Buffer of the traces of key with room for a batch."""
+
+        buffer = self.buffers.get(key)
+        if (
+            buffer is None
+            or buffer.shape[1] < n_traces
+            or buffer.shape[2] < n_samples
+        ):
+            shape = (2, n_traces, n_samples)
+            if buffer is not None:
+                shape = np.maximum(shape, buffer.shape)
+            buffer = np.empty(shape)
+            self.buffers[key] = buffer
+
+        return buffer
+
+    def calculate_scores(self, responses_list):
+        """Return the scores of the objectives for every dict of responses
+        in responses_list.
+
+        A response is anything with "time" and "voltage" items, an
+        objective whose response is missing or None gets the max_score of
+        its feature.
+        """
+
+        import efel
+
+        scores_list = [{} for _ in responses_list]
+        for key, features in self.trace_features.items():
+            recording_name, stim_start, stim_end = key
+            indices = [
+                index
+                for index, responses in enumerate(responses_list)
+                if responses.get(recording_name) is not None
+            ]
+            feature_values = []
+            if len(indices) > 0:
+                lengths = [
+                    len(responses_list[index][recording_name]["time"])
+                    for index in indices
+                ]
+                buffer = self.get_buffer(key, len(indices), max(lengths))
+                traces = []
+                for row, (index, length) in enumerate(zip(indices, lengths)):
+                    response = responses_list[index][recording_name]
+                    buffer[TIME_ROW, row, :length] = response["time"]
+                    buffer[VOLTAGE_ROW, row, :length] = response["voltage"]
+                    traces.append(
+                        {
+                            "T": buffer[TIME_ROW, row, :length],
+                            "V": buffer[VOLTAGE_ROW, row, :length],
+                            "stim_start": [stim_start],
+                            "stim_end": [stim_end],
+                        }
+                    )
+                feature_values = efel.get_feature_values(
+                    traces,
+                    sorted(
+                        {feature.efel_feature_name for _, feature in features}
+                    ),
+                    raise_warnings=False,
+                )
+
+            values_of = dict(zip(indices, feature_values))
+            for index, scores in enumerate(scores_list):
+                values = values_of.get(index, {})
+                for objective_name, feature in features:
+                    scores[objective_name] = get_score(
+                        feature, values.get(feature.efel_feature_name)
+                    )
+
+        return [
+            {name: scores[name] for name in self.objective_names}
+            for scores in scores_list
+        ]
+
+
+def get_score(feature, values):
+    """Score of the values of an eFELFeature, as efel.getDistance."""
+
+    if values is None or len(values) < 1:
+        return feature.max_score
+
+    distance = 0.0
+    for value in values:
+        distance += abs(value - feature.exp_mean)
+    distance = distance / feature.exp_std / len(values)
+    if distance != distance:
+        distance = feature.max_score
+    if feature.force_max_score:
+        distance = min(distance, feature.max_score)
+
+    return distance
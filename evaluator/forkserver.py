@@ -0,0 +1,192 @@
+"""Fork server of warmed-up engines.
+
+`python forkserver.py SOCKET_PATH` imports the evaluator, builds and warms
+up an evaluation context, and then forks an engine for every launcher that
+connects to the Unix socket at SOCKET_PATH. The workers of the engines
+inherit the context, so a new engine accepts its first task without
+importing or setting up NEURON.
+
+Launchers call run_engine, which runs the engine in the fork server when
+OSPARC_EVALUATOR_FORKSERVER is the socket path of a running server, and in
+the launcher process otherwise. The engine gets the environment, working
+directory and standard streams of the launcher, which waits for it and
+exits with its status. An engine is terminated when its launcher is.
+
+An engine runs what its environment says as the user of the server, so
+the socket is only accessible to that user, and the server only accepts
+launchers that run as that user.
+"""
+
+import os
+import sys
+import json
+import struct
+import signal
+import socket
+import logging
+import threading
+import traceback
+
+logger = logging.getLogger("ForkServer")
+
+FORKSERVER_ENV = "OSPARC_EVALUATOR_FORKSERVER"
+MAX_REQUEST_SIZE = 1 << 20  # bytes
+REAP_INTERVAL = 1.0  # seconds
+
+
+def run_engine(name):
+    """Run the engine name, in the fork server if there is one."""
+
+    socket_path = os.environ.get(FORKSERVER_ENV)
+    if socket_path:
+        exit_status = run_in_fork_server(socket_path, name)
+        if exit_status is not None:
+            sys.exit(exit_status)
+        logger.warning(
+            f"No fork server at {socket_path}, starting engine {name} in "
+            "this process"
+        )
+
+    import evaluator
+
+    evaluator.main(name)
+
+
+def run_in_fork_server(socket_path, name):
+    """Return the exit status of the engine, None if the fork server isn't
+    running."""
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return None
+
+    with client:
+        request = {
+            "name": name,
+            "cwd": os.getcwd(),
+            "environ": dict(os.environ),
+        }
+        socket.send_fds(client, [json.dumps(request).encode()], [0, 1, 2])
+        # Sent by the engine when it exits
+        exit_status = client.recv(16)
+
+    return int(exit_status) if exit_status else 1
+
+
+def serve(socket_path):
+    import evaluator
+
+    # Inherited by the workers of all the engines
+    evaluator.init_worker()
+    evaluator.worker_setup_timer = None
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    # Created with mode 0600
+    umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(umask)
+    server.listen()
+    server.settimeout(REAP_INTERVAL)
+
+    logger.info(f"Fork server listening at {socket_path}")
+
+    while True:
+        reap_engines()
+        try:
+            connection, _ = server.accept()
+        except socket.timeout:
+            continue
+
+        peer_uid = get_peer_uid(connection)
+        if peer_uid != os.getuid():
+            logger.warning(f"Refused a launcher of user {peer_uid}")
+            connection.close()
+            continue
+
+        message, fds, _, _ = socket.recv_fds(connection, MAX_REQUEST_SIZE, 3)
+        if os.fork() == 0:
+            server.close()
+            run_forked_engine(connection, json.loads(message), fds)
+
+        connection.close()
+        for fd in fds:
+            os.close(fd)
+
+
+def get_peer_uid(connection):
+    """User id of the process at the other end of a Unix socket."""
+
+    credentials = connection.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    _, uid, _ = struct.unpack("3i", credentials)
+
+    return uid
+
+
+def reap_engines():
+    try:
+        while os.waitpid(-1, os.WNOHANG)[0] != 0:
+            pass
+    except ChildProcessError:
+        pass
+
+
+def run_forked_engine(connection, request, fds):
+    """Run the engine of a launcher in the forked process, never returns."""
+
+    exit_status = 1
+    try:
+        for fd, std_fd in zip(fds, [0, 1, 2]):
+            os.dup2(fd, std_fd)
+            os.close(fd)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["environ"])
+
+        import evaluator
+
+        # The engine forks its workers first, which mustn't inherit the
+        # thread
+        evaluator.main(
+            request["name"],
+            on_workers_started=threading.Thread(
+                target=stop_on_disconnect, args=(connection,), daemon=True
+            ).start,
+        )
+        exit_status = 0
+    except SystemExit as error:
+        exit_status = error.code if isinstance(error.code, int) else 1
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            connection.send(str(exit_status).encode())
+        except OSError:
+            pass
+        os._exit(exit_status)
+
+
+def stop_on_disconnect(connection):
+    """Terminate the engine when its launcher is gone."""
+
+    try:
+        connection.recv(1)
+    except OSError:
+        pass
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+if __name__ == "__main__":
+    # e.g. python forkserver.py /tmp/evaluator.sock
+    logging.basicConfig(level=logging.INFO)
+    serve(sys.argv[1])
@@ -2,10 +2,12 @@ import os
 import sys
 import pathlib
 import json
+import math
 import time
 import uuid
 import logging
 import socket
+import collections
 
 import osparc_control as oc
 
@@ -13,9 +15,25 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Map")
 
 DEFAULT_POLLING_WAIT = 0.1  # seconds
+DEFAULT_BATCH_DURATION = 2.0  # seconds of work sent per eval_batch request
+MAX_BATCH_SIZE = 256
+FIRST_ENGINE_INPUT = 3  # input_3, input_4, ... each connect an engine
+THROUGHPUT_SMOOTHING = 0.5
 
 sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+import tools.cache
+import tools.control
+import tools.events
+import tools.metrics
 import tools.network
+import tools.schema
+import tools.scheduling
+import tools.store
+import tools.stragglers
+import tools.surrogate
+import tools.tasks
+import tools.tracing
+import tools.wire
 
 
 def main():
@@ -36,43 +54,200 @@ class oSparcMap:
         self.main_outputs_dir = pathlib.Path(
             os.environ["DY_SIDECAR_PATH_OUTPUTS"]
         )
-        self.input_dirs = [
-            self.main_inputs_dir / f"input_{i}" for i in range(3, 5)
-        ]
+        # Engine input directories, discovered while running
+        self.input_dirs = []
+        self.inputs_dir_mtime = None
 
         # Caller related
         self.caller_file_path = (
             self.main_inputs_dir / "input_2" / "caller.json"
         )
+        self.caller_file_reader = tools.control.JsonFileReader(
+            self.caller_file_path
+        )
         self.caller_transmitter = None
+        self.caller_request_id = None
+        # Declared by the caller when it connects
+        self.schema = tools.schema.Schema()
+        self.caller_encoding = tools.wire.LISTS_ENCODING
+        # Whether the caller accepts the ids of the pre-screened tasks with
+        # the results
+        self.caller_screening = False
+        # Streaming mode, the results of a map_stream request are sent in
+        # increments as replies to map_poll requests
+        self.streaming = False
+        self.poll_request_ids = collections.deque()
+        self.n_streamed_tasks = 0
+        # Caller commands held until an engine registered, see
+        # check_caller_transmitter
+        self.held_commands = collections.deque()
 
         # Map related
         self.map_file_path = self.main_outputs_dir / "output_2" / "map.json"
 
-        # Master related
+        # Master related, every engine gets its own control file in
+        # output_dir
         self.output_dir = self.main_outputs_dir / "output_1"
-        self.master_file_path = self.output_dir / "master.json"
+        # engine_id -> version of the last command written
+        self.engine_control_versions = {}
 
         # Engine related
         self.engine_ids = []
         self.engine_transmitters = {}
         self.engine_listen_ports = {}
+        # engine_id -> {request_id: (submit time, tasks)} of the requests
+        # in flight
         self.engine_request_ids = {}
-        self.engine_submitted = {}
+        # input dir -> id of the engine that registered from it
+        self.engine_dirs = {}
+        # engine file -> (mtime, size) when it was last read
+        self.engine_file_stats = {}
+        self.engine_n_workers = {}
+        # engine_id -> encoding of the eval_batch tasks and results
+        self.engine_encodings = {}
+
+        # Straggler mitigation, late requests get speculative copies on idle
+        # engines and the first result of a task wins
+        self.straggler_monitor = tools.stragglers.StragglerMonitor()
+        self.speculated_request_ids = set()
+        self.speculative_request_ids = set()
+        # request_id -> predicted time of the request on its engine, None
+        # without enough evaluation time samples
+        self.request_expected_times = {}
+        # (task, id of the engine that is late with it)
+        self.speculative_tasks = collections.deque()
+        self.blacklisted_engines = set()
+        self.engine_throughputs = {}
+        self.batch_duration = DEFAULT_BATCH_DURATION
+
+        # Heterogeneity-aware scheduling, tasks are ordered longest expected
+        # first and the fastest engines get them first
+        self.cost_model = tools.scheduling.CostModel()
+        # engine_id -> time at which its queued tasks are expected to be done
+        self.engine_busy_until = {}
+        self.request_start_time = None
+        self.predicted_makespan = None
+        self.actual_makespan = None
+
+        # Engine utilisation, the worker-seconds in which a worker had a
+        # task over the worker-seconds available since the first request
+        self.utilisation_start = None
+        self.utilisation_update_time = None
+        self.busy_worker_time = 0.0
+        self.worker_time = 0.0
+        self.n_evaluations = 0
+
+        # Result cache, keyed on the model id advertised by the engines
+        self.model_id = None
+        self.engine_model_ids = {}
+        cache_size = int(
+            os.environ.get(
+                "OSPARC_MAP_CACHE_SIZE", tools.cache.DEFAULT_MAX_SIZE
+            )
+        )
+        cache_file_path = os.environ.get("OSPARC_MAP_CACHE_FILE")
+        self.result_cache = (
+            tools.cache.ResultCache(
+                max_size=cache_size,
+                cache_file_path=(
+                    pathlib.Path(cache_file_path)
+                    if cache_file_path is not None
+                    else None
+                ),
+            )
+            if cache_size > 0
+            else None
+        )
+
+        # Surrogate of the objectives, set with OSPARC_MAP_PRESCREEN, tasks
+        # it predicts to be confidently poor get the prediction instead of
+        # an evaluation
+        self.prescreen = tools.surrogate.from_env()
+
+        # Log of finished evaluations, replayed when a request is repeated
+        # after a restart, set with OSPARC_MAP_STORE_FILE. The file grows
+        # with every evaluation, so it is kept out of the outputs, which
+        # are synced
+        store_file_path = os.environ.get("OSPARC_MAP_STORE_FILE")
+        self.evaluation_store = (
+            tools.store.EvaluationStore(pathlib.Path(store_file_path))
+            if store_file_path
+            else None
+        )
 
         # Task related
-        self.torun_tasks = []
-        self.running_tasks = []
-        self.finished_tasks = []
+        self.task_table = tools.tasks.TaskTable()
+        # Objective values of the tasks, a row per task in request order
+        self.result_table = tools.schema.ResultTable(
+            self.schema.objective_names
+        )
+
+        # Exported when OSPARC_METRICS_DIR or OSPARC_METRICS_PORT is set
+        self.metrics = tools.metrics.from_env("map", self.id)
+        self.tasks_metric = self.metrics.counter(
+            "tasks_total", "Tasks created by map requests"
+        )
+        self.cache_hits_metric = self.metrics.counter(
+            "cache_hits_total", "Tasks served from the result cache"
+        )
+        self.cache_misses_metric = self.metrics.counter(
+            "cache_misses_total", "Result cache lookups without a result"
+        )
+        self.prescreened_metric = self.metrics.counter(
+            "prescreened_tasks_total",
+            "Tasks given the predicted objectives of the pre-screen",
+        )
+        self.store_replays_metric = self.metrics.counter(
+            "store_replays_total", "Tasks replayed from the evaluation store"
+        )
+        self.queue_wait_metric = self.metrics.histogram(
+            "queue_wait_seconds",
+            "Time from the creation of a task to its dispatch to an engine",
+        )
+        self.dispatch_metric = self.metrics.histogram(
+            "dispatch_seconds", "Time to encode and send an eval_batch request"
+        )
+        self.request_metric = self.metrics.histogram(
+            "request_seconds",
+            "Time from sending an eval_batch request to its reply",
+        )
+        self.evaluation_metric = self.metrics.histogram(
+            "evaluation_seconds", "Evaluation times reported by the engines"
+        )
+        self.engine_idle_metric = self.metrics.counter(
+            "engine_idle_seconds_total",
+            "Worker-seconds in which the workers of an engine had no task",
+        )
+
+        # Spans of the requests and tasks, written when OSPARC_TRACE_DIR is
+        # set
+        self.tracer = tools.tracing.from_env("map", self.id)
+        self.tracer.name_thread(0, "loop")
+        # Whether the caller and the engines accept a trace parameter
+        self.caller_tracing = False
+        self.engine_tracing = {}
+        self.request_trace_id = None
 
         self.status = "connecting"
+        self.waiter = None
 
     def start(self, polling_wait=DEFAULT_POLLING_WAIT):
         logger.info("Starting mapping function")
 
+        # Wake up on caller and engine files being written and on messages
+        # from the transmitters, polling_wait is only used where that isn't
+        # possible
+        self.waiter = tools.events.EventWaiter(fallback_wait=polling_wait)
+        self.waiter.watch(self.caller_file_path.parent)
+        self.waiter.watch(
+            self.main_inputs_dir, mask=tools.events.SUBDIR_WATCH_MASK
+        )
+        self.discover_input_dirs()
+
         self.init_map_file()
-        self.init_master_file()
+        self.init_control_files()
         self.init_engine_files()
+        self.metrics.start()
         polling_counter = 0
 
         while True:
@@ -83,6 +258,8 @@ class oSparcMap:
                 logger.debug("Checking caller file ...")
             self.check_caller_file()
 
+            self.update_utilisation()
+
             if polling_counter % 20 == 0:
                 logger.debug("Checking engine files ...")
             self.check_engine_files()
@@ -95,21 +272,59 @@ class oSparcMap:
                 logger.debug("Checking map transmitters ...")
             self.check_caller_transmitter()
 
-            time.sleep(polling_wait)
+            self.metrics.export()
+            self.tracer.export()
+
+            wait_start = time.time()
+            self.waiter.wait(timeout=self.get_wait_timeout())
+            self.tracer.add_span("wait", wait_start, time.time())
 
             polling_counter += 1
 
         self.stop_engines()
+        self.waiter.close()
+
+        # Speculated requests that never returned saved at least the time
+        # until now
+        for requests in self.engine_request_ids.values():
+            for request_id, (_, tasks) in requests.items():
+                if request_id in self.speculated_request_ids:
+                    self.straggler_monitor.add_late_original(tasks)
+        logger.info(f"Straggler stats: {self.straggler_monitor.stats()}")
+        logger.info(f"Utilisation stats: {self.utilisation_stats()}")
+        if self.evaluation_store is not None:
+            self.evaluation_store.close()
+        self.metrics.close()
+        self.tracer.close()
 
     def check_caller_file(self):
-        if self.caller_file_path.exists():
-            content = json.loads(self.caller_file_path.read_text())
+        content = self.caller_file_reader.read()
+        if content is not None:
             command = content["command"]
             if command == "stop":
                 self.status = "stopping"
             elif command == "connect":
                 payload = content["payload"]
                 if self.status == "connecting":
+                    if "schema" in payload:
+                        self.schema = tools.schema.Schema.from_dict(
+                            payload["schema"]
+                        )
+                    self.caller_encoding = payload.get(
+                        "encoding", tools.wire.LISTS_ENCODING
+                    )
+                    self.caller_tracing = payload.get("tracing", False)
+                    self.caller_screening = payload.get("screening", False)
+                    logger.info(
+                        f"Caller schema: {self.schema.to_dict()}, "
+                        f"encoding: {self.caller_encoding}, "
+                        f"tracing: {self.caller_tracing}, "
+                        f"screening: {self.caller_screening}"
+                    )
+                    # Engines that connected before the caller only
+                    # evaluate the objectives of the default schema
+                    for engine_id in self.engine_ids:
+                        self.connect_engine(engine_id)
                     self.start_caller_transmitter(
                         payload["caller_host"], payload["caller_port"]
                     )
@@ -117,20 +332,43 @@ class oSparcMap:
             else:
                 raise ValueError(f"Received unknown command: {command}")
         else:
-            logger.debug(f"Caller file {self.caller_file_path} not found")
+            logger.debug(f"Caller file {self.caller_file_path} not changed")
 
     def start_caller_transmitter(self, remote_host, remote_port):
         if self.caller_transmitter is not None:
             return
 
+        params = [
+            oc.CommandParameter(
+                name="params_list", description="parameters list"
+            ),
+        ]
+        if self.caller_tracing:
+            params.append(
+                oc.CommandParameter(
+                    name=tools.tracing.TRACE_PARAM,
+                    description="trace id of the request, or None",
+                )
+            )
+
         self.map_manifest = oc.CommandManifest(
             action="map",
             description="evaluate parameter set and return objectives set",
-            params=[
-                oc.CommandParameter(
-                    name="params_list", description="parameters list"
-                ),
-            ],
+            params=params,
+            command_type=oc.CommandType.WITH_DELAYED_REPLY,
+        )
+        self.map_stream_manifest = oc.CommandManifest(
+            action="map_stream",
+            description="evaluate parameter set, the objectives are "
+            "returned by map_poll as they finish",
+            params=params,
+            command_type=oc.CommandType.WITHOUT_REPLY,
+        )
+        self.map_poll_manifest = oc.CommandManifest(
+            action="map_poll",
+            description="return the objectives of map_stream tasks that "
+            "finished since the last poll",
+            params=[],
             command_type=oc.CommandType.WITH_DELAYED_REPLY,
         )
 
@@ -138,7 +376,11 @@ class oSparcMap:
             self.map_listen_port,
             remote_host,
             remote_port,
-            manifests=[self.map_manifest],
+            manifests=[
+                self.map_manifest,
+                self.map_stream_manifest,
+                self.map_poll_manifest,
+            ],
         )
 
         logger.info(
@@ -171,11 +413,12 @@ class oSparcMap:
     def start_transmitter(
         self, listen_port, remote_host, remote_port, manifests=[]
     ):
-        transmitter = oc.PairedTransmitter(
+        transmitter = tools.events.NotifyingTransmitter(
             remote_host=remote_host,
             exposed_commands=manifests,
             remote_port=remote_port,
             listen_port=listen_port,
+            waiter=self.waiter,
         )
 
         transmitter.start_background_sync()
@@ -183,123 +426,1048 @@ class oSparcMap:
         return transmitter
 
     def stop_engines(self):
-        master_dict = self.read_master_dict()
         for engine_id in self.engine_ids:
-            master_dict["engines"][engine_id] = {"task": {"command": "stop"}}
-
-        self.write_master_dict(master_dict)
+            self.write_engine_control(engine_id, {"command": "stop"})
 
     def init_engine_files(self):
+        # Only done for the directories present at startup, engines that
+        # join later keep their file
         for input_dir in self.input_dirs:
             engine_fn = input_dir / "engine.json"
             if engine_fn.exists():
                 # Deleting engine file, if engine exists it will recreate it
                 engine_fn.unlink()
 
-    def populate_tasklist(self, map_input):
-        self.torun_tasks = []
-        self.running_tasks = []
-        self.finished_tasks = []
+    def populate_tasklist(self, map_input, append=False, trace_id=None):
+        """Create the tasks of a map request.
 
-        for task_id, param_values in map_input:
-            params = {
-                "gnabar_hh": param_values[0],
-                "gkbar_hh": param_values[1],
-            }
-            task = {"command": "run", "task_id": task_id, "payload": params}
-            self.torun_tasks.append(task)
+        With append, the tasks are added to the ones of the running
+        request, which is how a stream is extended. The spans of the tasks
+        carry trace_id.
+        """
 
-        logger.info(f"Created tasks: {self.torun_tasks}")
+        if not append:
+            self.task_table = tools.tasks.TaskTable()
+            self.speculative_tasks.clear()
+            self.n_streamed_tasks = 0
+            self.result_table = tools.schema.ResultTable(
+                self.schema.objective_names
+            )
 
-    def send_map_output(self):
-        objs = []
+        # Without a known model, stored results can't be matched safely
+        request_key = (
+            tools.store.get_request_key(map_input, self.model_id)
+            if self.model_id is not None
+            else None
+        )
+        stored_results = (
+            self.evaluation_store.get_results(request_key)
+            if self.evaluation_store is not None and request_key is not None
+            else {}
+        )
 
-        self.finished_tasks.sort(key=lambda task: task["task_id"])
-        for task in self.finished_tasks:
-            obj = [
-                task["result"]["step1.Spikecount"],
-                task["result"]["step2.Spikecount"],
-            ]
-            objs.append(obj)
+        first_row = self.result_table.add_rows(
+            [task_id for task_id, _ in map_input]
+        )
+
+        tasks = []
+        cached_tasks = []
+        replayed_tasks = []
+        for row, (task_id, param_values) in enumerate(
+            map_input, start=first_row
+        ):
+            params = self.schema.get_params(param_values)
+            task = tools.tasks.Task(
+                task_id, params, request_key=request_key, row=row
+            )
+            task.trace_id = trace_id
+
+            if task_id in stored_results:
+                self.finish_task(task, stored_results[task_id])
+                replayed_tasks.append(task)
+            else:
+                cached_result = self.get_cached_result(params)
+                if cached_result is not None:
+                    self.finish_task(task, cached_result)
+                    cached_tasks.append(task)
+
+            tasks.append(task)
+
+        # The surrogate of a resumed run learns from the replayed results
+        self.add_prescreen_samples(replayed_tasks + cached_tasks)
+        screened_tasks = self.prescreen_tasks(tasks)
+        self.add_tasks(tasks, [param_values for _, param_values in map_input])
+        self.tasks_metric.inc(len(map_input))
+        self.store_replays_metric.inc(len(stored_results))
+        self.store_results(cached_tasks)
+        if not append:
+            self.request_start_time = time.time()
+            self.request_trace_id = trace_id
+            self.predicted_makespan = self.predict_makespan()
+
+        logger.info(
+            f"Created {len(map_input)} tasks, "
+            f"{self.task_table.n_ready()} to run"
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Created tasks: {list(self.task_table.ready)}")
+        if len(stored_results) != 0:
+            logger.info(
+                f"Replayed {len(stored_results)} tasks from the evaluation "
+                f"store"
+            )
+        if self.result_cache is not None:
+            logger.info(
+                f"Served {len(cached_tasks)} tasks from the result cache, "
+                f"cache stats: {self.result_cache.stats()}"
+            )
+        if self.prescreen is not None:
+            logger.info(
+                f"Pre-screened {len(screened_tasks)} tasks, pre-screen "
+                f"stats: {self.prescreen.stats()}"
+            )
+
+    def prescreen_tasks(self, tasks):
+        """Finish the unfinished tasks that the pre-screen predicts to be
+        confidently poor with the predicted objectives, return them.
+
+        Their results are neither cached nor stored, since they weren't
+        evaluated.
+        """
+
+        if self.prescreen is None:
+            return []
+
+        tasks = [task for task in tasks if not task.finished]
+        screened, predictions = self.prescreen.screen(
+            [list(task.payload.values()) for task in tasks]
+        )
+        if predictions is None:
+            return []
+
+        screened_tasks = []
+        for task, is_screened, objs in zip(
+            tasks, screened.tolist(), predictions.tolist()
+        ):
+            if not is_screened:
+                continue
+            task.screened = True
+            self.finish_task(
+                task, dict(zip(self.schema.objective_names, objs)), objs
+            )
+            screened_tasks.append(task)
+        self.prescreened_metric.inc(len(screened_tasks))
+
+        return screened_tasks
+
+    def add_prescreen_samples(self, tasks):
+        if self.prescreen is None:
+            return
+
+        self.prescreen.add_samples(
+            [list(task.payload.values()) for task in tasks],
+            [
+                [task.result[name] for name in self.schema.objective_names]
+                for task in tasks
+            ],
+        )
+
+    def add_tasks(self, tasks, param_rows):
+        """Add tasks to the task table, longest expected first once the cost
+        model has samples."""
+
+        if self.cost_model.n_samples() != 0:
+            costs = self.cost_model.predict(param_rows)
+            for task, cost in zip(tasks, costs.tolist()):
+                task.cost = cost
+            tasks = sorted(tasks, key=lambda task: task.cost, reverse=True)
+
+        # Finished tasks don't enter the ready queue
+        now = time.time()
+        for task in tasks:
+            task.ready_time = now
+            self.task_table.add(task)
+
+    def predict_makespan(self):
+        """Expected time until the ready tasks are finished, None without
+        evaluation time samples or engines."""
+
+        engine_ids = self.get_dispatch_engine_ids()
+        if self.cost_model.n_samples() == 0 or len(engine_ids) == 0:
+            return None
+
+        now = time.time()
+        _, end_time = tools.scheduling.plan_tasks(
+            [task.cost for task in self.task_table.ready],
+            *self.get_engine_plan_state(engine_ids, now),
+        )
+
+        return end_time - now
+
+    def store_results(self, tasks):
+        if self.evaluation_store is None:
+            return
+
+        request_tasks = collections.defaultdict(list)
+        for task in tasks:
+            if task.request_key is not None:
+                request_tasks[task.request_key].append(task)
+        for request_key, tasks in request_tasks.items():
+            self.evaluation_store.add_results(request_key, tasks)
+
+    def get_cached_result(self, params):
+        # Without a known model, results can't be matched safely
+        if self.result_cache is None or self.model_id is None:
+            return None
+
+        result = self.result_cache.get(params, self.model_id)
+        if result is None:
+            self.cache_misses_metric.inc()
+        else:
+            self.cache_hits_metric.inc()
+
+        return result
+
+    def finish_task(self, task, result, objs=None):
+        """Set the result of a task, return False if it already had one.
+
+        objs are the objective values of the result in schema order, for
+        callers that already have them, so they aren't looked up again.
+        """
+
+        if not self.task_table.finish(task, result):
+            return False
+        if objs is None:
+            self.result_table.set_result(task.row, result)
+        else:
+            self.result_table.set_objs(task.row, objs)
+
+        return True
+
+    def send_map_output(self):
+        # The rows are in the order of the request
+        if self.caller_encoding == tools.wire.PACKED_ENCODING:
+            task_ids, objs = self.result_table.get_arrays()
+            payload = tools.wire.pack_rows(
+                self.schema.objective_names, task_ids, objs
+            )
+        else:
+            payload = self.result_table.get_objs()
+        if self.caller_screening:
+            payload = {
+                "objs": payload,
+                "screened": self.get_screened_task_ids(
+                    self.task_table.tasks.values()
+                ),
+            }
 
         self.caller_transmitter.reply_to_command(
-            request_id=self.caller_request_id, payload=objs
+            request_id=self.caller_request_id, payload=payload
         )
         self.caller_request_id = None
 
-        self.finished_tasks = []
+        self.log_request_stats()
+
+    def send_stream_output(self):
+        """Reply to the oldest map_poll with the results that finished since
+        the last poll, and the number of workers of the engines.
+
+        A poll is held until there is at least one new result or the stream
+        is done, so that callers don't have to poll in a loop.
+        """
+
+        if not self.streaming or len(self.poll_request_ids) == 0:
+            return
+
+        new_tasks = self.task_table.finished[self.n_streamed_tasks :]
+        done = self.task_table.is_done()
+        if len(new_tasks) == 0 and not done:
+            return
+
+        task_ids, objs = self.result_table.get_arrays(
+            [task.row for task in new_tasks]
+        )
+        if self.caller_encoding == tools.wire.PACKED_ENCODING:
+            results = tools.wire.pack_rows(
+                self.schema.objective_names, task_ids, objs
+            )
+        else:
+            results = list(zip(task_ids.tolist(), objs.tolist()))
+
+        # Lets steady-state callers keep every worker busy
+        payload = {
+            "results": results,
+            "done": done,
+            "n_workers": sum(self.engine_n_workers.values()),
+        }
+        if self.caller_screening:
+            payload["screened"] = self.get_screened_task_ids(new_tasks)
+        self.caller_transmitter.reply_to_command(
+            request_id=self.poll_request_ids.popleft(), payload=payload
+        )
+        self.n_streamed_tasks += len(new_tasks)
+
+        if done:
+            self.streaming = False
+            self.log_request_stats()
+
+    def get_screened_task_ids(self, tasks):
+        return [task.task_id for task in tasks if task.screened]
+
+    def log_request_stats(self):
+        if self.request_start_time is not None:
+            now = time.time()
+            self.actual_makespan = now - self.request_start_time
+            self.tracer.add_async_span(
+                "request",
+                self.request_start_time,
+                now,
+                self.request_trace_id,
+                trace_id=self.request_trace_id,
+            )
+
+        logger.info(
+            f"Straggler stats: {self.straggler_monitor.stats()}, "
+            f"blacklisted engines: {self.blacklisted_engines}"
+        )
+        logger.info(f"Utilisation stats: {self.utilisation_stats()}")
+        logger.info(f"Makespan stats: {self.makespan_stats()}")
+        if self.prescreen is not None:
+            logger.info(f"Pre-screen stats: {self.prescreen.stats()}")
+
+    def makespan_stats(self):
+        """Predicted and actual time to finish the last request, and the
+        slowness of every engine used for the prediction."""
+
+        return {
+            "predicted_makespan": self.predicted_makespan,
+            "actual_makespan": self.actual_makespan,
+            "engine_slowness": {
+                engine_id: self.cost_model.get_slowness(engine_id)
+                for engine_id in self.engine_ids
+            },
+        }
+
+    def start_utilisation(self):
+        if self.utilisation_start is None:
+            self.utilisation_start = time.time()
+            self.utilisation_update_time = self.utilisation_start
+
+    def update_utilisation(self):
+        """Add the busy and available worker time since the last update.
+
+        The tasks in flight only change within a loop iteration, so the
+        state left by the previous iteration held for the whole interval.
+        """
+
+        if self.utilisation_start is None:
+            return
+
+        now = time.time()
+        interval = now - self.utilisation_update_time
+        self.utilisation_update_time = now
+
+        for engine_id in self.engine_request_ids:
+            n_workers = self.engine_n_workers[engine_id]
+            n_tasks = self.task_table.n_running(engine_id)
+            self.busy_worker_time += interval * min(n_tasks, n_workers)
+            self.worker_time += interval * n_workers
+            self.engine_idle_metric.inc(
+                interval * max(n_workers - n_tasks, 0), engine=engine_id
+            )
+
+    def utilisation_stats(self):
+        if self.utilisation_start is None:
+            return {}
+
+        elapsed = time.time() - self.utilisation_start
+
+        return {
+            "utilisation": (
+                self.busy_worker_time / self.worker_time
+                if self.worker_time > 0
+                else None
+            ),
+            "evaluations": self.n_evaluations,
+            # A request replayed from the store can finish at once
+            "evaluations_per_second": (
+                self.n_evaluations / elapsed if elapsed > 0 else None
+            ),
+        }
 
     def check_engine_transmitters(self):
-        for engine_id, engine_transmitter in self.engine_transmitters.items():
-            if (
-                not self.engine_submitted[engine_id]
-                and len(self.torun_tasks) != 0
+        for engine_id in self.engine_transmitters:
+            self.receive_tasks(engine_id)
+
+        self.check_deadlines()
+
+        engine_ids = self.get_dispatch_engine_ids()
+        planned = self.submit_planned_tasks(engine_ids)
+
+        for engine_id in engine_ids:
+            # Keep one request in flight per worker of the engine, engines
+            # that are idle at the end of a generation take speculative
+            # copies of late tasks
+            while (
+                len(self.engine_request_ids[engine_id])
+                < self.engine_n_workers[engine_id]
             ):
-                task = self.torun_tasks.pop()
-                self.submit_task(task, engine_id)
+                tasks = (
+                    [] if planned else self.pop_batch(engine_id, engine_ids)
+                )
+                if len(tasks) != 0:
+                    self.submit_tasks(tasks, engine_id)
+                    continue
+                # No ready tasks or they are held for faster engines, which
+                # mustn't keep the copies of late tasks from running
+                tasks = self.pop_speculative_tasks(engine_id)
+                if len(tasks) == 0:
+                    break
+                self.submit_tasks(tasks, engine_id, speculative=True)
+
+    def get_dispatch_engine_ids(self):
+        """Engines that can get tasks, fastest first."""
+
+        return sorted(
+            (
+                engine_id
+                for engine_id in self.engine_transmitters
+                if engine_id not in self.blacklisted_engines
+            ),
+            key=self.cost_model.get_slowness,
+        )
 
-            elif self.engine_submitted[engine_id]:
-                self.receive_task(engine_id)
+    def get_plan_engine_ids(self, engine_ids, now):
+        """Engines that tasks can be planned on.
 
-    def submit_task(self, task, engine_id):
-        self.running_tasks.append(task)
+        Engines with a request past its deadline are left out, and so are
+        engines without a free worker that are past the time at which their
+        tasks were expected to be done, since nothing tells when they will
+        take more tasks.
+        """
 
-        logger.debug(f"Submitting parameters: {task['payload']}")
+        late_engine_ids = {
+            engine_id
+            for engine_id, requests in self.engine_request_ids.items()
+            if any(
+                request_id in self.speculated_request_ids
+                for request_id in requests
+            )
+        }
+
+        return [
+            engine_id
+            for engine_id in engine_ids
+            if engine_id not in late_engine_ids
+            and (
+                len(self.engine_request_ids[engine_id])
+                < self.engine_n_workers[engine_id]
+                or self.engine_busy_until.get(engine_id, now) > now
+            )
+        ]
+
+    def get_engine_plan_state(self, engine_ids, now):
+        """Available times, slownesses and numbers of workers of engines, as
+        used by tools.scheduling.plan_tasks."""
+
+        return (
+            [
+                max(now, self.engine_busy_until.get(engine_id, now))
+                for engine_id in engine_ids
+            ],
+            [
+                self.cost_model.get_slowness(engine_id)
+                for engine_id in engine_ids
+            ],
+            [self.engine_n_workers[engine_id] for engine_id in engine_ids],
+        )
+
+    def submit_planned_tasks(self, engine_ids):
+        """Plan where the last tasks of a request finish first.
+
+        Once there are fewer ready tasks than workers, a task is only sent
+        to an engine with a free worker if no busy engine is expected to
+        finish it earlier, otherwise it waits for that engine. Without
+        evaluation time samples there is nothing to plan with. Return
+        whether the tasks were planned.
+        """
+
+        now = time.time()
+        engine_ids = self.get_plan_engine_ids(engine_ids, now)
+        n_ready = self.task_table.n_ready()
+        if (
+            self.cost_model.n_samples() == 0
+            or n_ready == 0
+            or n_ready
+            > sum(self.engine_n_workers[engine_id] for engine_id in engine_ids)
+        ):
+            return False
+
+        n_free_requests = {
+            engine_id: self.engine_n_workers[engine_id]
+            - len(self.engine_request_ids[engine_id])
+            for engine_id in engine_ids
+        }
+        tasks = self.task_table.pop_ready(n_ready)
+        engine_indices, _ = tools.scheduling.plan_tasks(
+            [task.cost for task in tasks],
+            *self.get_engine_plan_state(engine_ids, now),
+        )
+
+        held_tasks = []
+        for task, engine_index in zip(tasks, engine_indices):
+            engine_id = engine_ids[engine_index]
+            if n_free_requests[engine_id] > 0:
+                self.submit_tasks([task], engine_id)
+                n_free_requests[engine_id] -= 1
+            else:
+                held_tasks.append(task)
+        self.task_table.requeue(held_tasks)
+
+        return True
+
+    def check_deadlines(self):
+        """Queue speculative copies of the unfinished tasks of late requests
+        and blacklist engines that are late too often."""
+
+        now = time.time()
+        for engine_id, requests in self.engine_request_ids.items():
+            for request_id, (submit_time, tasks) in requests.items():
+                if (
+                    request_id in self.speculated_request_ids
+                    or request_id in self.speculative_request_ids
+                ):
+                    continue
+
+                deadline = self.get_request_deadline(
+                    engine_id, request_id, submit_time, tasks
+                )
+                if deadline is None or now < deadline:
+                    continue
+
+                self.speculated_request_ids.add(request_id)
+                unfinished_tasks = [
+                    task for task in tasks if not task.finished
+                ]
+                self.speculative_tasks.extend(
+                    (task, engine_id) for task in unfinished_tasks
+                )
+                self.straggler_monitor.add_speculated_tasks(
+                    len(unfinished_tasks)
+                )
+                logger.info(
+                    f"Request {request_id} to engine {engine_id} missed its "
+                    f"deadline, speculating {len(unfinished_tasks)} tasks"
+                )
+
+                if self.straggler_monitor.add_miss(engine_id):
+                    self.blacklist_engine(engine_id)
+
+    def get_request_deadline(self, engine_id, request_id, submit_time, tasks):
+        """Time at which a request is late, None without enough samples."""
+
+        return self.straggler_monitor.get_deadline(
+            submit_time,
+            len(tasks),
+            engine_id,
+            expected_time=self.request_expected_times.get(request_id),
+        )
+
+    def get_expected_time(self, engine_id, tasks, now):
+        """Predicted time of a request sent to an engine now, None without
+        enough evaluation time samples.
+
+        The tasks of the request wait for the ones queued before them on
+        the engine. The engine keeps a request per worker in flight, so
+        they are then expected to take about as long as on one worker.
+        """
+
+        if self.cost_model.n_samples() < max(
+            self.straggler_monitor.min_samples,
+            self.cost_model.min_param_samples,
+        ):
+            return None
+
+        costs = self.cost_model.predict(
+            [list(task.payload.values()) for task in tasks]
+        )
+        queue_time = max(0.0, self.engine_busy_until.get(engine_id, now) - now)
+
+        return queue_time + sum(costs.tolist()) * (
+            self.cost_model.get_slowness(engine_id)
+        )
+
+    def blacklist_engine(self, engine_id):
+        # Always keep one engine to send tasks to
+        healthy_engines = (
+            set(self.engine_ids) - self.blacklisted_engines - {engine_id}
+        )
+        if engine_id in self.blacklisted_engines or not healthy_engines:
+            return
+
+        self.blacklisted_engines.add(engine_id)
+        logger.warning(
+            f"Blacklisted engine {engine_id}, it missed too many deadlines"
+        )
+
+    def parole_engine(self, engine_id):
+        """Take back a blacklisted engine that replied, on probation."""
+
+        self.blacklisted_engines.discard(engine_id)
+        self.straggler_monitor.set_probation(engine_id)
+        logger.info(
+            f"Engine {engine_id} replied after it was blacklisted, it is on "
+            "probation"
+        )
+
+    def pop_speculative_tasks(self, engine_id):
+        """Return the unfinished late tasks that engine_id can copy."""
+
+        n_tasks = max(
+            1,
+            math.ceil(
+                len(self.speculative_tasks)
+                / sum(self.engine_n_workers.values())
+            ),
+        )
+
+        tasks = []
+        other_tasks = collections.deque()
+        while len(self.speculative_tasks) != 0 and len(tasks) < n_tasks:
+            task, late_engine_id = self.speculative_tasks.popleft()
+            if task.finished:
+                continue
+            if late_engine_id == engine_id:
+                other_tasks.append((task, late_engine_id))
+            else:
+                tasks.append(task)
+        self.speculative_tasks.extendleft(reversed(other_tasks))
+
+        return tasks
+
+    def get_wait_timeout(self):
+        """Time until the next request deadline, None without deadlines."""
+
+        deadlines = [
+            self.get_request_deadline(
+                engine_id, request_id, submit_time, tasks
+            )
+            for engine_id, requests in self.engine_request_ids.items()
+            for request_id, (submit_time, tasks) in requests.items()
+            if request_id not in self.speculated_request_ids
+            and request_id not in self.speculative_request_ids
+        ]
+        deadlines = [deadline for deadline in deadlines if deadline]
+        if len(deadlines) == 0:
+            return None
+
+        return min(self.waiter.max_wait, min(deadlines) - time.time())
+
+    def get_batch_size(self, engine_id):
+        """Number of tasks to send to an engine in one eval_batch request.
+
+        Engines without a throughput measurement get a single task, after
+        that the batch is sized to keep one engine worker busy for about
+        batch_duration seconds. A batch never exceeds an equal share of the
+        remaining tasks per worker, so that a fast engine doesn't take all
+        the work at the end of a generation.
+        """
+
+        throughput = self.engine_throughputs.get(engine_id)
+        if throughput is None:
+            batch_size = 1
+        else:
+            batch_size = int(throughput * self.batch_duration)
+
+        n_workers = sum(self.engine_n_workers.values())
+        fair_share = math.ceil(self.task_table.n_ready() / n_workers)
+
+        return max(1, min(batch_size, fair_share, MAX_BATCH_SIZE))
+
+    def pop_batch(self, engine_id, engine_ids):
+        """Tasks to send to an engine in one eval_batch request.
+
+        With evaluation time samples, the batch is sized by the expected
+        evaluation time of its tasks, see get_batch_cost, otherwise by their
+        number, see get_batch_size.
+        """
+
+        if self.cost_model.n_samples() == 0:
+            return self.task_table.pop_ready(self.get_batch_size(engine_id))
+
+        return self.task_table.pop_ready_cost(
+            self.get_batch_cost(engine_id, engine_ids),
+            max_tasks=MAX_BATCH_SIZE,
+        )
+
+    def get_batch_cost(self, engine_id, engine_ids):
+        """Summed cost of the tasks of an eval_batch request to an engine.
+
+        The batch keeps one engine worker busy for about batch_duration
+        seconds, but not longer than all the workers need to finish the
+        ready tasks when they share them in proportion to their speed, so
+        that the fastest engines don't take all the long tasks at the start
+        of a generation.
+        """
+
+        speed = sum(
+            self.engine_n_workers[other_engine_id]
+            / self.cost_model.get_slowness(other_engine_id)
+            for other_engine_id in engine_ids
+        )
+        fair_time = max(self.task_table.ready_cost, 0.0) / speed
+
+        return min(self.batch_duration, fair_time) / (
+            self.cost_model.get_slowness(engine_id)
+        )
+
+    def submit_tasks(self, tasks, engine_id, speculative=False):
+        self.task_table.start(engine_id, tasks)
+
+        now = time.time()
+        expected_time = self.get_expected_time(engine_id, tasks, now)
+        self.engine_busy_until[engine_id] = (
+            max(now, self.engine_busy_until.get(engine_id, now))
+            + sum(task.cost for task in tasks)
+            * self.cost_model.get_slowness(engine_id)
+            / self.engine_n_workers[engine_id]
+        )
+
+        logger.debug(
+            f"Submitting {len(tasks)} parameter sets to engine {engine_id}"
+        )
 
         engine_transmitter = self.engine_transmitters[engine_id]
 
+        task_ids = [task.task_id for task in tasks]
+        payloads = [task.payload for task in tasks]
+        if self.engine_encodings[engine_id] == tools.wire.PACKED_ENCODING:
+            encoded_tasks = tools.wire.pack_dicts(task_ids, payloads)
+        else:
+            encoded_tasks = list(zip(task_ids, payloads))
+
+        params = {"tasks": encoded_tasks}
+        if self.engine_tracing[engine_id]:
+            params[tools.tracing.TRACE_PARAM] = [
+                task.trace_id for task in tasks
+            ]
+
         request_id = engine_transmitter.request_with_delayed_reply(
-            "eval",
-            params={"params": task["payload"], "task_id": task["task_id"]},
+            "eval_batch", params=params
         )
-        self.engine_request_ids[engine_id] = request_id
-        self.engine_submitted[engine_id] = True
+        submit_time = time.time()
+        self.engine_request_ids[engine_id][request_id] = (submit_time, tasks)
+        self.request_expected_times[request_id] = expected_time
+        self.dispatch_metric.observe(submit_time - now)
+        if self.metrics.enabled and not speculative:
+            for task in tasks:
+                self.queue_wait_metric.observe(now - task.ready_time)
+
+        self.tracer.add_span(
+            "submit_tasks",
+            now,
+            submit_time,
+            engine=engine_id,
+            n_tasks=len(tasks),
+        )
+        if self.tracer.enabled and not speculative:
+            for task in tasks:
+                self.tracer.add_async_span(
+                    "queued",
+                    task.ready_time,
+                    now,
+                    f"{task.trace_id}:{task.task_id}",
+                    trace_id=task.trace_id,
+                    task_id=task.task_id,
+                )
+        if speculative:
+            self.speculative_request_ids.add(request_id)
+
+    def receive_tasks(self, engine_id):
+        engine_transmitter = self.engine_transmitters[engine_id]
+        for request_id in list(self.engine_request_ids[engine_id]):
+            have_received, results = engine_transmitter.check_for_reply(
+                request_id
+            )
+            if not have_received:
+                continue
+            receive_time = time.time()
+            if self.engine_encodings[engine_id] == tools.wire.PACKED_ENCODING:
+                durations = tools.wire.unpack_durations(results)
+                failed = tools.wire.unpack_failed(results)
+                # The rows are reordered to the schema once per reply, so
+                # the result table doesn't look them up by name per task
+                objs_rows = tools.wire.unpack_values(
+                    results, self.schema.objective_names
+                )
+                results = tools.wire.unpack_dicts(results)
+            else:
+                durations = [result.get("duration") for result in results]
+                failed = [result.get("failed", False) for result in results]
+                results = [
+                    (result["task_id"], result["objs"]) for result in results
+                ]
+                objs_rows = [None] * len(results)
+
+            submit_time, tasks = self.engine_request_ids[engine_id].pop(
+                request_id
+            )
+            self.request_expected_times.pop(request_id, None)
+            self.task_table.stop(engine_id, tasks)
+            request_tasks = {task.task_id: task for task in tasks}
+            received_tasks = []
+            n_failed = 0
+            for (task_id, result), objs, task_failed in zip(
+                results, objs_rows, failed
+            ):
+                task = request_tasks[task_id]
+                # Another copy of the task can have finished first
+                if not self.finish_task(task, result, objs):
+                    continue
+                self.n_evaluations += 1
+                if request_id in self.speculative_request_ids:
+                    self.straggler_monitor.add_speculative_win(task)
+                logger.debug(f"Received result {task} from {engine_id}")
+                # The failed scores go to the caller, but a later request
+                # evaluates the task again
+                if task_failed:
+                    n_failed += 1
+                    continue
+                received_tasks.append(task)
+                if self.result_cache is not None:
+                    self.result_cache.put(
+                        task.payload,
+                        self.engine_model_ids[engine_id],
+                        task.result,
+                    )
+            self.store_results(received_tasks)
+            self.add_prescreen_samples(received_tasks)
+            if n_failed != 0:
+                logger.warning(
+                    f"Engine {engine_id} failed to evaluate {n_failed} tasks"
+                )
+
+            # Engines that don't time their evaluations give no samples
+            if durations is not None and None not in durations:
+                self.cost_model.add_samples(
+                    engine_id,
+                    [
+                        list(request_tasks[task_id].payload.values())
+                        for task_id, _ in results
+                    ],
+                    durations,
+                )
+                if self.metrics.enabled:
+                    for duration in durations:
+                        self.evaluation_metric.observe(duration)
+            if self.task_table.n_running(engine_id) == 0:
+                self.engine_busy_until[engine_id] = time.time()
+
+            elapsed = time.time() - submit_time
+            self.request_metric.observe(elapsed)
+            self.update_throughput(engine_id, len(results), elapsed)
+            if request_id in self.speculated_request_ids:
+                self.straggler_monitor.add_late_original(tasks)
+            else:
+                self.straggler_monitor.add_request_time(
+                    engine_id, len(results), elapsed
+                )
+                self.straggler_monitor.add_on_time(engine_id)
+            # A blacklisted engine that replies isn't hung
+            if engine_id in self.blacklisted_engines:
+                self.parole_engine(engine_id)
+            self.speculated_request_ids.discard(request_id)
+            self.speculative_request_ids.discard(request_id)
+
+            if self.tracer.enabled:
+                self.tracer.add_async_span(
+                    "eval_batch",
+                    submit_time,
+                    receive_time,
+                    request_id,
+                    engine=engine_id,
+                    task_ids=[task.task_id for task in tasks],
+                    trace_ids=sorted({task.trace_id for task in tasks}),
+                )
+                self.tracer.add_span(
+                    "receive_tasks",
+                    receive_time,
+                    time.time(),
+                    engine=engine_id,
+                    n_tasks=len(tasks),
+                )
+
+    def update_throughput(self, engine_id, n_tasks, elapsed):
+        """Update the smoothed tasks per second measured for an engine."""
+
+        throughput = n_tasks / max(elapsed, 1e-6)
+
+        previous_throughput = self.engine_throughputs.get(engine_id)
+        if previous_throughput is not None:
+            throughput = (
+                THROUGHPUT_SMOOTHING * throughput
+                + (1 - THROUGHPUT_SMOOTHING) * previous_throughput
+            )
+        self.engine_throughputs[engine_id] = throughput
 
-    def receive_task(self, engine_id):
-        request_id = self.engine_request_ids[engine_id]
-        have_received, result = self.engine_transmitters[
-            engine_id
-        ].check_for_reply(request_id)
-        if have_received:
-            task_found = False
-            for task in self.running_tasks:
-                if task["task_id"] == result["task_id"]:
-                    task["result"] = result["objs"]
-                    self.running_tasks.remove(task)
-                    self.finished_tasks.append(task)
-                    self.engine_request_ids.pop(engine_id)
-                    self.engine_submitted[engine_id] = False
-                    logger.debug(f"Received result {task} from")
-                    task_found = True
-            assert task_found
+        logger.debug(f"Engine {engine_id} throughput: {throughput} tasks/s")
 
     def check_caller_transmitter(self):
         if self.caller_transmitter is None:
             return
 
-        for command in self.caller_transmitter.get_incoming_requests():
+        # The stored results of a request are keyed on the model of the
+        # engines, so requests wait for the first engine, which a restarted
+        # map usually gets after the caller repeated its request
+        self.held_commands.extend(
+            self.caller_transmitter.get_incoming_requests()
+        )
+        while len(self.held_commands) != 0:
+            command = self.held_commands[0]
+            if (
+                command.action
+                in [self.map_manifest.action, self.map_stream_manifest.action]
+                and len(self.engine_ids) == 0
+            ):
+                logger.debug(
+                    f"Holding command {command} until an engine registers"
+                )
+                break
+            self.held_commands.popleft()
+
             logger.debug(f"Map received command: {command}")
-            if command.action == self.map_manifest.action:
-                params_list = command.params["params_list"]
-                self.caller_request_id = command.request_id
+            if command.action in [
+                self.map_manifest.action,
+                self.map_stream_manifest.action,
+            ]:
+                params_list = self.decode_params_list(
+                    command.params["params_list"]
+                )
+                trace_id = command.params.get(tools.tracing.TRACE_PARAM)
+                if trace_id is None and self.tracer.enabled:
+                    trace_id = tools.tracing.new_trace_id()
+                # A map_stream during a stream adds tasks to it
+                append = False
+                if command.action == self.map_manifest.action:
+                    self.caller_request_id = command.request_id
+                    self.streaming = False
+                else:
+                    append = self.streaming
+                    self.caller_request_id = None
+                    self.streaming = True
+                self.start_utilisation()
                 self.status = "computing"
-                self.populate_tasklist(params_list)
-
-        if (
-            self.status == "computing"
-            and len(self.torun_tasks) == 0
-            and len(self.running_tasks) == 0
-        ):
-            self.send_map_output()
+                self.populate_tasklist(
+                    params_list, append=append, trace_id=trace_id
+                )
+                # Dispatch the new tasks without waiting for an event
+                self.waiter.wake()
+            elif command.action == self.map_poll_manifest.action:
+                self.poll_request_ids.append(command.request_id)
+
+        if self.status == "computing" and self.task_table.is_done():
+            if self.caller_request_id is not None:
+                self.send_map_output()
             self.status = "ready"
 
+        self.send_stream_output()
+
+    def decode_params_list(self, params_list):
+        """Return the (task_id, parameter values) of a map request."""
+
+        if self.caller_encoding != tools.wire.PACKED_ENCODING:
+            return params_list
+
+        _, task_ids, values = tools.wire.unpack_rows(params_list)
+
+        return list(zip(task_ids.tolist(), values.tolist()))
+
+    def discover_input_dirs(self):
+        """Return new engine input directories, input_N with N >= 3.
+
+        The inputs directory is only listed again when its mtime changed,
+        which is the case when directories are added or removed.
+        """
+
+        inputs_dir_mtime = self.main_inputs_dir.stat().st_mtime_ns
+        if inputs_dir_mtime == self.inputs_dir_mtime:
+            return []
+        self.inputs_dir_mtime = inputs_dir_mtime
+
+        new_input_dirs = []
+        for input_dir in self.main_inputs_dir.glob("input_*"):
+            input_number = input_dir.name[len("input_") :]
+            if (
+                not input_number.isdigit()
+                or int(input_number) < FIRST_ENGINE_INPUT
+                or input_dir in self.input_dirs
+            ):
+                continue
+
+            self.waiter.watch(input_dir)
+            self.input_dirs.append(input_dir)
+            new_input_dirs.append(input_dir)
+
+        if len(new_input_dirs) != 0:
+            logger.info(
+                f"Found new engine input directories: {new_input_dirs}"
+            )
+
+        return new_input_dirs
+
     def check_engine_files(self):
-        for input_dir in self.input_dirs:
-            engine_fn = input_dir / "engine.json"
-            if engine_fn.exists():
-                engine_info = self.get_engine_info(engine_fn)
-                if engine_info["id"] not in self.engine_ids:
-                    self.register_engine(engine_info)
+        """Check the engine files of new and changed input directories.
+
+        Without change notifications for every directory, all engine files
+        are checked, but only read when their mtime or size changed.
+        """
+
+        new_input_dirs = self.discover_input_dirs()
+
+        changed_dirs = self.waiter.pop_changed_dirs()
+        if changed_dirs is None:
+            check_dirs = self.input_dirs
+        else:
+            check_dirs = new_input_dirs + [
+                input_dir
+                for input_dir in self.input_dirs
+                if str(input_dir) in changed_dirs
+                and input_dir not in new_input_dirs
+            ]
+
+        for input_dir in check_dirs:
+            self.check_engine_file(input_dir)
+
+    def check_engine_file(self, input_dir):
+        engine_fn = input_dir / "engine.json"
+        registered_engine_id = self.engine_dirs.get(input_dir)
+
+        try:
+            engine_stat = engine_fn.stat()
+        except FileNotFoundError:
+            self.engine_file_stats.pop(engine_fn, None)
+            if registered_engine_id is not None:
+                self.deregister_engine(registered_engine_id)
+            return
+
+        file_stat = (engine_stat.st_mtime_ns, engine_stat.st_size)
+        if self.engine_file_stats.get(engine_fn) == file_stat:
+            return
+        self.engine_file_stats[engine_fn] = file_stat
+
+        engine_info = self.get_engine_info(engine_fn)
+        engine_id = engine_info["id"]
+
+        # A restarted engine registers with a new id from the same directory
+        if registered_engine_id not in [None, engine_id]:
+            self.deregister_engine(registered_engine_id)
+
+        if engine_info["status"] == "stopped":
+            if engine_id in self.engine_ids:
+                self.deregister_engine(engine_id)
+        elif engine_id not in self.engine_ids:
+            self.register_engine(engine_info)
+            self.engine_dirs[input_dir] = engine_id
 
     def process_engine_payload(self, engine_info):
         """Get payload from engine."""
@@ -307,31 +1475,30 @@ class oSparcMap:
         task_id = engine_info["task_id"]
         payload = engine_info["payload"]
 
-        for task in self.running_tasks:
-            if task["task_id"] == task_id:
-                task["result"] = payload
-                self.running_tasks.remove(task)
-                self.finished_tasks.append(task)
+        task = self.task_table.get(task_id)
+        if task is not None:
+            self.finish_task(task, payload)
 
         logger.debug(f"Received result {payload} from {engine_info['id']}")
 
     def connect_engine(self, engine_id):
-        master_dict = self.read_master_dict()
+        """Send an engine the address of its transmitter and the objectives
+        of the schema, which a connected engine takes over."""
 
         listen_port = self.engine_listen_ports[engine_id]
-        master_dict["engines"][engine_id] = {
-            "task": {
+        self.write_engine_control(
+            engine_id,
+            {
                 "command": "connect",
                 "payload": {
                     "master_host": tools.network.get_osparc_hostname("map"),
                     "master_port": listen_port,
+                    "encoding": self.engine_encodings[engine_id],
+                    "tracing": self.engine_tracing[engine_id],
+                    "objective_names": self.schema.objective_names,
                 },
-            }
-        }
-
-        self.write_master_dict(master_dict)
-
-        self.engine_submitted[engine_id] = False
+            },
+        )
 
     def get_engine_info(self, engine_fn):
         engine_info = json.loads(engine_fn.read_text())
@@ -346,8 +1513,16 @@ class oSparcMap:
 
         if engine_status == "connecting":
             self.engine_ids.append(engine_id)
-            self.engine_submitted[engine_id] = False
+            self.engine_request_ids[engine_id] = {}
             payload = engine_info["payload"]
+            # Engines that don't advertise a worker count run one task at
+            # a time
+            self.engine_n_workers[engine_id] = payload.get("n_workers", 1)
+            self.register_model_id(engine_id, payload.get("model_id"))
+            self.engine_encodings[engine_id] = tools.wire.choose_encoding(
+                payload.get("encodings")
+            )
+            self.engine_tracing[engine_id] = payload.get("tracing", False)
             self.start_engine_transmitter(
                 engine_id,
                 remote_host=payload["engine_host"],
@@ -360,12 +1535,54 @@ class oSparcMap:
                 f"status: {engine_status}"
             )
 
-        master_dict = self.read_master_dict()
-        master_dict["engines"][engine_id] = {}
-        # self.write_master_dict(master_dict)
-
         logger.info(f"Registered engine: {engine_id}")
 
+    def deregister_engine(self, engine_id):
+        """Remove an engine that left, its tasks in flight are requeued."""
+
+        self.engine_ids.remove(engine_id)
+        self.engine_transmitters.pop(engine_id).stop_background_sync()
+        self.engine_listen_ports.pop(engine_id)
+        self.engine_n_workers.pop(engine_id)
+        self.engine_encodings.pop(engine_id)
+        self.engine_tracing.pop(engine_id)
+        self.engine_model_ids.pop(engine_id)
+        self.engine_throughputs.pop(engine_id, None)
+        self.engine_busy_until.pop(engine_id, None)
+        self.blacklisted_engines.discard(engine_id)
+        for input_dir, dir_engine_id in list(self.engine_dirs.items()):
+            if dir_engine_id == engine_id:
+                self.engine_dirs.pop(input_dir)
+
+        for request_id in self.engine_request_ids.pop(engine_id):
+            self.speculated_request_ids.discard(request_id)
+            self.speculative_request_ids.discard(request_id)
+            self.request_expected_times.pop(request_id, None)
+        # Only unfinished tasks are requeued
+        requeued_tasks = self.task_table.remove_engine(engine_id)
+
+        self.engine_control_versions.pop(engine_id, None)
+        tools.control.get_control_file_path(self.output_dir, engine_id).unlink(
+            missing_ok=True
+        )
+
+        logger.info(
+            f"Deregistered engine: {engine_id}, requeued "
+            f"{len(requeued_tasks)} tasks"
+        )
+
+    def register_model_id(self, engine_id, model_id):
+        self.engine_model_ids[engine_id] = model_id
+
+        if self.model_id is None:
+            self.model_id = model_id
+        elif model_id != self.model_id:
+            logger.warning(
+                f"Engine {engine_id} runs model {model_id}, which differs "
+                f"from model {self.model_id}, cached results will only be "
+                f"served for the first model"
+            )
+
     def init_map_file(self):
         self.map_listen_port = self.get_new_port()
         map_dict = {
@@ -373,23 +1590,37 @@ class oSparcMap:
             "payload": {
                 "map_host": tools.network.get_osparc_hostname("map"),
                 "map_port": self.map_listen_port,
+                "encodings": tools.wire.SUPPORTED_ENCODINGS,
+                "tracing": True,
+                "screening": True,
             },
         }
-        self.map_file_path.write_text(json.dumps(map_dict, indent=4))
+        tools.control.write_json_atomic(self.map_file_path, map_dict)
+
+    def init_control_files(self):
+        # Control files of a previous run
+        for control_file_path in self.output_dir.glob(
+            f"{tools.control.CONTROL_FILE_PREFIX}*.json"
+        ):
+            control_file_path.unlink()
 
-    def init_master_file(self):
-        master_dict = {"engines": {}, "id": self.id}
-        self.write_master_dict(master_dict)
+    def write_engine_control(self, engine_id, task):
+        """Atomically replace the control file of one engine.
 
-    def read_master_dict(self):
-        master_dict = json.loads(self.master_file_path.read_text())
+        Every engine only reads its own file, which is only parsed again
+        when it changed, and ignores files without a newer version.
+        """
 
-        return master_dict
+        version = self.engine_control_versions.get(engine_id, 0) + 1
+        self.engine_control_versions[engine_id] = version
 
-    def write_master_dict(self, master_dict):
-        self.master_file_path.write_text(json.dumps(master_dict, indent=4))
+        control_dict = {"id": engine_id, "version": version, "task": task}
+        tools.control.write_json_atomic(
+            tools.control.get_control_file_path(self.output_dir, engine_id),
+            control_dict,
+        )
 
-        logger.debug(f"Created new master.json: {master_dict}")
+        logger.debug(f"Wrote control file of engine {engine_id}: {task}")
 
 
 if __name__ == "__main__":
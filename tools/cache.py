@@ -0,0 +1,112 @@
+import json
+import hashlib
+import logging
+import collections
+
+logger = logging.getLogger("ToolsCache")
+
+DEFAULT_MAX_SIZE = 10000
+DEFAULT_PRECISION = 10  # significant digits
+
+
+class ResultCache:
+    """LRU cache of evaluation results keyed on model and parameter values.
+
+    Parameter values are rounded to a number of significant digits, so that
+    near-identical parameter sets proposed by the optimizer share an entry.
+    When a cache file is given, every new entry is appended to it as a JSON
+    line and the file is replayed at construction, so the cache survives
+    restarts of the map.
+    """
+
+    def __init__(
+        self,
+        max_size=DEFAULT_MAX_SIZE,
+        precision=DEFAULT_PRECISION,
+        cache_file_path=None,
+    ):
+        """Constructor."""
+
+        self.max_size = max_size
+        self.precision = precision
+        self.cache_file_path = cache_file_path
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if self.cache_file_path is not None:
+            self.load()
+
+    def get_key(self, params, model_id):
+        rounded_params = [
+            (name, float(f"{value:.{self.precision}g}"))
+            for name, value in sorted(params.items())
+        ]
+        key_json = json.dumps([model_id, rounded_params])
+
+        return hashlib.sha256(key_json.encode()).hexdigest()
+
+    def get(self, params, model_id):
+        """Return the cached result or None, and count the hit or miss."""
+
+        key = self.get_key(params, model_id)
+        if key not in self.entries:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+
+        return self.entries[key]
+
+    def put(self, params, model_id, result):
+        key = self.get_key(params, model_id)
+        self.insert(key, result)
+
+        if self.cache_file_path is not None:
+            with open(self.cache_file_path, "a") as cache_file:
+                cache_file.write(json.dumps([key, result]) + "\n")
+
+    def insert(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def load(self):
+        """Replay the cache file, keeping the most recent entries."""
+
+        if not self.cache_file_path.exists():
+            return
+
+        n_lines = 0
+        with open(self.cache_file_path) as cache_file:
+            for line in cache_file:
+                try:
+                    key, result = json.loads(line)
+                except ValueError:
+                    # Last line of a map that was stopped while writing
+                    continue
+                self.insert(key, result)
+                n_lines += 1
+
+        # Rewrite the file when most of it is evicted entries
+        if n_lines > 2 * self.max_size:
+            self.cache_file_path.write_text(
+                "".join(
+                    json.dumps([key, result]) + "\n"
+                    for key, result in self.entries.items()
+                )
+            )
+
+        logger.info(
+            f"Loaded {len(self.entries)} cached results from "
+            f"{self.cache_file_path}"
+        )
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
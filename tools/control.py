@@ -0,0 +1,70 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger("ToolsControl")
+
+CONTROL_FILE_PREFIX = "control_"
+
+
+def get_control_file_path(control_dir, engine_id):
+    return control_dir / f"{CONTROL_FILE_PREFIX}{engine_id}.json"
+
+
+def write_text_atomic(file_path, text):
+    """Write text to a temporary file and rename it over file_path, so that
+    readers never see a half-written file."""
+
+    tmp_file_path = file_path.with_name(f".{file_path.name}.tmp")
+    tmp_file_path.write_text(text)
+    os.replace(tmp_file_path, file_path)
+
+
+def write_json_atomic(file_path, content):
+    """Write content as json with write_text_atomic."""
+
+    write_text_atomic(file_path, json.dumps(content))
+
+
+class JsonFileReader:
+    """Reader of a json file that is replaced with write_json_atomic.
+
+    read() only parses the file when its inode, mtime or size changed since
+    the previous read, and returns None otherwise. Files with a "version"
+    are only returned when the version increased, since the file was last
+    seen missing, as the versions of a new writer start again.
+    """
+
+    def __init__(self, file_path):
+        """Constructor."""
+
+        self.file_path = file_path
+        self.file_stat = None
+        self.version = None
+
+    def read(self):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            self.file_stat = None
+            self.version = None
+            return None
+
+        file_stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_stat == self.file_stat:
+            return None
+        self.file_stat = file_stat
+
+        try:
+            content = json.loads(self.file_path.read_text())
+        except FileNotFoundError:
+            self.file_stat = None
+            return None
+
+        version = content.get("version")
+        if version is not None:
+            if self.version is not None and version <= self.version:
+                return None
+            self.version = version
+
+        return content
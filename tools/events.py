@@ -0,0 +1,225 @@
+import os
+import queue
+import struct
+import ctypes
+import ctypes.util
+import logging
+import selectors
+
+import osparc_control as oc
+import osparc_control.core
+import osparc_control.models
+import osparc_control.errors
+
+logger = logging.getLogger("ToolsEvents")
+
+POLLING_WAIT = 0.1  # second
+MAX_EVENT_WAIT = 1.0  # second
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_IGNORED = 0x00008000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+# Only wake up once a file has been completely written, waking up on
+# IN_CREATE or IN_MODIFY would make readers parse half-written files
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE
+# Used to detect new subdirectories, which are complete once created
+SUBDIR_WATCH_MASK = IN_CREATE | IN_MOVED_TO | IN_DELETE
+
+READ_SIZE = 4096
+
+
+def init_inotify():
+    """Return a libc handle and a non-blocking inotify fd, or None, None."""
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        inotify_fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None, None
+
+    if inotify_fd < 0:
+        return None, None
+
+    return libc, inotify_fd
+
+
+class EventWaiter:
+    """Sleep until a watched directory changes or wake() is called.
+
+    Directory changes are detected with inotify. Where inotify is not
+    available, or a directory could not be watched, wait() falls back to
+    returning after fallback_wait, which gives the behaviour of the old
+    fixed-interval polling loops. The directories in which changes were
+    seen are collected until pop_changed_dirs() is called.
+    """
+
+    def __init__(self, fallback_wait=POLLING_WAIT, max_wait=MAX_EVENT_WAIT):
+        """Constructor."""
+
+        self.fallback_wait = fallback_wait
+        self.max_wait = max_wait
+        self.selector = selectors.DefaultSelector()
+
+        self.wake_read_fd, self.wake_write_fd = os.pipe()
+        os.set_blocking(self.wake_read_fd, False)
+        os.set_blocking(self.wake_write_fd, False)
+        self.selector.register(self.wake_read_fd, selectors.EVENT_READ)
+
+        self.libc, self.inotify_fd = init_inotify()
+        if self.inotify_fd is not None:
+            self.selector.register(self.inotify_fd, selectors.EVENT_READ)
+        else:
+            logger.info("inotify not available, falling back to polling")
+
+        # watch descriptor -> watched directory
+        self.watched_dirs = {}
+        self.changed_dirs = set()
+        self.all_watched = self.inotify_fd is not None
+
+    def watch(self, dir_path, mask=WATCH_MASK):
+        """Wake up on files being written, moved or deleted in dir_path."""
+
+        dir_path = str(dir_path)
+        if dir_path in self.watched_dirs.values() or self.inotify_fd is None:
+            return
+
+        watch_descriptor = self.libc.inotify_add_watch(
+            self.inotify_fd, os.fsencode(dir_path), mask
+        )
+        if watch_descriptor < 0:
+            logger.debug(
+                f"Could not watch {dir_path}: "
+                f"{os.strerror(ctypes.get_errno())}, falling back to polling"
+            )
+            self.all_watched = False
+            return
+
+        self.watched_dirs[watch_descriptor] = dir_path
+
+    def wake(self):
+        """Interrupt wait(), safe to call from any thread."""
+
+        try:
+            os.write(self.wake_write_fd, b"\0")
+        except BlockingIOError:
+            # The pipe is full, so a wake up is pending anyway
+            pass
+
+    def wait(self, timeout=None):
+        """Block until an event or the timeout, return if an event came."""
+
+        if timeout is None:
+            timeout = self.max_wait if self.all_watched else self.fallback_wait
+
+        events = self.selector.select(max(timeout, 0))
+        for key, _ in events:
+            try:
+                while True:
+                    data = os.read(key.fd, READ_SIZE)
+                    if len(data) == 0:
+                        break
+                    if key.fd == self.inotify_fd:
+                        self.collect_changed_dirs(data)
+            except BlockingIOError:
+                pass
+
+        return len(events) != 0
+
+    def collect_changed_dirs(self, data):
+        offset = 0
+        while offset < len(data):
+            watch_descriptor, mask, _, name_length = INOTIFY_EVENT.unpack_from(
+                data, offset
+            )
+            if watch_descriptor in self.watched_dirs:
+                self.changed_dirs.add(self.watched_dirs[watch_descriptor])
+                if mask & IN_IGNORED:
+                    # The directory was removed, allow watching it again
+                    self.watched_dirs.pop(watch_descriptor)
+            offset += INOTIFY_EVENT.size + name_length
+
+    def pop_changed_dirs(self):
+        """Return the directories changed since the last call.
+
+        Returns None when changes can't be tracked for every directory,
+        in which case callers have to check all of them.
+        """
+
+        if not self.all_watched:
+            return None
+
+        changed_dirs = self.changed_dirs
+        self.changed_dirs = set()
+
+        return changed_dirs
+
+    def close(self):
+        self.selector.close()
+        for fd in [self.wake_read_fd, self.wake_write_fd, self.inotify_fd]:
+            if fd is not None:
+                os.close(fd)
+
+
+class NotifyingTransmitter(oc.PairedTransmitter):
+    """PairedTransmitter that wakes an EventWaiter on incoming messages.
+
+    It also waits for the remote side to confirm a request with a blocking
+    queue get, instead of osparc_control's fixed 0.1 s retry interval.
+
+    The public API of PairedTransmitter has no hook for incoming messages,
+    so this overrides the private methods in PRIVATE_HOOKS. They are only
+    checked against the osparc_control version pinned in requirements.txt.
+    """
+
+    PRIVATE_HOOKS = [
+        "_handle_command_request",
+        "_handle_command_reply",
+        "_enqueue_call",
+    ]
+
+    def __init__(self, *args, waiter, **kwargs):
+        """Constructor."""
+
+        super().__init__(*args, **kwargs)
+        self.waiter = waiter
+
+    def _handle_command_request(self, response):
+        super()._handle_command_request(response)
+        self.waiter.wake()
+
+    def _handle_command_reply(self, response):
+        super()._handle_command_reply(response)
+        self.waiter.wake()
+
+    def _enqueue_call(self, action, params, expected_command_type):
+        request = oc.models.CommandRequest(
+            request_id=oc.core._generate_request_id(),
+            action=action,
+            params={} if params is None else params,
+            command_type=expected_command_type,
+        )
+
+        self._request_tracker[request.request_id] = oc.models.TrackedRequest(
+            request=request, reply=None
+        )
+
+        self._out_queue.put(request)
+
+        try:
+            command_received = self._incoming_command_queue.get(
+                timeout=oc.core.WAIT_FOR_RECEIVED_S
+            )
+        except queue.Empty:
+            raise oc.errors.CommandConfirmationTimeoutError() from None
+
+        if not command_received.accepted:
+            raise oc.errors.CommandNotAcceptedError(
+                command_received.error_message
+            )
+
+        return request
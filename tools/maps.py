@@ -1,25 +1,64 @@
-import time
+import os
 import json
+import time
 import logging
 import socket
 
-import osparc_control as oc
-
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger("ToolsMap")
 
 POLLING_WAIT = 0.1  # second
 
+from . import control
+from . import events
+from . import metrics
 from . import network
+from . import schema as schemas
+from . import tracing
+from . import wire
 
 
 class oSparcFileMap:
-    def __init__(self, map_file_path, caller_file_path):
+    def __init__(self, map_file_path, caller_file_path, schema=None):
         logger.info("Creating caller map")
         self.caller_file_path = caller_file_path
         self.map_file_path = map_file_path
+        # Names of the parameter and objective values, sent to the map
+        self.schema = schema if schema is not None else schemas.Schema()
+        # Of the parameters and objectives, chosen from the encodings the map
+        # supports
+        self.encoding = wire.LISTS_ENCODING
+        # Whether the map accepts the trace id of requests
+        self.tracing = False
+        # Whether the map sends the ids of the tasks whose objectives its
+        # pre-screen predicted instead of evaluating them
+        self.screening = False
+        # Those task ids, of the last evaluate or of the current stream
+        self.screened_task_ids = set()
+        # Workers of the engines of the map, as of the last poll
+        self.n_workers = None
         self.status = "connecting"
         self.map_transmitter = None
+        # Wakes up on map.json being written and on replies from the map
+        self.waiter = events.EventWaiter(fallback_wait=POLLING_WAIT)
+        self.waiter.watch(self.map_file_path.parent)
+
+        # Exported when OSPARC_METRICS_DIR or OSPARC_METRICS_PORT is set
+        self.metrics = metrics.from_env("caller", os.getpid())
+        self.tasks_metric = self.metrics.counter(
+            "tasks_total", "Parameter sets sent to the map"
+        )
+        self.map_metric = self.metrics.histogram(
+            "map_seconds", "Time from sending a map request to its reply"
+        )
+        self.poll_metric = self.metrics.histogram(
+            "poll_seconds", "Time from sending a map_poll request to its reply"
+        )
+        self.metrics.start()
+
+        # Written when OSPARC_TRACE_DIR is set
+        self.tracer = tracing.from_env("caller", os.getpid())
+        self.tracer.name_thread(0, "caller")
 
         poll_counter = 0
         while True:
@@ -32,6 +71,11 @@ class oSparcFileMap:
                     payload = map_info["payload"]
                     map_host = payload["map_host"]
                     map_port = payload["map_port"]
+                    self.encoding = wire.choose_encoding(
+                        payload.get("encodings")
+                    )
+                    self.tracing = payload.get("tracing", False)
+                    self.screening = payload.get("screening", False)
                     self.start_map_transmitter(map_host, map_port)
                     self.status = "running"
                     break
@@ -41,7 +85,7 @@ class oSparcFileMap:
                         f"{map_info['status']}"
                     )
 
-            time.sleep(POLLING_WAIT)
+            self.waiter.wait()
             poll_counter += 1
 
     def start_map_transmitter(self, remote_host, remote_port):
@@ -67,17 +111,22 @@ class oSparcFileMap:
             "payload": {
                 "caller_host": network.get_osparc_hostname("optimizer"),
                 "caller_port": listen_port,
+                "schema": self.schema.to_dict(),
+                "encoding": self.encoding,
+                "tracing": self.tracing,
+                "screening": self.screening,
             },
         }
 
-        self.caller_file_path.write_text(json.dumps(command_dict, indent=4))
+        control.write_json_atomic(self.caller_file_path, command_dict)
 
     def start_transmitter(self, listen_port, remote_host, remote_port):
-        transmitter = oc.PairedTransmitter(
+        transmitter = events.NotifyingTransmitter(
             remote_host=remote_host,
             exposed_commands=[],
             remote_port=remote_port,
             listen_port=listen_port,
+            waiter=self.waiter,
         )
 
         transmitter.start_background_sync()
@@ -85,14 +134,16 @@ class oSparcFileMap:
         return transmitter
 
     def evaluate(self, params_set):
-        logger.info(f"Evaluating: {params_set}")
+        logger.info(f"Evaluating {len(params_set)} parameter sets")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Evaluating: {params_set}")
 
-        payload = [
-            (task_id, params) for task_id, params in enumerate(params_set)
-        ]
+        start_time = time.time()
+        payload = self.encode_params_list(list(enumerate(params_set)))
 
+        params = self.get_request_params(payload)
         request_id = self.map_transmitter.request_with_delayed_reply(
-            "map", params={"params_list": payload}
+            "map", params=params
         )
 
         result_received = False
@@ -100,12 +151,138 @@ class oSparcFileMap:
             result_received, objs_set = self.map_transmitter.check_for_reply(
                 request_id=request_id
             )
-            time.sleep(POLLING_WAIT)
+            if not result_received:
+                self.waiter.wait()
 
-        logger.info(f"Evaluation results: {objs_set}")
+        if self.screening:
+            self.screened_task_ids = set(objs_set["screened"])
+            objs_set = objs_set["objs"]
+        if self.encoding == wire.PACKED_ENCODING:
+            _, _, objs_set = wire.unpack_rows(objs_set)
+            objs_set = objs_set.tolist()
+
+        end_time = time.time()
+        self.tasks_metric.inc(len(params_set))
+        self.map_metric.observe(end_time - start_time)
+        self.metrics.export()
+        self.tracer.add_span(
+            "evaluate",
+            start_time,
+            end_time,
+            n_tasks=len(params_set),
+            trace_id=params.get(tracing.TRACE_PARAM),
+        )
+        self.tracer.export()
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Evaluation results: {objs_set}")
 
         return objs_set
 
+    def evaluate_iter(self, params_set):
+        """Yield (task_id, objectives) of params_set in completion order.
+
+        The task_id is the index in params_set. The generator has to be
+        exhausted before the next evaluation is started.
+        """
+
+        logger.info(
+            f"Evaluating {len(params_set)} parameter sets in streaming mode"
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Evaluating in streaming mode: {params_set}")
+
+        self.screened_task_ids = set()
+        self.submit(list(enumerate(params_set)))
+
+        done = False
+        while not done:
+            results, done = self.poll()
+            yield from results
+
+    def submit(self, params_list):
+        """Add (task_id, params) pairs to the streaming evaluation.
+
+        Task ids have to be unique until poll() reports the stream is done.
+        Submitting while tasks are running keeps the engines busy, which is
+        what steady-state optimisers need.
+        """
+
+        start_time = time.time()
+        params = self.get_request_params(self.encode_params_list(params_list))
+        self.map_transmitter.request_without_reply("map_stream", params=params)
+        self.tasks_metric.inc(len(params_list))
+        self.tracer.add_span(
+            "submit",
+            start_time,
+            time.time(),
+            n_tasks=len(params_list),
+            trace_id=params.get(tracing.TRACE_PARAM),
+        )
+
+    def poll(self):
+        """Block until submitted tasks finished.
+
+        Returns a list of (task_id, objectives), and whether all tasks
+        submitted so far are done. Sets n_workers to the workers of the
+        engines of the map.
+        """
+
+        # The map holds a poll until it has at least one new result
+        start_time = time.time()
+        request_id = self.map_transmitter.request_with_delayed_reply(
+            "map_poll"
+        )
+
+        result_received = False
+        while not result_received:
+            result_received, poll_result = (
+                self.map_transmitter.check_for_reply(request_id=request_id)
+            )
+            if not result_received:
+                self.waiter.wait()
+
+        results = poll_result["results"]
+        self.screened_task_ids.update(poll_result.get("screened", []))
+        self.n_workers = poll_result.get("n_workers", self.n_workers)
+        if self.encoding == wire.PACKED_ENCODING:
+            _, task_ids, objs = wire.unpack_rows(results)
+            results = list(zip(task_ids.tolist(), objs.tolist()))
+
+        end_time = time.time()
+        self.poll_metric.observe(end_time - start_time)
+        self.metrics.export()
+        self.tracer.add_span(
+            "poll", start_time, end_time, n_results=len(results)
+        )
+        self.tracer.export()
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Evaluation results: {results}")
+
+        return results, poll_result["done"]
+
+    def get_request_params(self, encoded_params_list):
+        params = {"params_list": encoded_params_list}
+        if self.tracing:
+            # The map creates an id itself if it traces and this caller
+            # doesn't
+            params[tracing.TRACE_PARAM] = (
+                tracing.new_trace_id() if self.tracer.enabled else None
+            )
+
+        return params
+
+    def encode_params_list(self, params_list):
+        if self.encoding != wire.PACKED_ENCODING:
+            return params_list
+
+        return wire.pack_rows(
+            self.schema.param_names,
+            [task_id for task_id, _ in params_list],
+            [params for _, params in params_list],
+        )
+
     def map_function(self, *map_input):
         _ = map_input[0]
         params = map_input[1]
@@ -117,6 +294,8 @@ class oSparcFileMap:
         if self.map_transmitter is not None:
             self.map_transmitter.stop_background_sync()
 
-        self.caller_file_path.write_text(json.dumps(payload, indent=4))
+        control.write_json_atomic(self.caller_file_path, payload)
+        self.metrics.close()
+        self.tracer.close()
 
         self.status = "stopping"
@@ -0,0 +1,239 @@
+import os
+import time
+import bisect
+import logging
+import pathlib
+import threading
+import http.server
+
+from . import control
+
+logger = logging.getLogger("ToolsMetrics")
+
+# Upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+EXPORT_INTERVAL = 5.0  # seconds between writes of the metrics file
+
+
+def from_env(component, instance_id):
+    """Metrics of a component, exported as configured by the environment.
+
+    OSPARC_METRICS_DIR is where every process writes its metrics file,
+    OSPARC_METRICS_PORT the port of the HTTP endpoint, 0 picks a free one.
+    The map, the engines and the caller all read the same variable, so only
+    0 is safe for processes that share a host, with a fixed port only the
+    first of them serves its metrics. Without either the metrics are
+    disabled.
+    """
+
+    metrics_dir = os.environ.get("OSPARC_METRICS_DIR")
+    port = os.environ.get("OSPARC_METRICS_PORT")
+
+    return Metrics(
+        component,
+        file_path=(
+            pathlib.Path(metrics_dir) / f"{component}_{instance_id}.prom"
+            if metrics_dir
+            else None
+        ),
+        port=int(port) if port else None,
+    )
+
+
+def format_labels(labels):
+    if len(labels) == 0:
+        return ""
+
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class NullMetric:
+    """Metric of disabled metrics, recording costs a single call."""
+
+    def inc(self, amount=1.0, **labels):
+        pass
+
+    def observe(self, value, **labels):
+        pass
+
+
+NULL_METRIC = NullMetric()
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, description, lock):
+        """Constructor."""
+
+        self.name = name
+        self.description = description
+        self.lock = lock
+        # Sorted (label name, value) pairs -> count
+        self.values = {}
+
+    def inc(self, amount=1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get_lines(self):
+        return [
+            f"{self.name}{format_labels(key)} {value}"
+            for key, value in self.values.items()
+        ]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, description, lock, buckets=DEFAULT_BUCKETS):
+        """Constructor."""
+
+        self.name = name
+        self.description = description
+        self.lock = lock
+        self.buckets = list(buckets)
+        # Sorted (label name, value) pairs -> [counts per bucket, sum]
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = self.values[key]
+            counts[0][bisect.bisect_left(self.buckets, value)] += 1
+            counts[1] += value
+
+    def get_lines(self):
+        lines = []
+        for key, (counts, total) in self.values.items():
+            n_values = 0
+            for bound, count in zip(self.buckets + ["+Inf"], counts):
+                n_values += count
+                bucket_labels = format_labels(key + (("le", bound),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {n_values}")
+            lines.append(f"{self.name}_sum{format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(key)} {n_values}")
+
+        return lines
+
+
+class Metrics:
+    """Counters and histograms of a component, in the Prometheus text format.
+
+    The metrics are written to file_path, at most every EXPORT_INTERVAL
+    seconds, and served over HTTP at port once start() is called. Disabled
+    metrics, without file_path and port, hand out a NullMetric.
+    """
+
+    def __init__(self, component, file_path=None, port=None):
+        """Constructor."""
+
+        self.component = component
+        self.file_path = file_path
+        self.port = port
+        self.enabled = file_path is not None or port is not None
+
+        self.lock = threading.Lock()
+        self.metrics = []
+        self.export_time = None
+        self.server = None
+
+    def counter(self, name, description):
+        return self.add_metric(Counter, name, description)
+
+    def histogram(self, name, description, buckets=DEFAULT_BUCKETS):
+        return self.add_metric(Histogram, name, description, buckets=buckets)
+
+    def add_metric(self, metric_class, name, description, **kwargs):
+        if not self.enabled:
+            return NULL_METRIC
+
+        metric = metric_class(
+            f"osparc_{self.component}_{name}",
+            description,
+            self.lock,
+            **kwargs,
+        )
+        self.metrics.append(metric)
+
+        return metric
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f"# HELP {metric.name} {metric.description}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric.get_lines())
+
+        return "\n".join(lines) + "\n"
+
+    def start(self):
+        """Start serving the metrics over HTTP, in a background thread.
+
+        If the port is taken, e.g. by another process on the host, the
+        metrics are only written to file_path.
+        """
+
+        if self.port is None or self.server is not None:
+            return
+
+        metrics = self
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.server = http.server.ThreadingHTTPServer(
+                ("", self.port), MetricsHandler
+            )
+        except OSError as error:
+            logger.warning(
+                f"Not serving {self.component} metrics at port {self.port}: "
+                f"{error}"
+            )
+            return
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        logger.info(
+            f"Serving {self.component} metrics at port "
+            f"{self.server.server_address[1]}"
+        )
+
+    def export(self, force=False):
+        """Write the metrics file if EXPORT_INTERVAL passed since the last
+        write."""
+
+        if self.file_path is None:
+            return
+
+        now = time.time()
+        if (
+            not force
+            and self.export_time is not None
+            and now - self.export_time < EXPORT_INTERVAL
+        ):
+            return
+        self.export_time = now
+
+        control.write_text_atomic(self.file_path, self.render())
+
+    def close(self):
+        self.export(force=True)
+
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
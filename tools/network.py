@@ -1,10 +1,12 @@
 import os
+import re
 
 
 def get_osparc_hostname(type):
-    known_types = ["map", "optimizer", "evaluator1", "evaluator2"]
+    known_types = ["map", "optimizer"]
 
-    if type not in known_types:
+    # Any number of evaluators can be connected to the map
+    if type not in known_types and re.fullmatch(r"evaluator\d+", type) is None:
         raise ValueError(
             f"Received unknown type for get_osparc_hostname: {type}"
         )
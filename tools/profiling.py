@@ -0,0 +1,188 @@
+import os
+import time
+import pathlib
+import contextlib
+
+from . import control
+
+EXPORT_INTERVAL = 5.0  # seconds between writes of the profile file
+
+
+def from_env(component, instance_id):
+    """Profiler of a component, enabled when OSPARC_PROFILE_DIR is set.
+
+    OSPARC_PROFILE_EVERY=N additionally captures a cProfile of the batch
+    of every Nth evaluation.
+    """
+
+    profile_dir = os.environ.get("OSPARC_PROFILE_DIR")
+    profile_every = os.environ.get("OSPARC_PROFILE_EVERY")
+
+    return Profiler(
+        component,
+        instance_id,
+        profile_dir=pathlib.Path(profile_dir) if profile_dir else None,
+        profile_every=int(profile_every) if profile_every else 0,
+    )
+
+
+class PhaseTimer:
+    """Wall and CPU time of the phases of an evaluation.
+
+    Phases can nest, the times of a phase exclude those of the phases
+    nested in it, the (name, start, end) spans include them.
+    """
+
+    def __init__(self):
+        """Constructor."""
+
+        self.spans = []
+        # name -> [wall seconds, cpu seconds]
+        self.times = {}
+        # [wall seconds, cpu seconds] of the phases nested in the running
+        # ones
+        self.nested_times = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.time()
+        cpu_start = time.process_time()
+        self.nested_times.append([0.0, 0.0])
+        try:
+            yield
+        finally:
+            end = time.time()
+            wall = end - start
+            cpu = time.process_time() - cpu_start
+            nested_wall, nested_cpu = self.nested_times.pop()
+            if len(self.nested_times) > 0:
+                self.nested_times[-1][0] += wall
+                self.nested_times[-1][1] += cpu
+
+            self.add_phase(
+                name, start, end, wall - nested_wall, cpu - nested_cpu
+            )
+
+    def add_phase(self, name, start, end, wall, cpu):
+        self.spans.append((name, start, end))
+        times = self.times.setdefault(name, [0.0, 0.0])
+        times[0] += wall
+        times[1] += cpu
+
+
+class NullTimer:
+    """Timer of evaluations that aren't profiled nor traced."""
+
+    def phase(self, name):
+        return NULL_PHASE
+
+
+NULL_PHASE = contextlib.nullcontext()
+NULL_TIMER = NullTimer()
+
+
+class Profiler:
+    """Phase breakdown of the evaluations of a component.
+
+    The wall and CPU times of every phase are summed over the evaluations
+    and written to <component>_<id>.profile.json in profile_dir, at most
+    every EXPORT_INTERVAL seconds. The phases of a batch of evaluations
+    are shared by its evaluations, so that the counts and means of the
+    phases are per evaluation. The batch with every profile_every-th
+    evaluation also gets a cProfile file next to it. A profiler without
+    profile_dir is disabled.
+    """
+
+    def __init__(
+        self, component, instance_id, profile_dir=None, profile_every=0
+    ):
+        """Constructor."""
+
+        self.component = component
+        self.instance_id = instance_id
+        self.profile_dir = profile_dir
+        self.profile_every = profile_every
+        self.enabled = profile_dir is not None
+
+        self.n_evaluations = 0
+        self.evaluation_time = 0.0
+        # name -> [count, wall seconds, cpu seconds, max wall seconds]
+        self.phases = {}
+        self.n_submitted = 0
+        self.export_time = None
+
+    def get_profile_path(self, n_evaluations=1):
+        """Path of the cProfile of the next batch of n_evaluations
+        evaluations, named after its profile_every-th evaluation, None if
+        it has none."""
+
+        if not self.enabled or self.profile_every <= 0:
+            return None
+
+        first = self.n_submitted + 1
+        self.n_submitted += n_evaluations
+        # The evaluations 1, 1 + profile_every, ... are profiled
+        profiled = first + (1 - first) % self.profile_every
+        if profiled > self.n_submitted:
+            return None
+
+        return str(
+            self.profile_dir
+            / f"{self.component}_{self.instance_id}_{profiled}.prof"
+        )
+
+    def add_evaluation(self, duration, times, batch_size=1):
+        """Add the duration of an evaluation and the PhaseTimer times of
+        its batch of batch_size evaluations, which are only passed with
+        one of them."""
+
+        self.n_evaluations += 1
+        self.evaluation_time += duration
+        for name, (wall, cpu) in times.items():
+            phase = self.phases.setdefault(name, [0, 0.0, 0.0, 0.0])
+            phase[0] += batch_size
+            phase[1] += wall
+            phase[2] += cpu
+            phase[3] = max(phase[3], wall / batch_size)
+
+    def get_stats(self):
+        return {
+            "id": self.instance_id,
+            "evaluations": self.n_evaluations,
+            "evaluation_seconds": self.evaluation_time,
+            "phases": {
+                name: {
+                    "count": count,
+                    "wall_seconds": wall,
+                    "cpu_seconds": cpu,
+                    "mean_wall_seconds": wall / count,
+                    "max_wall_seconds": max_wall,
+                }
+                for name, (count, wall, cpu, max_wall) in self.phases.items()
+            },
+        }
+
+    def export(self, force=False):
+        """Write the profile file if EXPORT_INTERVAL passed since the last
+        write."""
+
+        if not self.enabled or self.n_evaluations == 0:
+            return
+
+        now = time.time()
+        if (
+            not force
+            and self.export_time is not None
+            and now - self.export_time < EXPORT_INTERVAL
+        ):
+            return
+        self.export_time = now
+
+        control.write_json_atomic(
+            self.profile_dir
+            / f"{self.component}_{self.instance_id}.profile.json",
+            self.get_stats(),
+        )
+
+    def close(self):
+        self.export(force=True)
@@ -0,0 +1,161 @@
+import collections
+
+import numpy as np
+
+MAX_SAMPLES = 2000
+# Below this many samples the parameters aren't fitted, every task has the
+# mean evaluation time
+MIN_PARAM_SAMPLES = 20
+REFIT_INTERVAL = 10
+RIDGE = 1e-3
+MIN_DURATION = 1e-6  # seconds
+
+
+class CostModel:
+    """Expected evaluation time of parameter sets on every engine.
+
+    The log of the evaluation time is fitted as a linear function of the
+    parameters plus an offset per engine. The cost of a task is its
+    evaluation time in seconds on the reference engine, the first engine of
+    the samples, and the slowness of an engine multiplies that cost.
+    """
+
+    def __init__(
+        self,
+        max_samples=MAX_SAMPLES,
+        min_param_samples=MIN_PARAM_SAMPLES,
+        refit_interval=REFIT_INTERVAL,
+    ):
+        """Constructor."""
+
+        # (engine_id, parameter values, evaluation time)
+        self.samples = collections.deque(maxlen=max_samples)
+        self.min_param_samples = min_param_samples
+        self.refit_interval = refit_interval
+        self.n_new_samples = 0
+
+        # Fitted values
+        self.intercept = 0.0
+        self.engine_offsets = {}
+        self.param_mean = None
+        self.param_std = None
+        self.param_coefs = None
+
+    def n_samples(self):
+        return len(self.samples)
+
+    def add_samples(self, engine_id, param_rows, durations):
+        for param_values, duration in zip(param_rows, durations):
+            self.samples.append((engine_id, list(param_values), duration))
+        self.n_new_samples += len(durations)
+
+    def fit(self):
+        engine_ids = list(
+            dict.fromkeys(engine_id for engine_id, _, _ in self.samples)
+        )
+        engine_indices = {
+            engine_id: index for index, engine_id in enumerate(engine_ids)
+        }
+        sample_engines = np.array(
+            [engine_indices[engine_id] for engine_id, _, _ in self.samples]
+        )
+        log_durations = np.log(
+            np.maximum(
+                [duration for _, _, duration in self.samples], MIN_DURATION
+            )
+        )
+
+        # Intercept, offsets of the engines but the reference one and the
+        # standardised parameters
+        columns = [np.ones(len(self.samples))]
+        columns.extend(
+            (sample_engines == index).astype(np.float64)
+            for index in range(1, len(engine_ids))
+        )
+        use_params = len(self.samples) >= self.min_param_samples
+        if use_params:
+            params = np.array(
+                [param_values for _, param_values, _ in self.samples],
+                dtype=np.float64,
+            )
+            self.param_mean = params.mean(axis=0)
+            self.param_std = params.std(axis=0)
+            self.param_std[self.param_std == 0] = 1.0
+            columns.extend(((params - self.param_mean) / self.param_std).T)
+        features = np.column_stack(columns)
+
+        # Ridge regularisation of all but the intercept
+        n_coefs = features.shape[1]
+        ridge_rows = np.sqrt(RIDGE) * np.eye(n_coefs)[1:]
+        coefs = np.linalg.lstsq(
+            np.vstack([features, ridge_rows]),
+            np.concatenate([log_durations, np.zeros(n_coefs - 1)]),
+            rcond=None,
+        )[0]
+
+        self.intercept = coefs[0]
+        self.engine_offsets = {engine_ids[0]: 0.0}
+        self.engine_offsets.update(
+            zip(engine_ids[1:], coefs[1 : len(engine_ids)])
+        )
+        self.param_coefs = coefs[len(engine_ids) :] if use_params else None
+        self.n_new_samples = 0
+
+    def refit_if_needed(self):
+        # The fit is redone more often while there are few samples
+        n_fitted_samples = len(self.samples) - self.n_new_samples
+        if self.n_new_samples != 0 and self.n_new_samples >= min(
+            self.refit_interval, n_fitted_samples
+        ):
+            self.fit()
+
+    def predict(self, param_rows):
+        """Return the costs of parameter sets, 1.0 without samples."""
+
+        if len(self.samples) == 0:
+            return np.ones(len(param_rows))
+
+        self.refit_if_needed()
+
+        log_costs = np.full(len(param_rows), self.intercept)
+        if self.param_coefs is not None and len(param_rows) != 0:
+            params = np.asarray(param_rows, dtype=np.float64)
+            log_costs += (
+                (params - self.param_mean) / self.param_std
+            ) @ self.param_coefs
+
+        return np.exp(log_costs)
+
+    def get_slowness(self, engine_id):
+        """Factor from the cost of a task to its evaluation time on an
+        engine, 1.0 for engines without samples."""
+
+        self.refit_if_needed()
+
+        return float(np.exp(self.engine_offsets.get(engine_id, 0.0)))
+
+
+def plan_tasks(costs, available_times, slownesses, n_workers):
+    """List scheduling of tasks, in order, onto engines.
+
+    Every task goes to the engine where it is expected to finish first,
+    ties go to the first engine. An engine runs n_workers tasks at a time,
+    its queue drains n_workers times faster than a single task runs.
+    Return the index of the engine of every task and the time at which the
+    last task is expected to finish.
+    """
+
+    times = np.array(available_times, dtype=np.float64)
+    slownesses = np.asarray(slownesses, dtype=np.float64)
+    drain_factors = slownesses / np.asarray(n_workers, dtype=np.float64)
+
+    engine_indices = []
+    end_time = float(times.max()) if len(times) != 0 else 0.0
+    for cost in costs:
+        finish_times = times + cost * slownesses
+        index = int(np.argmin(finish_times))
+        engine_indices.append(index)
+        times[index] += cost * drain_factors[index]
+        end_time = max(end_time, float(finish_times[index]))
+
+    return engine_indices, end_time
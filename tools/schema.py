@@ -0,0 +1,110 @@
+import math
+
+import numpy as np
+
+# Parameters and objectives of the evaluator's simple cell model, used for
+# callers that don't declare a schema when they connect
+DEFAULT_PARAM_NAMES = ["gnabar_hh", "gkbar_hh"]
+DEFAULT_OBJECTIVE_NAMES = ["step1.Spikecount", "step2.Spikecount"]
+
+
+class Schema:
+    """Names of the parameter and objective values exchanged with a caller.
+
+    Callers send parameter values and receive objective values as lists,
+    the schema maps their positions to the names the engines use.
+    """
+
+    def __init__(
+        self,
+        param_names=DEFAULT_PARAM_NAMES,
+        objective_names=DEFAULT_OBJECTIVE_NAMES,
+    ):
+        """Constructor."""
+
+        self.param_names = list(param_names)
+        self.objective_names = list(objective_names)
+
+    @classmethod
+    def from_dict(cls, schema_dict):
+        return cls(
+            param_names=schema_dict["param_names"],
+            objective_names=schema_dict["objective_names"],
+        )
+
+    def to_dict(self):
+        return {
+            "param_names": self.param_names,
+            "objective_names": self.objective_names,
+        }
+
+    def get_params(self, param_values):
+        return dict(zip(self.param_names, param_values))
+
+
+class ResultTable:
+    """Objective values of the tasks of a request, one row per task.
+
+    Rows are added in request order and filled as results arrive, so the
+    output of a request is a slice of the table, without sorting the tasks.
+    The rows are kept as lists: writing one is cheaper than writing a row of
+    an array on every arrival, and the JSON output needs lists anyway.
+    """
+
+    def __init__(self, objective_names):
+        """Constructor."""
+
+        self.objective_names = objective_names
+        self.task_ids = []
+        # Rows without a result are NaN
+        self.objs = []
+
+    @property
+    def n_rows(self):
+        return len(self.task_ids)
+
+    def add_rows(self, task_ids):
+        """Add an empty row per task id, return the index of the first."""
+
+        first_row = self.n_rows
+        n_objectives = len(self.objective_names)
+        self.task_ids.extend(task_ids)
+        self.objs.extend([math.nan] * n_objectives for _ in task_ids)
+
+        return first_row
+
+    def set_result(self, row, result):
+        self.objs[row] = [result[name] for name in self.objective_names]
+
+    def set_objs(self, row, objs):
+        """Set the objective values of a row, in the order of the
+        objective names."""
+
+        self.objs[row] = objs
+
+    def get_arrays(self, rows=None):
+        """Return the task ids and objective values of rows, or of all
+        rows."""
+
+        task_ids, objs = self.get_rows(rows)
+
+        return (
+            np.array(task_ids, dtype=np.int64),
+            np.array(objs, dtype=np.float64).reshape(
+                len(objs), len(self.objective_names)
+            ),
+        )
+
+    def get_objs(self, rows=None):
+        """Return the objective values of rows, or of all rows, as lists."""
+
+        return self.get_rows(rows)[1]
+
+    def get_rows(self, rows=None):
+        if rows is None:
+            return list(self.task_ids), list(self.objs)
+
+        return (
+            [self.task_ids[row] for row in rows],
+            [self.objs[row] for row in rows],
+        )
@@ -0,0 +1,73 @@
+import json
+import sqlite3
+import hashlib
+import logging
+
+logger = logging.getLogger("ToolsStore")
+
+
+def get_request_key(params_list, model_id):
+    """Identify a map request by the model of the engines, which covers
+    their evaluator settings, and its task ids and parameter values."""
+
+    key_json = json.dumps(
+        [model_id, [[task_id, params] for task_id, params in params_list]]
+    )
+
+    return hashlib.sha256(key_json.encode()).hexdigest()
+
+
+class EvaluationStore:
+    """Append-only log of finished evaluations in an SQLite database.
+
+    Every result is committed as soon as it is added, in WAL mode, so that
+    a map that is restarted after a crash can replay the results of a
+    repeated request and only compute the missing task ids.
+    """
+
+    def __init__(self, store_file_path):
+        """Constructor."""
+
+        self.store_file_path = store_file_path
+        self.connection = sqlite3.connect(str(store_file_path))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS evaluations ("
+            "request_key TEXT NOT NULL, "
+            "task_id INTEGER NOT NULL, "
+            "params TEXT NOT NULL, "
+            "result TEXT NOT NULL, "
+            "PRIMARY KEY (request_key, task_id))"
+        )
+        self.connection.commit()
+
+    def add_results(self, request_key, tasks):
+        """Append the results of finished tasks, in one transaction."""
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO evaluations VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        request_key,
+                        task.task_id,
+                        json.dumps(task.payload),
+                        json.dumps(task.result),
+                    )
+                    for task in tasks
+                ],
+            )
+
+    def get_results(self, request_key):
+        """Return a dict of task_id to result stored for a request."""
+
+        rows = self.connection.execute(
+            "SELECT task_id, result FROM evaluations WHERE request_key = ?",
+            (request_key,),
+        )
+
+        return {task_id: json.loads(result) for task_id, result in rows}
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,150 @@
+import time
+import collections
+
+# Without a cost model, the evaluation times of tasks vary with their
+# parameters, which a median of the task times of an engine doesn't cover,
+# while the quartile of at least min_samples isn't dominated by stragglers
+DEFAULT_PERCENTILE = 75
+DEFAULT_DEADLINE_FACTOR = 4.0
+DEFAULT_MIN_SAMPLES = 10
+DEFAULT_MIN_DEADLINE = 1.0  # seconds
+DEFAULT_MAX_MISSES = 3
+SAMPLE_WINDOW = 1000
+
+
+class StragglerMonitor:
+    """Deadlines for engine requests from expected evaluation times.
+
+    A request is expected back within factor times its expected time. That
+    is the predicted time of its tasks on its engine when the map has a
+    cost model. Without one, it is n tasks times the chosen percentile of
+    the recent per-task evaluation times of the engine, or of all engines
+    while the engine has too few samples. Engines that miss max_misses
+    deadlines in a row should be blacklisted, an engine on probation
+    after that is blacklisted again by its next miss. The monitor also
+    keeps the statistics of the speculative copies the map sends for late
+    requests.
+    """
+
+    def __init__(
+        self,
+        percentile=DEFAULT_PERCENTILE,
+        factor=DEFAULT_DEADLINE_FACTOR,
+        min_samples=DEFAULT_MIN_SAMPLES,
+        min_deadline=DEFAULT_MIN_DEADLINE,
+        max_misses=DEFAULT_MAX_MISSES,
+    ):
+        """Constructor."""
+
+        self.percentile = percentile
+        self.factor = factor
+        self.min_samples = min_samples
+        self.min_deadline = min_deadline
+        self.max_misses = max_misses
+
+        self.task_times = collections.deque(maxlen=SAMPLE_WINDOW)
+        self.task_time_percentile = None
+        self.engine_task_times = collections.defaultdict(
+            lambda: collections.deque(maxlen=SAMPLE_WINDOW)
+        )
+        self.engine_task_time_percentiles = {}
+        self.engine_misses = collections.Counter()
+        # Deadlines missed in a row
+        self.engine_late_streaks = collections.Counter()
+
+        self.n_speculated_tasks = 0
+        self.n_speculative_wins = 0
+        self.time_saved = 0.0
+
+    def get_percentile(self, task_times):
+        """Percentile of task times, None with too few samples."""
+
+        if len(task_times) < self.min_samples:
+            return None
+
+        sorted_times = sorted(task_times)
+        index = min(
+            len(sorted_times) - 1,
+            int(len(sorted_times) * self.percentile / 100),
+        )
+
+        return sorted_times[index]
+
+    def add_request_time(self, engine_id, n_tasks, elapsed):
+        self.task_times.append(elapsed / n_tasks)
+        self.engine_task_times[engine_id].append(elapsed / n_tasks)
+
+        self.task_time_percentile = self.get_percentile(self.task_times)
+        self.engine_task_time_percentiles[engine_id] = self.get_percentile(
+            self.engine_task_times[engine_id]
+        )
+
+    def get_deadline(
+        self, submit_time, n_tasks, engine_id, expected_time=None
+    ):
+        """Return when a request is late, None without enough samples.
+
+        expected_time is the predicted time of the request on its engine,
+        without it the time is estimated from the per-task times.
+        """
+
+        if expected_time is None:
+            task_time_percentile = self.engine_task_time_percentiles.get(
+                engine_id
+            )
+            if task_time_percentile is None:
+                task_time_percentile = self.task_time_percentile
+            if task_time_percentile is None:
+                return None
+            expected_time = n_tasks * task_time_percentile
+
+        return submit_time + max(
+            self.min_deadline, self.factor * expected_time
+        )
+
+    def add_miss(self, engine_id):
+        """Count a missed deadline, return if the engine should be
+        blacklisted."""
+
+        self.engine_misses[engine_id] += 1
+        self.engine_late_streaks[engine_id] += 1
+
+        return self.engine_late_streaks[engine_id] >= self.max_misses
+
+    def add_on_time(self, engine_id):
+        """Count a request that was back before its deadline."""
+
+        self.engine_late_streaks.pop(engine_id, None)
+
+    def set_probation(self, engine_id):
+        """Let the next missed deadline of an engine blacklist it."""
+
+        self.engine_late_streaks[engine_id] = self.max_misses - 1
+
+    def add_speculated_tasks(self, n_tasks):
+        self.n_speculated_tasks += n_tasks
+
+    def add_speculative_win(self, task):
+        task.speculative_win_time = time.time()
+        self.n_speculative_wins += 1
+
+    def add_late_original(self, tasks):
+        """Account the time saved when a request whose tasks were won by
+        speculative copies returns."""
+
+        win_times = [
+            task.speculative_win_time
+            for task in tasks
+            if task.speculative_win_time is not None
+        ]
+        if len(win_times) != 0:
+            self.time_saved += time.time() - max(win_times)
+
+    def stats(self):
+        return {
+            "task_time_percentile": self.task_time_percentile,
+            "speculated_tasks": self.n_speculated_tasks,
+            "speculative_wins": self.n_speculative_wins,
+            "time_saved": self.time_saved,
+            "engine_misses": dict(self.engine_misses),
+        }
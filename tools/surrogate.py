@@ -0,0 +1,201 @@
+import os
+import collections
+
+import numpy as np
+
+MAX_SAMPLES = 300
+DEFAULT_MIN_SAMPLES = 30
+DEFAULT_QUANTILE = 0.75
+DEFAULT_CONFIDENCE = 2.0  # standard deviations
+REFIT_INTERVAL = 10
+# Length scales of the standardised parameters and noise variances of the
+# standardised objectives, the pair with the highest marginal likelihood
+# is fitted
+LENGTH_SCALES = [0.25, 0.5, 1.0, 2.0]
+NOISE_VARIANCES = [1e-4, 1e-2, 1e-1]
+
+
+def from_env():
+    """PreScreen of the map, None unless OSPARC_MAP_PRESCREEN is set.
+
+    OSPARC_MAP_PRESCREEN_QUANTILE, OSPARC_MAP_PRESCREEN_CONFIDENCE and
+    OSPARC_MAP_PRESCREEN_MIN_SAMPLES override the defaults of PreScreen.
+    """
+
+    if not os.environ.get("OSPARC_MAP_PRESCREEN"):
+        return None
+
+    return PreScreen(
+        quantile=float(
+            os.environ.get("OSPARC_MAP_PRESCREEN_QUANTILE", DEFAULT_QUANTILE)
+        ),
+        confidence=float(
+            os.environ.get(
+                "OSPARC_MAP_PRESCREEN_CONFIDENCE", DEFAULT_CONFIDENCE
+            )
+        ),
+        min_samples=int(
+            os.environ.get(
+                "OSPARC_MAP_PRESCREEN_MIN_SAMPLES", DEFAULT_MIN_SAMPLES
+            )
+        ),
+    )
+
+
+class GaussianProcess:
+    """Gaussian process regression of several outputs of the same inputs.
+
+    Inputs and outputs are standardised, the outputs share a squared
+    exponential kernel with unit variance, whose length scale and noise
+    variance are chosen from a grid by marginal likelihood.
+    """
+
+    def fit(self, inputs, outputs):
+        inputs = np.asarray(inputs, dtype=np.float64)
+        outputs = np.asarray(outputs, dtype=np.float64)
+
+        self.input_mean = inputs.mean(axis=0)
+        self.input_std = inputs.std(axis=0)
+        self.input_std[self.input_std == 0] = 1.0
+        self.output_mean = outputs.mean(axis=0)
+        self.output_std = outputs.std(axis=0)
+        self.output_std[self.output_std == 0] = 1.0
+        self.inputs = (inputs - self.input_mean) / self.input_std
+        targets = (outputs - self.output_mean) / self.output_std
+
+        n_outputs = targets.shape[1]
+        sq_distances = get_sq_distances(self.inputs, self.inputs)
+        best_likelihood = -np.inf
+        for length_scale in LENGTH_SCALES:
+            kernel = np.exp(-0.5 * sq_distances / length_scale**2)
+            for noise_variance in NOISE_VARIANCES:
+                cholesky = np.linalg.cholesky(
+                    kernel + noise_variance * np.eye(len(kernel))
+                )
+                alpha = np.linalg.solve(
+                    cholesky.T, np.linalg.solve(cholesky, targets)
+                )
+                # Summed over the outputs, without the constant
+                likelihood = -0.5 * np.sum(targets * alpha) - n_outputs * (
+                    np.sum(np.log(np.diag(cholesky)))
+                )
+                if likelihood > best_likelihood:
+                    best_likelihood = likelihood
+                    self.length_scale = length_scale
+                    self.cholesky = cholesky
+                    self.alpha = alpha
+
+    def predict(self, inputs):
+        """Return the means and standard deviations of the outputs."""
+
+        inputs = (
+            np.asarray(inputs, dtype=np.float64) - self.input_mean
+        ) / self.input_std
+        cross_kernel = np.exp(
+            -0.5 * get_sq_distances(inputs, self.inputs) / self.length_scale**2
+        )
+        means = cross_kernel @ self.alpha
+        solved = np.linalg.solve(self.cholesky, cross_kernel.T)
+        variances = np.maximum(1.0 - np.sum(solved**2, axis=0), 0.0)
+
+        return (
+            self.output_mean + means * self.output_std,
+            np.sqrt(variances)[:, None] * self.output_std,
+        )
+
+
+def get_sq_distances(inputs, other_inputs):
+    return np.maximum(
+        np.sum(inputs**2, axis=1)[:, None]
+        + np.sum(other_inputs**2, axis=1)[None, :]
+        - 2.0 * inputs @ other_inputs.T,
+        0.0,
+    )
+
+
+class PreScreen:
+    """Predicted objectives of the parameter sets that are confidently
+    poor, which don't need to be evaluated.
+
+    A GaussianProcess is refitted online to the most recent evaluations.
+    Objectives are minimised, a parameter set is confidently poor when
+    the prediction minus confidence standard deviations is above the
+    quantile of the evaluated values, for every objective. Nothing is
+    screened before there are min_samples evaluations.
+    """
+
+    def __init__(
+        self,
+        quantile=DEFAULT_QUANTILE,
+        confidence=DEFAULT_CONFIDENCE,
+        min_samples=DEFAULT_MIN_SAMPLES,
+        max_samples=MAX_SAMPLES,
+        refit_interval=REFIT_INTERVAL,
+    ):
+        """Constructor."""
+
+        self.quantile = quantile
+        self.confidence = confidence
+        self.min_samples = min_samples
+        self.refit_interval = refit_interval
+
+        # (parameter values, objective values)
+        self.samples = collections.deque(maxlen=max_samples)
+        self.n_new_samples = 0
+        self.model = None
+        self.thresholds = None
+
+        self.n_candidates = 0
+        self.n_screened = 0
+
+    def add_samples(self, param_rows, objs_rows):
+        for param_values, objs in zip(param_rows, objs_rows):
+            # Values that aren't finite don't teach the model anything, the
+            # map doesn't add the failed evaluations
+            if np.all(np.isfinite(np.asarray(objs, dtype=np.float64))):
+                self.samples.append((list(param_values), list(objs)))
+                self.n_new_samples += 1
+
+    def fit(self):
+        param_rows = [param_values for param_values, _ in self.samples]
+        objs_rows = np.array([objs for _, objs in self.samples])
+
+        self.model = GaussianProcess()
+        self.model.fit(param_rows, objs_rows)
+        self.thresholds = np.quantile(objs_rows, self.quantile, axis=0)
+        self.n_new_samples = 0
+
+    def refit_if_needed(self):
+        if len(self.samples) < self.min_samples:
+            return
+
+        if self.model is None or self.n_new_samples >= self.refit_interval:
+            self.fit()
+
+    def screen(self, param_rows):
+        """Return whether every parameter set is screened, and the
+        predicted objectives of all of them, None before the model is
+        fitted."""
+
+        self.n_candidates += len(param_rows)
+        self.refit_if_needed()
+        if self.model is None or len(param_rows) == 0:
+            return np.zeros(len(param_rows), dtype=bool), None
+
+        means, stds = self.model.predict(param_rows)
+        screened = np.all(
+            means - self.confidence * stds > self.thresholds, axis=1
+        )
+        self.n_screened += int(np.sum(screened))
+
+        return screened, means
+
+    def stats(self):
+        return {
+            "candidates": self.n_candidates,
+            "screened": self.n_screened,
+            "samples": len(self.samples),
+            "length_scale": (
+                self.model.length_scale if self.model is not None else None
+            ),
+        }
@@ -0,0 +1,153 @@
+import math
+import collections
+
+
+class Task:
+    """One parameter set of a map request."""
+
+    __slots__ = (
+        "task_id",
+        "payload",
+        "request_key",
+        "row",
+        "result",
+        "speculative_win_time",
+        "cost",
+        "ready_time",
+        "trace_id",
+        "screened",
+    )
+
+    def __init__(self, task_id, payload, request_key=None, row=None, cost=1.0):
+        """Constructor."""
+
+        self.task_id = task_id
+        self.payload = payload
+        self.request_key = request_key
+        self.row = row
+        self.result = None
+        self.speculative_win_time = None
+        # Expected evaluation time, see tools.scheduling.CostModel
+        self.cost = cost
+        # When the task entered the ready queue
+        self.ready_time = None
+        self.trace_id = None
+        # Whether the result was predicted by the map's pre-screen
+        self.screened = False
+
+    @property
+    def finished(self):
+        return self.result is not None
+
+    def __repr__(self):
+        return f"Task({self.task_id}, {self.payload})"
+
+
+class TaskTable:
+    """Tasks of the current request with O(1) bookkeeping per task.
+
+    Tasks are indexed by task_id, wait in a FIFO ready queue until they are
+    dispatched, and are tracked per engine while running. A request is
+    done when the completion counter reaches the number of tasks.
+    """
+
+    def __init__(self):
+        """Constructor."""
+
+        self.tasks = {}
+        self.ready = collections.deque()
+        # Summed cost of the ready tasks
+        self.ready_cost = 0.0
+        # engine_id -> set of the task ids it is running
+        self.running = collections.defaultdict(set)
+        # In order of completion
+        self.finished = []
+
+    def add(self, task):
+        self.tasks[task.task_id] = task
+        if not task.finished:
+            self.ready.append(task)
+            self.ready_cost += task.cost
+
+    def get(self, task_id):
+        return self.tasks.get(task_id)
+
+    def n_ready(self):
+        return len(self.ready)
+
+    def pop_ready(self, n_tasks):
+        """Return up to n_tasks unfinished tasks, in the order they were
+        added."""
+
+        return self.pop_ready_cost(math.inf, max_tasks=n_tasks)
+
+    def pop_ready_cost(self, max_cost, max_tasks=math.inf):
+        """Return unfinished tasks in the order they were added, until their
+        summed cost reaches max_cost, at least one task."""
+
+        tasks = []
+        cost = 0.0
+        while (
+            len(self.ready) != 0
+            and len(tasks) < max_tasks
+            and (len(tasks) == 0 or cost + self.ready[0].cost <= max_cost)
+        ):
+            task = self.ready.popleft()
+            self.ready_cost -= task.cost
+            # Requeued tasks can be finished by a speculative copy
+            if not task.finished:
+                tasks.append(task)
+                cost += task.cost
+
+        return tasks
+
+    def requeue(self, tasks):
+        """Put tasks back in front of the ready queue, in order."""
+
+        self.ready.extendleft(reversed(tasks))
+        self.ready_cost += sum(task.cost for task in tasks)
+
+    def start(self, engine_id, tasks):
+        self.running[engine_id].update(task.task_id for task in tasks)
+
+    def stop(self, engine_id, tasks):
+        running = self.running[engine_id]
+        for task in tasks:
+            # Copies of tasks of a previous request can still return, their
+            # task ids can be reused
+            if self.tasks.get(task.task_id) is task:
+                running.discard(task.task_id)
+
+    def finish(self, task, result):
+        """Set the result of a task, return False if it already had one."""
+
+        if task.finished:
+            return False
+
+        task.result = result
+        self.finished.append(task)
+
+        return True
+
+    def n_running(self, engine_id):
+        return len(self.running.get(engine_id, ()))
+
+    def remove_engine(self, engine_id):
+        """Put the unfinished tasks of an engine in front of the ready queue,
+        return them."""
+
+        task_ids = self.running.pop(engine_id, set())
+        requeued_tasks = [
+            self.tasks[task_id]
+            for task_id in sorted(task_ids)
+            if not self.tasks[task_id].finished
+        ]
+        self.requeue(requeued_tasks)
+
+        return requeued_tasks
+
+    def n_finished(self):
+        return len(self.finished)
+
+    def is_done(self):
+        return len(self.finished) == len(self.tasks)
@@ -0,0 +1,180 @@
+import sys
+import math
+import types
+import shutil
+import pathlib
+
+import numpy as np
+import pytest
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(ROOT_DIR / "dakoptimizer"))
+
+import analyse_surr  # noqa: E402
+
+# Iterations 1 and 2 of a Dakota run, the true values of iteration 3 are
+# still being written
+RUN_DIR = pathlib.Path(__file__).resolve().parent / "data" / "dakota_run"
+NAN = math.nan
+ERRORS = {
+    1: [[0.5, 0.0], [-0.5, 0.5], [0.0, 0.0]],
+    # The second row has other parameter values, the third no true values
+    2: [[1.0, 0.0], [NAN, NAN], [NAN, NAN]],
+    3: [[0.0, 1.0]],
+}
+RMS = {1: [(0.5 / 3) ** 0.5, (0.25 / 3) ** 0.5], 2: [1.0, 0.0], 3: [0.0, 1.0]}
+ROLLING_RMS = {
+    1: RMS[1],
+    2: [(1.5 / 4) ** 0.5, (0.25 / 4) ** 0.5],
+    3: [(1.5 / 5) ** 0.5, (1.25 / 5) ** 0.5],
+}
+
+
+class StubAxes:
+    """Records what is plotted on the axes of matplotlib."""
+
+    def __init__(self):
+        """Constructor."""
+
+        # (args, kwargs) of the calls of plot
+        self.lines = []
+
+    def plot(self, *args, **kwargs):
+        self.lines.append((args, kwargs))
+
+        return (types.SimpleNamespace(get_color=lambda: "C0"),)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def stub_pyplot():
+    """Stand-in for matplotlib.pyplot, whose figures are kept as a list of
+    axes."""
+
+    pyplot = types.ModuleType("matplotlib.pyplot")
+    pyplot.figures = []
+
+    def subplots(n_rows, n_columns):
+        axes = [StubAxes() for _ in range(n_rows * n_columns)]
+        pyplot.figures.append(axes)
+
+        return None, axes if len(axes) > 1 else axes[0]
+
+    pyplot.subplots = subplots
+    pyplot.show = lambda: None
+
+    return pyplot
+
+
+def assert_iterations(iterations, numbers):
+    assert [stored["iteration"] for stored in iterations] == numbers
+    for stored in iterations:
+        number = stored["iteration"]
+        assert np.allclose(
+            stored["errors"],
+            ERRORS[number],
+            rtol=0,
+            atol=1e-12,
+            equal_nan=True,
+        )
+        assert np.allclose(stored["rms"], RMS[number], rtol=0, atol=1e-12)
+        assert np.allclose(
+            stored["rolling_rms"], ROLLING_RMS[number], rtol=0, atol=1e-12
+        )
+
+
+def test_analyse(tmp_path):
+    run_dir = tmp_path / "run"
+    shutil.copytree(RUN_DIR, run_dir)
+    store = analyse_surr.SurrErrorStore(run_dir / "surr_errors.sqlite")
+    # Stops at the incomplete iteration
+    analyse_surr.analyse(run_dir, store)
+    assert_iterations(store.get_iterations(), [1, 2])
+    store.close()
+
+    # A restarted analysis resumes after the stored iterations
+    with open(run_dir / "finaldatatruth3.dat", "a") as truth_file:
+        truth_file.write("\n")
+    store = analyse_surr.SurrErrorStore(run_dir / "surr_errors.sqlite")
+    analyse_surr.analyse(run_dir, store)
+    assert_iterations(store.get_iterations(), [1, 2, 3])
+    store.close()
+
+
+def test_table_reader_parses_new_lines(tmp_path):
+    table_path = tmp_path / "finaldata1.dat"
+    reader = analyse_surr.TableReader(table_path)
+    assert reader.read() is None
+    table_path.write_bytes(b"")
+    assert reader.read() is None
+
+    # The complete lines are parsed once, the table is returned when the
+    # last line is complete
+    with open(table_path, "ab") as table_file:
+        table_file.write(b"1.0\t2.0\t3.0\n4.0\t5.")
+    assert reader.read() is None
+    assert reader.chunks[0].tolist() == [[1.0, 2.0, 3.0]]
+    with open(table_path, "ab") as table_file:
+        table_file.write(b"0\t6.0\n")
+    assert reader.read().tolist() == [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]
+    assert reader.offset == table_path.stat().st_size
+
+    # A file written again is read from the start
+    table_path.write_bytes(b"7.0 8.0\n")
+    assert reader.read().tolist() == [[7.0, 8.0]]
+
+    with open(table_path, "ab") as table_file:
+        table_file.write(b"9.0\n")
+    with pytest.raises(ValueError):
+        reader.read()
+    table_path.write_bytes(b"7.0 x\n")
+    with pytest.raises(ValueError):
+        analyse_surr.TableReader(table_path).read()
+
+
+def test_plot(tmp_path, monkeypatch):
+    run_dir = tmp_path / "run"
+    shutil.copytree(RUN_DIR, run_dir)
+    pyplot = stub_pyplot()
+    matplotlib = types.ModuleType("matplotlib")
+    matplotlib.pyplot = pyplot
+    monkeypatch.setitem(sys.modules, "matplotlib", matplotlib)
+    monkeypatch.setitem(sys.modules, "matplotlib.pyplot", pyplot)
+    monkeypatch.delitem(sys.modules, "plot_surr", raising=False)
+    monkeypatch.setattr(
+        sys, "argv", ["plot_surr.py", "--run-dir", str(run_dir)]
+    )
+    import plot_surr
+
+    plot_surr.main()
+
+    # The absolute errors of every iteration, per objective
+    error_axes, (rms_axes,) = pyplot.figures
+    for index, axes in enumerate(error_axes):
+        assert [kwargs["label"] for _, kwargs in axes.lines] == [1, 2]
+        for (errors,), kwargs in axes.lines:
+            assert np.allclose(
+                errors,
+                np.abs(ERRORS[kwargs["label"]])[:, index],
+                rtol=0,
+                atol=1e-12,
+                equal_nan=True,
+            )
+    # The RMS errors and rolling RMS errors over the iterations
+    assert [kwargs["label"] for _, kwargs in rms_axes.lines] == [
+        "f1",
+        "f1, rolling",
+        "f2",
+        "f2, rolling",
+    ]
+    for line_index, ((numbers, values), _) in enumerate(rms_axes.lines):
+        index, rolling = divmod(line_index, 2)
+        expected = ROLLING_RMS if rolling else RMS
+        assert numbers == [1, 2]
+        assert np.allclose(
+            values,
+            [expected[number][index] for number in numbers],
+            rtol=0,
+            atol=1e-12,
+        )
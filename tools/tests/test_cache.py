@@ -0,0 +1,39 @@
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+import tools.cache
+
+
+def test_rounding_and_model_id():
+    cache = tools.cache.ResultCache(precision=6)
+    cache.put({"a": 0.1, "b": 0.2}, "model", [1.0])
+
+    assert cache.get({"b": 0.2, "a": 0.1 + 1e-12}, "model") == [1.0]
+    assert cache.get({"a": 0.1, "b": 0.2}, "other_model") is None
+    assert cache.get({"a": 0.1001, "b": 0.2}, "model") is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 2}
+
+
+def test_lru_eviction():
+    cache = tools.cache.ResultCache(max_size=2)
+    for value in range(3):
+        cache.put({"a": value}, "model", value)
+        # Keep the first entry recently used
+        cache.get({"a": 0}, "model")
+
+    assert cache.get({"a": 0}, "model") == 0
+    assert cache.get({"a": 1}, "model") is None
+    assert cache.get({"a": 2}, "model") == 2
+
+
+def test_persistence(tmp_path):
+    cache_file_path = tmp_path / "cache.jsonl"
+    cache = tools.cache.ResultCache(cache_file_path=cache_file_path)
+    cache.put({"a": 1.0}, "model", {"obj": 2.0})
+
+    with open(cache_file_path, "a") as cache_file:
+        cache_file.write('["truncated')
+
+    reloaded_cache = tools.cache.ResultCache(cache_file_path=cache_file_path)
+    assert reloaded_cache.get({"a": 1.0}, "model") == {"obj": 2.0}
@@ -0,0 +1,37 @@
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+import tools.control
+
+
+def test_reader_only_returns_new_versions(tmp_path):
+    control_file_path = tools.control.get_control_file_path(tmp_path, "e1")
+    reader = tools.control.JsonFileReader(control_file_path)
+    assert reader.read() is None
+
+    tools.control.write_json_atomic(control_file_path, {"version": 1})
+    assert reader.read() == {"version": 1}
+    # Unchanged file
+    assert reader.read() is None
+
+    # Rewritten with an old version
+    tools.control.write_json_atomic(control_file_path, {"version": 1})
+    assert reader.read() is None
+
+    tools.control.write_json_atomic(control_file_path, {"version": 2})
+    assert reader.read() == {"version": 2}
+    assert [path.name for path in tmp_path.iterdir()] == ["control_e1.json"]
+
+
+def test_reader_versions_start_again_after_deletion(tmp_path):
+    control_file_path = tools.control.get_control_file_path(tmp_path, "e1")
+    reader = tools.control.JsonFileReader(control_file_path)
+    tools.control.write_json_atomic(control_file_path, {"version": 3})
+    assert reader.read() == {"version": 3}
+
+    # Deleted by a restarted writer, whose versions start at 1
+    control_file_path.unlink()
+    assert reader.read() is None
+    tools.control.write_json_atomic(control_file_path, {"version": 1})
+    assert reader.read() == {"version": 1}
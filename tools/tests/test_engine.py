@@ -0,0 +1,248 @@
+import os
+import sys
+import time
+import types
+import pathlib
+import importlib.util
+
+import pytest
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+sys.path.append(str(ROOT_DIR / "evaluator"))
+
+OBJECTIVE_NAMES = ["step1.Spikecount", "step2.Spikecount"]
+
+# Objectives the workers evaluate, set by init_stand_in_worker
+worker_objective_names = OBJECTIVE_NAMES
+
+
+def init_stand_in_worker(objective_names=None):
+    """Stand-in for evaluator.init_worker."""
+
+    global worker_objective_names
+
+    worker_objective_names = objective_names
+
+
+def run_stand_in_batch(input_params_list, record=False, profile_path=None):
+    """Stand-in for evaluator.run_worker_timed_batch, whose evaluations fail
+    or kill its worker as the parameters say.
+
+    The second objective is the size of the batch, the others are x.
+    """
+
+    results = []
+    for input_params in input_params_list:
+        if input_params.get("fail") == "raise":
+            results.append(ValueError("Evaluation failed"))
+            continue
+        if input_params.get("fail") == "exit":
+            os._exit(1)
+
+        objs = {
+            name: (
+                len(input_params_list)
+                if name == OBJECTIVE_NAMES[1]
+                else input_params["x"]
+            )
+            for name in worker_objective_names
+        }
+        results.append((objs, 0.01, None))
+
+    return results
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setenv("DY_SIDECAR_PATH_INPUTS", str(tmp_path))
+    monkeypatch.setenv("DY_SIDECAR_PATH_OUTPUTS", str(tmp_path))
+    import evaluator
+
+    engine = evaluator.EvalEngine(
+        "evaluator",
+        n_workers=2,
+        worker_initializer=init_stand_in_worker,
+        worker_function=run_stand_in_batch,
+        objective_names=OBJECTIVE_NAMES,
+    )
+    engine.replies = {}
+    engine.transmitter = types.SimpleNamespace(
+        reply_to_command=lambda request_id, payload: engine.replies.update(
+            {request_id: payload}
+        )
+    )
+    engine.start_pool()
+    yield engine
+    engine.stop_pool()
+    engine.stop_quarantine_pool()
+    engine.waiter.close()
+
+
+def get_reply(engine, request_id, timeout=30.0):
+    end_time = time.time() + timeout
+    while time.time() < end_time:
+        engine.reply_finished_requests()
+        if request_id in engine.replies:
+            return {
+                result["task_id"]: result["objs"]["step1.Spikecount"]
+                for result in engine.replies[request_id]
+            }
+        time.sleep(0.01)
+
+    raise TimeoutError(f"No reply to {request_id}")
+
+
+def test_failed_evaluation_gets_failed_scores(engine):
+    import evaluator
+
+    engine.submit_tasks(
+        "request", [(0, {"x": 1.0}), (1, {"fail": "raise"})], batch=True
+    )
+    assert get_reply(engine, "request") == {0: 1.0, 1: evaluator.FAILED_SCORE}
+    # The map doesn't cache or store the failed scores
+    assert [result["failed"] for result in engine.replies["request"]] == [
+        False,
+        True,
+    ]
+
+    engine.submit_tasks("next", [(2, {"x": 2.0})], batch=True)
+    assert get_reply(engine, "next") == {2: 2.0}
+
+
+def test_dead_worker_restarts_pool(engine):
+    import evaluator
+
+    engine.submit_tasks(
+        "request",
+        [(0, {"x": 1.0}), (1, {"fail": "exit"}), (2, {"x": 3.0})],
+        batch=True,
+    )
+    engine.submit_tasks("other", [(3, {"x": 4.0})], batch=True)
+    # The task that kills its worker gets the failed scores, the tasks that
+    # were lost with it are evaluated again
+    assert get_reply(engine, "request") == {
+        0: 1.0,
+        1: evaluator.FAILED_SCORE,
+        2: 3.0,
+    }
+    assert [result["failed"] for result in engine.replies["request"]] == [
+        False,
+        True,
+        False,
+    ]
+    assert get_reply(engine, "other") == {3: 4.0}
+    # The engine runs threads by now, which a forked process can deadlock on
+    assert engine.pool._mp_context.get_start_method() == "forkserver"
+
+    engine.submit_tasks("next", [(4, {"x": 2.0})], batch=True)
+    assert get_reply(engine, "next") == {4: 2.0}
+    assert engine.quarantine_pool is None
+
+
+def test_request_split_into_batches(engine):
+    engine.submit_tasks(
+        "request", [(task_id, {"x": 1.0}) for task_id in range(5)], batch=True
+    )
+    get_reply(engine, "request")
+    assert [
+        result["objs"]["step2.Spikecount"]
+        for result in engine.replies["request"]
+    ] == [2, 2, 2, 2, 1]
+
+
+def test_connect_sets_objective_names(engine, monkeypatch):
+    import tools.control
+
+    monkeypatch.setattr(
+        engine,
+        "start_transmitter",
+        lambda remote_host, remote_port: setattr(engine, "status", "ready"),
+    )
+    engine.input2_dir.mkdir()
+    # The map connects the engine, and again once its caller connected
+    for version, objective_names in enumerate(
+        [OBJECTIVE_NAMES, ["step1.Spikecount", "step1.AP_height"]], start=1
+    ):
+        tools.control.write_json_atomic(
+            engine.control_file_reader.file_path,
+            {
+                "id": engine.id,
+                "version": version,
+                "task": {
+                    "command": "connect",
+                    "payload": {
+                        "master_host": "localhost",
+                        "master_port": 0,
+                        "objective_names": objective_names,
+                    },
+                },
+            },
+        )
+        engine.check_control_file()
+        assert engine.status == "ready"
+
+        engine.submit_tasks(version, [(0, {"x": 1.0})], batch=True)
+        get_reply(engine, version)
+        assert engine.replies[version][0]["objs"] == dict.fromkeys(
+            objective_names, 1.0
+        )
+
+
+def test_map_restart_under_live_engine(engine, tmp_path, monkeypatch):
+    # The engine's files are in tmp_path, the map's elsewhere, linked as in
+    # a deployment
+    for name in ["map_inputs", "map_outputs", "input_2", "output_1"]:
+        (tmp_path / name).mkdir()
+    (tmp_path / "map_inputs" / "input_3").symlink_to(tmp_path / "output_1")
+    (tmp_path / "map_outputs" / "output_1").symlink_to(tmp_path / "input_2")
+    monkeypatch.setenv("DY_SIDECAR_PATH_INPUTS", str(tmp_path / "map_inputs"))
+    monkeypatch.setenv(
+        "DY_SIDECAR_PATH_OUTPUTS", str(tmp_path / "map_outputs")
+    )
+    monkeypatch.setenv("OSPARC_MAP_CACHE_SIZE", "0")
+    monkeypatch.setenv("OSPARC_MAP_STORE_FILE", "")
+    spec = importlib.util.spec_from_file_location(
+        "map_main", ROOT_DIR / "map" / "main.py"
+    )
+    map_main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(map_main)
+
+    def start_transmitter(remote_host, remote_port):
+        engine.transmitter = types.SimpleNamespace(
+            stop_background_sync=lambda: None
+        )
+        engine.status = "ready"
+
+    monkeypatch.setattr(engine, "start_transmitter", start_transmitter)
+    monkeypatch.setattr(engine, "name", "evaluator1")
+
+    for restart in [False, True]:
+        # Starts as oSparcMap.start, the engine keeps running
+        osparc_map = map_main.oSparcMap()
+        osparc_map.waiter = types.SimpleNamespace(
+            watch=lambda *args, **kwargs: None
+        )
+        osparc_map.start_engine_transmitter = (
+            lambda engine_id, remote_host, remote_port: (
+                osparc_map.engine_listen_ports.update({engine_id: 0})
+            )
+        )
+        osparc_map.discover_input_dirs()
+        osparc_map.init_control_files()
+        osparc_map.init_engine_files()
+
+        engine.check_engine_file()
+        assert engine.status == "connecting"
+        assert "request" not in engine.pending_requests
+        osparc_map.check_engine_file(osparc_map.input_dirs[0])
+        assert osparc_map.engine_ids == [engine.id]
+        engine.check_control_file()
+        assert engine.status == "ready"
+
+        if not restart:
+            # Commands of the map after the connect, and a request it
+            # won't wait for
+            osparc_map.connect_engine(engine.id)
+            engine.check_control_file()
+            engine.submit_tasks("request", [(0, {"x": 1.0})], batch=True)
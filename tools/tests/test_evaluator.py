@@ -0,0 +1,196 @@
+import os
+import sys
+import random
+import pathlib
+import logging
+
+import numpy as np
+import pytest
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+sys.path.append(str(ROOT_DIR / "evaluator"))
+sys.path.append(str(ROOT_DIR / "benchmarks"))
+
+
+@pytest.fixture(scope="module")
+def evaluator():
+    import evaluator
+
+    logging.getLogger("Evaluator").setLevel(logging.WARNING)
+
+    return evaluator
+
+
+@pytest.fixture(scope="module")
+def params_list():
+    import bench_eval_context
+
+    rng = random.Random(1)
+
+    return [bench_eval_context.random_params(rng) for _ in range(12)]
+
+
+@pytest.fixture(scope="module")
+def baseline_scores(evaluator, params_list):
+    """Scores of the protocols run from the start, without a cap."""
+
+    eval_context = evaluator.EvalContext(isolate_protocols=False)
+
+    return [eval_context.evaluate(params) for params in params_list]
+
+
+def test_unisolated_scores(evaluator, params_list, baseline_scores):
+    # The workers run the protocols in their own process, instead of in a
+    # forked subprocess per protocol as bluepyopt does by default
+    eval_context = evaluator.EvalContext()
+    for params, scores in zip(params_list, baseline_scores):
+        assert eval_context.evaluate(params) == scores
+
+
+@pytest.mark.parametrize("early_stop_score", [30.0, 50.0])
+def test_capped_scores(
+    evaluator, params_list, baseline_scores, early_stop_score
+):
+    eval_context = evaluator.EvalContext(
+        isolate_protocols=False,
+        warm_start=True,
+        early_stop_score=early_stop_score,
+    )
+    n_below = 0
+    n_capped = 0
+    for params, scores in zip(params_list, baseline_scores):
+        capped_scores = eval_context.evaluate(params)
+        assert capped_scores.keys() == scores.keys()
+        for name, score in scores.items():
+            if score < early_stop_score:
+                assert capped_scores[name] == score
+                n_below += 1
+            else:
+                assert capped_scores[name] == early_stop_score
+                n_capped += 1
+
+    # The parameters give scores on both sides of the cap
+    assert n_below > 0 and n_capped > 0
+
+
+def get_spike_times(time, voltage, threshold=-20.0):
+    """Times at which voltage crosses threshold upwards, interpolated."""
+
+    indices = np.nonzero(
+        (voltage[:-1] < threshold) & (voltage[1:] >= threshold)
+    )[0]
+
+    return time[indices] + (threshold - voltage[indices]) * (
+        time[indices + 1] - time[indices]
+    ) / (voltage[indices + 1] - voltage[indices])
+
+
+def test_warm_start_traces(evaluator, params_list):
+    cold_context = evaluator.EvalContext(isolate_protocols=False)
+    warm_context = evaluator.EvalContext(
+        isolate_protocols=False, warm_start=True
+    )
+    n_spikes = 0
+    for params in params_list:
+        cold_responses = cold_context.cell_evaluator.run_protocols(
+            cold_context.cell_evaluator.fitness_protocols.values(), params
+        )
+        warm_responses, _ = warm_context.run_warm_protocols(params)
+
+        assert warm_responses.keys() == cold_responses.keys()
+        for name, cold_response in cold_responses.items():
+            cold_time = np.asarray(cold_response["time"])
+            cold_voltage = np.asarray(cold_response["voltage"])
+            warm_time = warm_responses[name]["time"]
+            warm_voltage = warm_responses[name]["voltage"]
+
+            # The shared resting prefix, up to the pulse at 100 ms, is the
+            # same simulation
+            cold_prefix = cold_time < 90.0
+            warm_prefix = warm_time < 90.0
+            assert np.allclose(
+                warm_time[warm_prefix],
+                cold_time[cold_prefix],
+                rtol=0,
+                atol=1e-9,
+            )
+            assert np.allclose(
+                warm_voltage[warm_prefix],
+                cold_voltage[cold_prefix],
+                rtol=0,
+                atol=1e-9,
+            )
+            # After it, CVode restarts at the restored state, which only
+            # shifts the steep spikes a little
+            differences = np.abs(
+                np.interp(cold_time, warm_time, warm_voltage) - cold_voltage
+            )
+            assert np.median(differences) < 1e-3
+            assert np.max(differences) < 5.0
+            cold_spike_times = get_spike_times(cold_time, cold_voltage)
+            warm_spike_times = get_spike_times(warm_time, warm_voltage)
+            assert len(warm_spike_times) == len(cold_spike_times)
+            assert np.allclose(
+                warm_spike_times, cold_spike_times, rtol=0, atol=0.05
+            )
+            n_spikes += len(cold_spike_times)
+
+    assert n_spikes > 0
+
+
+def test_batched_features(evaluator, params_list):
+    eval_context = evaluator.EvalContext(isolate_protocols=False)
+    responses_list = [
+        eval_context.cell_evaluator.run_protocols(
+            eval_context.cell_evaluator.fitness_protocols.values(), params
+        )
+        for params in params_list
+    ]
+    # Objectives without a response get the max_score
+    responses_list.append({**responses_list[0], "step2.soma.v": None})
+    responses_list.append({})
+    expected_scores = [
+        eval_context.score_calc.calculate_scores(responses)
+        for responses in responses_list
+    ]
+
+    # The trace buffers grow with the batches, then are reused
+    for batch_size in [1, 5, len(responses_list), 3]:
+        scores = []
+        for index in range(0, len(responses_list), batch_size):
+            scores.extend(
+                eval_context.feature_extractor.calculate_scores(
+                    responses_list[index : index + batch_size]
+                )
+            )
+        assert scores == expected_scores
+
+
+def test_worker_batch(evaluator, params_list, baseline_scores):
+    # As a process pool worker of an engine whose schema has one objective
+    evaluator.init_worker(objective_names=["step2.Spikecount"])
+    results = evaluator.run_worker_timed_batch(params_list[:3], record=True)
+
+    for (objs, duration, worker_record), scores in zip(
+        results, baseline_scores
+    ):
+        assert objs == {"step2.Spikecount": scores["step2.Spikecount"]}
+        assert duration > 0
+        assert worker_record[0] == os.getpid()
+        assert worker_record[3] == 3
+    # The phases of the batch are recorded once
+    assert results[0][2][2].times.keys() >= {"instantiate", "features"}
+    assert [worker_record[2] for _, _, worker_record in results[1:]] == [
+        None,
+        None,
+    ]
+
+    # A failing parameter set doesn't fail the others of its batch
+    results = evaluator.run_worker_timed_batch(
+        [params_list[0], {"unknown": 1.0}]
+    )
+    assert results[0][0] == {
+        "step2.Spikecount": baseline_scores[0]["step2.Spikecount"]
+    }
+    assert isinstance(results[1], RuntimeError)
@@ -0,0 +1,85 @@
+import sys
+import socket
+import inspect
+import pathlib
+import importlib.metadata
+
+import osparc_control as oc
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+import tools.events
+
+# Longer than the test takes, a wait only returns early when woken
+WAIT_TIMEOUT = 30.0  # seconds
+
+
+def get_new_port():
+    tmp_sock = socket.socket()
+    tmp_sock.bind(("", 0))
+    new_port = tmp_sock.getsockname()[1]
+    tmp_sock.close()
+
+    return new_port
+
+
+def test_private_hooks_of_pinned_version():
+    requirements = (ROOT_DIR / "requirements.txt").read_text().split()
+    assert (
+        f"osparc_control=={importlib.metadata.version('osparc_control')}"
+        in requirements
+    )
+
+    for name in tools.events.NotifyingTransmitter.PRIVATE_HOOKS:
+        hook = getattr(oc.PairedTransmitter, name)
+        override = getattr(tools.events.NotifyingTransmitter, name)
+        assert list(inspect.signature(hook).parameters) == list(
+            inspect.signature(override).parameters
+        )
+
+
+def test_messages_wake_waiters():
+    manifest = oc.CommandManifest(
+        action="echo",
+        description="reply with the params",
+        params=[oc.CommandParameter(name="value", description="value")],
+        command_type=oc.CommandType.WITH_DELAYED_REPLY,
+    )
+    caller_port = get_new_port()
+    remote_port = get_new_port()
+    caller_waiter = tools.events.EventWaiter(fallback_wait=WAIT_TIMEOUT)
+    remote_waiter = tools.events.EventWaiter(fallback_wait=WAIT_TIMEOUT)
+    caller = tools.events.NotifyingTransmitter(
+        remote_host="localhost",
+        exposed_commands=[],
+        remote_port=remote_port,
+        listen_port=caller_port,
+        waiter=caller_waiter,
+    )
+    remote = tools.events.NotifyingTransmitter(
+        remote_host="localhost",
+        exposed_commands=[manifest],
+        remote_port=caller_port,
+        listen_port=remote_port,
+        waiter=remote_waiter,
+    )
+    caller.start_background_sync()
+    remote.start_background_sync()
+
+    try:
+        request_id = caller.request_with_delayed_reply(
+            "echo", params={"value": 1}
+        )
+        assert remote_waiter.wait(timeout=WAIT_TIMEOUT)
+        (command,) = remote.get_incoming_requests()
+        remote.reply_to_command(
+            request_id=command.request_id, payload=command.params["value"]
+        )
+
+        assert caller_waiter.wait(timeout=WAIT_TIMEOUT)
+        assert caller.check_for_reply(request_id) == (True, 1)
+    finally:
+        caller.stop_background_sync()
+        remote.stop_background_sync()
+        caller_waiter.close()
+        remote_waiter.close()
@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import types
+import signal
+import socket
+import pathlib
+import threading
+
+import pytest
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(ROOT_DIR / "evaluator"))
+
+
+def run_stand_in_engine(name, on_workers_started=None):
+    """Stand-in for evaluator.main, which records where it ran and the
+    number of threads its workers would inherit."""
+
+    n_threads = threading.active_count()
+    if on_workers_started is not None:
+        on_workers_started()
+    pathlib.Path(os.environ["STAND_IN_ENGINE_OUTPUT"]).write_text(
+        f"{name} {os.getpid()} {os.getcwd()} {n_threads}"
+    )
+    sys.exit(int(os.environ.get("STAND_IN_ENGINE_EXIT", "0")))
+
+
+@pytest.fixture
+def forkserver(monkeypatch):
+    stand_in_evaluator = types.ModuleType("evaluator")
+    stand_in_evaluator.init_worker = lambda: None
+    stand_in_evaluator.main = run_stand_in_engine
+    monkeypatch.setitem(sys.modules, "evaluator", stand_in_evaluator)
+    import forkserver
+
+    return forkserver
+
+
+@pytest.fixture
+def server_socket_path(forkserver, tmp_path):
+    socket_path = tmp_path / "evaluator.sock"
+    pid = os.fork()
+    if pid == 0:
+        try:
+            forkserver.serve(str(socket_path))
+        finally:
+            os._exit(1)
+
+    end_time = time.time() + 10.0
+    while not socket_path.exists() and time.time() < end_time:
+        time.sleep(0.01)
+    yield socket_path
+    os.kill(pid, signal.SIGTERM)
+    os.waitpid(pid, 0)
+
+
+def test_engine_runs_in_process_without_server(
+    forkserver, tmp_path, monkeypatch
+):
+    output_path = tmp_path / "engine.txt"
+    monkeypatch.setenv("STAND_IN_ENGINE_OUTPUT", str(output_path))
+    monkeypatch.setenv(forkserver.FORKSERVER_ENV, str(tmp_path / "none.sock"))
+
+    with pytest.raises(SystemExit):
+        forkserver.run_engine("evaluator1")
+    name, pid, _, _ = output_path.read_text().split()
+    assert (name, int(pid)) == ("evaluator1", os.getpid())
+
+
+def test_engine_runs_in_server(
+    forkserver, server_socket_path, tmp_path, monkeypatch
+):
+    # Only the user of the server can connect
+    assert server_socket_path.stat().st_mode & 0o777 == 0o600
+
+    output_path = tmp_path / "engine.txt"
+    monkeypatch.setenv("STAND_IN_ENGINE_OUTPUT", str(output_path))
+    monkeypatch.setenv("STAND_IN_ENGINE_EXIT", "3")
+    monkeypatch.chdir(tmp_path)
+
+    exit_status = forkserver.run_in_fork_server(
+        str(server_socket_path), "evaluator1"
+    )
+    assert exit_status == 3
+    name, pid, cwd, n_threads = output_path.read_text().split()
+    assert name == "evaluator1" and int(pid) != os.getpid()
+    assert cwd == str(tmp_path)
+    # The workers are forked before the engine watches its launcher
+    assert n_threads == "1"
+
+
+def test_peer_uid(forkserver):
+    connection, other_connection = socket.socketpair(socket.AF_UNIX)
+    with connection, other_connection:
+        assert forkserver.get_peer_uid(connection) == os.getuid()
@@ -0,0 +1,727 @@
+import sys
+import json
+import math
+import heapq
+import random
+import types
+import pathlib
+import importlib.util
+import uuid
+
+import pytest
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(ROOT_DIR))
+
+import tools.control  # noqa: E402
+import tools.maps  # noqa: E402
+import tools.wire  # noqa: E402
+
+PARAM_NAMES = ["gnabar_hh", "gkbar_hh"]
+OBJECTIVE_NAMES = ["step1.Spikecount", "step2.Spikecount"]
+
+
+class VirtualClock:
+    def __init__(self):
+        """Constructor."""
+
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+
+class FakeEngineTransmitter:
+    """Runs eval_batch requests on a virtual clock, a hung engine never
+    replies and a failing one replies with failed scores. An untimed engine
+    replies without durations, an echoing one with the parameter values as
+    objectives. A packing engine uses the packed encoding."""
+
+    def __init__(self, clock, n_workers, slowness):
+        """Constructor."""
+
+        self.clock = clock
+        self.slowness = slowness
+        self.hung = False
+        self.failing = False
+        self.timed = True
+        self.echoing = False
+        self.packing = False
+        # Set from the connect command in tests that read it
+        self.objective_names = OBJECTIVE_NAMES
+        self.stopped = False
+        self.n_tasks = 0
+        self.batch_sizes = []
+        self.worker_free_times = [0.0] * n_workers
+        # request_id -> (finish time, results)
+        self.requests = {}
+
+    def request_with_delayed_reply(self, action, params):
+        results = []
+        finish_time = self.clock.now
+        tasks = params["tasks"]
+        if self.packing:
+            tasks = tools.wire.unpack_dicts(tasks)
+        self.batch_sizes.append(len(tasks))
+        for task_id, task_params in tasks:
+            self.n_tasks += 1
+            duration = (
+                self.slowness * 0.1 * math.exp(4.0 * task_params["gnabar_hh"])
+            )
+            start_time = max(
+                self.clock.now, heapq.heappop(self.worker_free_times)
+            )
+            heapq.heappush(self.worker_free_times, start_time + duration)
+            finish_time = max(finish_time, start_time + duration)
+            if self.echoing:
+                objs = dict(
+                    zip(
+                        self.objective_names,
+                        [task_params[name] for name in PARAM_NAMES],
+                    )
+                )
+            else:
+                objs = dict.fromkeys(
+                    self.objective_names, 250.0 if self.failing else 1.0
+                )
+            results.append(
+                {
+                    "task_id": task_id,
+                    "objs": objs,
+                    "duration": duration if self.timed else None,
+                    "failed": self.failing,
+                }
+            )
+
+        # Unique over all engines, as the ids of osparc_control
+        request_id = str(uuid.uuid4())
+        if self.hung:
+            finish_time = math.inf
+        if self.packing:
+            # The names are sorted, not in the order of the schema
+            results = tools.wire.pack_dicts(
+                [result["task_id"] for result in results],
+                [result["objs"] for result in results],
+                durations=[result["duration"] for result in results],
+                failed=[result["failed"] for result in results],
+            )
+        self.requests[request_id] = (finish_time, results)
+
+        return request_id
+
+    def check_for_reply(self, request_id):
+        finish_time, results = self.requests[request_id]
+        if finish_time > self.clock.now:
+            return False, None
+
+        self.requests.pop(request_id)
+
+        return True, results
+
+    def stop_background_sync(self):
+        self.stopped = True
+
+    def next_finish_time(self):
+        return min(
+            (finish_time for finish_time, _ in self.requests.values()),
+            default=math.inf,
+        )
+
+
+class FakeWaiter:
+    """Records whether the map woke itself up to run again."""
+
+    max_wait = math.inf
+
+    def __init__(self):
+        """Constructor."""
+
+        self.woken = False
+
+    def wake(self):
+        self.woken = True
+
+
+class FakeCallerTransmitter:
+    """Delivers the commands sent by a test to the map and keeps the
+    replies of the map."""
+
+    def __init__(self):
+        """Constructor."""
+
+        self.commands = []
+        # request_id -> list of payloads
+        self.replies = {}
+
+    def send(self, action, params=None):
+        request_id = str(uuid.uuid4())
+        self.commands.append(
+            types.SimpleNamespace(
+                action=action, params=params or {}, request_id=request_id
+            )
+        )
+
+        return request_id
+
+    def get_incoming_requests(self):
+        commands, self.commands = self.commands, []
+
+        return commands
+
+    def reply_to_command(self, request_id, payload):
+        self.replies.setdefault(request_id, []).append(payload)
+
+
+class BridgeTransmitter:
+    """Transmitter of a caller of the map that talks to its
+    FakeCallerTransmitter, a reply is waited for by running the map on the
+    virtual clock."""
+
+    def __init__(self, osparc_map, clock):
+        """Constructor."""
+
+        self.osparc_map = osparc_map
+        self.clock = clock
+        self.caller = osparc_map.caller_transmitter
+
+    def request_with_delayed_reply(self, action, params=None):
+        return self.caller.send(action, params)
+
+    def request_without_reply(self, action, params=None):
+        self.caller.send(action, params)
+
+    def check_for_reply(self, request_id):
+        if not run_until(
+            self.osparc_map,
+            self.clock,
+            lambda: request_id in self.caller.replies,
+        ):
+            return False, None
+
+        return True, self.caller.replies.pop(request_id)[0]
+
+    def stop_background_sync(self):
+        pass
+
+
+@pytest.fixture
+def map_main(tmp_path, monkeypatch):
+    monkeypatch.setenv("DY_SIDECAR_PATH_INPUTS", str(tmp_path))
+    monkeypatch.setenv("DY_SIDECAR_PATH_OUTPUTS", str(tmp_path))
+    monkeypatch.setenv("OSPARC_MAP_CACHE_SIZE", "0")
+    monkeypatch.setenv("OSPARC_MAP_STORE_FILE", "")
+
+    spec = importlib.util.spec_from_file_location(
+        "map_main", ROOT_DIR / "map" / "main.py"
+    )
+    map_main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(map_main)
+
+    return map_main
+
+
+def create_map(map_main, clock, engines):
+    """Map connected to fake engines of (n_workers, slowness)."""
+
+    map_main.time = types.SimpleNamespace(time=clock.time)
+    osparc_map = map_main.oSparcMap()
+    osparc_map.waiter = FakeWaiter()
+    for engine_index, (n_workers, slowness) in enumerate(engines):
+        add_engine(
+            osparc_map, clock, f"engine-{engine_index}", n_workers, slowness
+        )
+
+    return osparc_map
+
+
+def add_engine(osparc_map, clock, engine_id, n_workers, slowness):
+    """Connect a fake engine as register_engine does."""
+
+    osparc_map.engine_ids.append(engine_id)
+    osparc_map.engine_transmitters[engine_id] = FakeEngineTransmitter(
+        clock, n_workers, slowness
+    )
+    osparc_map.engine_request_ids[engine_id] = {}
+    osparc_map.engine_n_workers[engine_id] = n_workers
+    osparc_map.engine_model_ids[engine_id] = None
+    osparc_map.engine_encodings[engine_id] = "lists"
+    osparc_map.engine_tracing[engine_id] = False
+
+
+def watch_engine_files(osparc_map, clock, slownesses):
+    """Let engines register through their engine files, with fake
+    transmitters of the slowness of their id."""
+
+    osparc_map.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def start_engine_transmitter(engine_id, remote_host, remote_port):
+        osparc_map.engine_transmitters[engine_id] = FakeEngineTransmitter(
+            clock,
+            osparc_map.engine_n_workers[engine_id],
+            slownesses[engine_id],
+        )
+        osparc_map.engine_listen_ports[engine_id] = remote_port
+
+    osparc_map.start_engine_transmitter = start_engine_transmitter
+
+
+def write_engine_file(input_dir, engine_id, status, n_workers=1):
+    input_dir.mkdir(exist_ok=True)
+    engine_info = {
+        "id": engine_id,
+        "status": status,
+        "payload": {
+            "engine_host": "localhost",
+            "engine_port": 0,
+            "n_workers": n_workers,
+        },
+    }
+    (input_dir / "engine.json").write_text(json.dumps(engine_info))
+
+
+def connect_caller(osparc_map):
+    """Connect a fake caller, return its transmitter."""
+
+    osparc_map.map_listen_port = None
+    osparc_map.start_transmitter = lambda *args, **kwargs: (
+        FakeCallerTransmitter()
+    )
+    osparc_map.start_caller_transmitter("localhost", None)
+
+    return osparc_map.caller_transmitter
+
+
+def run_generation(osparc_map, clock, param_rows, max_time=100.0):
+    """Run a generation on the virtual clock, return whether it finished
+    before max_time."""
+
+    osparc_map.populate_tasklist(list(enumerate(param_rows)))
+
+    return run_until(
+        osparc_map, clock, osparc_map.task_table.is_done, max_time=max_time
+    )
+
+
+def run_until(osparc_map, clock, is_done, max_time=100.0):
+    """Run the map on the virtual clock until is_done returns True, return
+    whether it did before max_time."""
+
+    end_time = clock.now + max_time
+    while clock.now < end_time:
+        osparc_map.check_engine_transmitters()
+        osparc_map.check_caller_transmitter()
+        if is_done():
+            return True
+        if osparc_map.waiter.woken:
+            osparc_map.waiter.woken = False
+            continue
+
+        wait_timeout = osparc_map.get_wait_timeout()
+        next_time = min(
+            transmitter.next_finish_time()
+            for transmitter in osparc_map.engine_transmitters.values()
+        )
+        if wait_timeout is not None:
+            next_time = min(next_time, clock.now + max(wait_timeout, 0.0))
+        if next_time == math.inf:
+            return False
+        # Past deadlines are only seen once the clock moves
+        clock.now = max(next_time, clock.now + 1e-3)
+
+    return False
+
+
+def test_hung_fast_engine_doesnt_stall_generation(map_main):
+    clock = VirtualClock()
+    osparc_map = create_map(map_main, clock, [(1, 1.0), (1, 3.0)])
+    param_rows = [[0.1, 0.02]] * 4
+    for _ in range(5):
+        assert run_generation(osparc_map, clock, param_rows)
+
+    osparc_map.engine_transmitters["engine-0"].hung = True
+    assert run_generation(osparc_map, clock, param_rows)
+    assert osparc_map.straggler_monitor.n_speculative_wins > 0
+
+
+@pytest.mark.parametrize("leave", ["deleted", "stopped", "restarted"])
+def test_engine_leaving_requeues_its_tasks(map_main, tmp_path, leave):
+    clock = VirtualClock()
+    osparc_map = create_map(map_main, clock, [])
+    watch_engine_files(
+        osparc_map, clock, {"engine-a": 1.0, "engine-b": 1.0, "engine-c": 1.0}
+    )
+    input_dirs = [tmp_path / "input_3", tmp_path / "input_4"]
+    for input_dir, engine_id in zip(input_dirs, ["engine-a", "engine-b"]):
+        write_engine_file(input_dir, engine_id, "connecting", n_workers=2)
+        osparc_map.check_engine_file(input_dir)
+    assert osparc_map.engine_ids == ["engine-a", "engine-b"]
+    transmitter = osparc_map.engine_transmitters["engine-a"]
+
+    param_rows = [[0.1, 0.02]] * 20
+    osparc_map.populate_tasklist(list(enumerate(param_rows)))
+    osparc_map.check_engine_transmitters()
+    n_ready = osparc_map.task_table.n_ready()
+    n_running = osparc_map.task_table.n_running("engine-a")
+    assert n_running > 0
+
+    if leave == "deleted":
+        (input_dirs[0] / "engine.json").unlink()
+    elif leave == "stopped":
+        write_engine_file(input_dirs[0], "engine-a", "stopped")
+    else:
+        # A restarted engine registers with a new id
+        write_engine_file(input_dirs[0], "engine-c", "connecting")
+    osparc_map.check_engine_file(input_dirs[0])
+
+    assert osparc_map.engine_ids == (
+        ["engine-b", "engine-c"] if leave == "restarted" else ["engine-b"]
+    )
+    assert "engine-a" not in osparc_map.engine_request_ids
+    assert transmitter.stopped
+    assert not tools.control.get_control_file_path(
+        osparc_map.output_dir, "engine-a"
+    ).exists()
+    # The tasks it had in flight are the next to run
+    assert osparc_map.task_table.n_ready() == n_ready + n_running
+    assert run_until(osparc_map, clock, osparc_map.task_table.is_done)
+    assert osparc_map.result_table.get_objs() == [
+        [1.0] * len(OBJECTIVE_NAMES)
+    ] * len(param_rows)
+
+
+def test_engine_joining_takes_tasks(map_main, tmp_path):
+    clock = VirtualClock()
+    osparc_map = create_map(map_main, clock, [])
+    watch_engine_files(osparc_map, clock, {"engine-a": 5.0, "engine-b": 1.0})
+    input_dirs = [tmp_path / "input_3", tmp_path / "input_4"]
+    write_engine_file(input_dirs[0], "engine-a", "connecting")
+    osparc_map.check_engine_file(input_dirs[0])
+
+    param_rows = [[0.1, 0.02]] * 20
+    osparc_map.populate_tasklist(list(enumerate(param_rows)))
+    assert run_until(
+        osparc_map, clock, lambda: osparc_map.task_table.n_finished() >= 2
+    )
+
+    write_engine_file(input_dirs[1], "engine-b", "connecting", n_workers=2)
+    osparc_map.check_engine_file(input_dirs[1])
+    assert osparc_map.engine_ids == ["engine-a", "engine-b"]
+    control_dict = json.loads(
+        tools.control.get_control_file_path(
+            osparc_map.output_dir, "engine-b"
+        ).read_text()
+    )
+    assert control_dict["task"]["command"] == "connect"
+
+    assert run_until(osparc_map, clock, osparc_map.task_table.is_done)
+    assert osparc_map.engine_transmitters["engine-b"].n_tasks > 0
+    assert osparc_map.result_table.get_objs() == [
+        [1.0] * len(OBJECTIVE_NAMES)
+    ] * len(param_rows)
+
+
+# Evaluation times 0.33, 0.1, 0.22 and 0.15 s, which finish in the order
+# of the task ids 1, 3, 2 and 0 on an engine with a worker per task
+STREAM_ROWS = [[0.3, 0.02], [0.0, 0.02], [0.2, 0.02], [0.1, 0.02]]
+
+
+def test_stream_results_in_completion_order(map_main):
+    clock = VirtualClock()
+    osparc_map = create_map(map_main, clock, [(4, 1.0)])
+    osparc_map.engine_transmitters["engine-0"].echoing = True
+    caller = connect_caller(osparc_map)
+
+    stream_id = caller.send(
+        "map_stream", {"params_list": list(enumerate(STREAM_ROWS))}
+    )
+    # A poll is answered as soon as a task finished, with the results that
+    # are new since the last poll
+    for task_id, finish_time in [(1, 0.1), (3, 0.1 * math.exp(0.4))]:
+        poll_id = caller.send("map_poll")
+        assert run_until(osparc_map, clock, lambda: poll_id in caller.replies)
+        assert clock.now == pytest.approx(finish_time)
+        assert caller.replies[poll_id] == [
+            {
+                "results": [(task_id, STREAM_ROWS[task_id])],
+                "done": False,
+                "n_workers": 4,
+            }
+        ]
+
+    # The next poll gets the rest
+    assert run_until(osparc_map, clock, osparc_map.task_table.is_done)
+    poll_id = caller.send("map_poll")
+    osparc_map.check_caller_transmitter()
+    assert caller.replies[poll_id] == [
+        {
+            "results": [(2, STREAM_ROWS[2]), (0, STREAM_ROWS[0])],
+            "done": True,
+            "n_workers": 4,
+        }
+    ]
+    assert stream_id not in caller.replies
+    assert not osparc_map.streaming
+
+
+def test_caller_streams_in_completion_order(map_main, tmp_path, monkeypatch):
+    clock = VirtualClock()
+    osparc_map = create_map(map_main, clock, [(4, 1.0)])
+    osparc_map.engine_transmitters["engine-0"].echoing = True
+    connect_caller(osparc_map)
+    map_file_path = tmp_path / "map.json"
+    map_file_path.write_text(
+        json.dumps(
+            {
+                "status": "connecting",
+                "payload": {"map_host": "localhost", "map_port": 0},
+            }
+        )
+    )
+    monkeypatch.setattr(
+        tools.maps.oSparcFileMap,
+        "start_transmitter",
+        lambda *args: BridgeTransmitter(osparc_map, clock),
+    )
+    caller = tools.maps.oSparcFileMap(map_file_path, tmp_path / "caller.json")
+
+    assert list(caller.evaluate_iter(STREAM_ROWS)) == [
+        (task_id, STREAM_ROWS[task_id]) for task_id in [1, 3, 2, 0]
+    ]
+
+    # Tasks submitted while others run join the stream
+    caller.submit(list(enumerate(STREAM_ROWS)))
+    assert caller.poll() == ([(1, STREAM_ROWS[1])], False)
+    caller.submit([(4, [0.0, 0.02])])
+    results = []
+    done = False
+    while not done:
+        new_results, done = caller.poll()
+        assert len(new_results) != 0
+        results.extend(new_results)
+    assert [task_id for task_id, _ in results] == [3, 4, 2, 0]
+    assert caller.n_workers == 4
+
+
+def test_engines_get_objectives_of_schema(map_main, tmp_path):
+    clock = VirtualClock()
+    osparc_map = create_map(map_main, clock, [])
+    watch_engine_files(osparc_map, clock, {"engine-a": 1.0, "engine-b": 1.0})
+    osparc_map.map_listen_port = None
+    osparc_map.start_transmitter = lambda *args, **kwargs: (
+        FakeCallerTransmitter()
+    )
+    objective_names = ["step1.Spikecount", "step1.AP_height", "step2.ISI_CV"]
+
+    def get_connect_payload(engine_id):
+        control_dict = json.loads(
+            tools.control.get_control_file_path(
+                osparc_map.output_dir, engine_id
+            ).read_text()
+        )
+        assert control_dict["task"]["command"] == "connect"
+        return control_dict["task"]["payload"]
+
+    # An engine that connects before the caller is connected again with
+    # the objectives of its schema, later engines get them right away
+    write_engine_file(tmp_path / "input_3", "engine-a", "connecting")
+    osparc_map.check_engine_file(tmp_path / "input_3")
+    assert (
+        get_connect_payload("engine-a")["objective_names"] == OBJECTIVE_NAMES
+    )
+    osparc_map.caller_file_path.parent.mkdir(parents=True, exist_ok=True)
+    tools.control.write_json_atomic(
+        osparc_map.caller_file_path,
+        {
+            "command": "connect",
+            "payload": {
+                "caller_host": "localhost",
+                "caller_port": 0,
+                "schema": {
+                    "param_names": ["gnabar_hh", "gkbar_hh"],
+                    "objective_names": objective_names,
+                },
+            },
+        },
+    )
+    osparc_map.check_caller_file()
+    write_engine_file(tmp_path / "input_4", "engine-b", "connecting")
+    osparc_map.check_engine_file(tmp_path / "input_4")
+
+    for engine_id in ["engine-a", "engine-b"]:
+        payload = get_connect_payload(engine_id)
+        assert payload["objective_names"] == objective_names
+        transmitter = osparc_map.engine_transmitters[engine_id]
+        transmitter.objective_names = payload["objective_names"]
+    param_rows = [[0.1, 0.02]] * 4
+    assert run_generation(osparc_map, clock, param_rows)
+    assert osparc_map.result_table.get_objs() == [
+        [1.0] * len(objective_names)
+    ] * len(param_rows)
+
+
+def test_slow_engine_isnt_blacklisted(map_main):
+    clock = VirtualClock()
+    osparc_map = create_map(map_main, clock, [(2, 1.0), (2, 3.0)])
+    # Evaluation times that vary 50-fold with the parameters
+    rng = random.Random(1)
+    for generation in range(10):
+        # Until the cost model is fitted, requests can be late
+        if generation == 3:
+            n_speculated_tasks = (
+                osparc_map.straggler_monitor.n_speculated_tasks
+            )
+        assert run_generation(
+            osparc_map, clock, [[rng.random(), 0.02] for _ in range(8)]
+        )
+
+    assert osparc_map.blacklisted_engines == set()
+    assert (
+        osparc_map.straggler_monitor.n_speculated_tasks == n_speculated_tasks
+    )
+
+
+def test_batch_size(map_main):
+    clock = VirtualClock()
+    osparc_map = create_map(map_main, clock, [(2, 1.0), (2, 1.0)])
+    osparc_map.populate_tasklist(list(enumerate([[0.1, 0.02]] * 1200)))
+    # A single task until the throughput of the engine is known
+    assert osparc_map.get_batch_size("engine-0") == 1
+
+    # batch_duration seconds of work for one worker
+    osparc_map.engine_throughputs["engine-0"] = 5.0
+    assert osparc_map.get_batch_size("engine-0") == 10
+    osparc_map.engine_throughputs["engine-0"] = 1000.0
+    assert osparc_map.get_batch_size("engine-0") == map_main.MAX_BATCH_SIZE
+
+    # Not more than an equal share of the ready tasks per worker
+    osparc_map.task_table.pop_ready(1100)
+    assert osparc_map.get_batch_size("engine-0") == 25
+    osparc_map.task_table.pop_ready(97)
+    assert osparc_map.get_batch_size("engine-0") == 1
+
+
+@pytest.mark.parametrize("encoding", ["lists", "packed"])
+def test_batched_results_reassembled(map_main, encoding):
+    clock = VirtualClock()
+    osparc_map = create_map(map_main, clock, [(2, 1.0), (2, 2.0)])
+    # Without evaluation time samples the batches are sized by their
+    # number of tasks
+    for engine_id, transmitter in osparc_map.engine_transmitters.items():
+        transmitter.timed = False
+        transmitter.echoing = True
+        transmitter.packing = encoding == "packed"
+        osparc_map.engine_encodings[engine_id] = encoding
+    param_rows = [[index / 100, 0.02] for index in range(60)]
+    assert run_generation(osparc_map, clock, param_rows)
+
+    for transmitter in osparc_map.engine_transmitters.values():
+        assert transmitter.batch_sizes[0] == 1
+    batch_sizes = [
+        batch_size
+        for transmitter in osparc_map.engine_transmitters.values()
+        for batch_size in transmitter.batch_sizes
+    ]
+    assert max(batch_sizes) > 1
+    assert sum(batch_sizes) >= len(param_rows)
+    # Each row gets the results of its own parameters
+    assert osparc_map.result_table.get_objs() == param_rows
+
+
+def test_stored_results_of_model_replayed(map_main, tmp_path, monkeypatch):
+    monkeypatch.setenv(
+        "OSPARC_MAP_STORE_FILE", str(tmp_path / "evaluations.sqlite")
+    )
+    clock = VirtualClock()
+    param_rows = [[0.1, 0.02]] * 4
+    # (model id, whether the stored results are replayed)
+    for model_id, replayed in [
+        (None, False),
+        ("model-a", False),
+        ("model-a", True),
+        ("model-b", False),
+        (None, False),
+    ]:
+        osparc_map = create_map(map_main, clock, [(1, 1.0)])
+        if model_id is not None:
+            osparc_map.register_model_id("engine-0", model_id)
+        assert run_generation(osparc_map, clock, param_rows)
+        n_tasks = osparc_map.engine_transmitters["engine-0"].n_tasks
+        assert n_tasks == (0 if replayed else len(param_rows))
+        osparc_map.evaluation_store.close()
+
+
+def test_store_is_opt_in(map_main, tmp_path, monkeypatch):
+    monkeypatch.delenv("OSPARC_MAP_STORE_FILE")
+    clock = VirtualClock()
+    osparc_map = create_map(map_main, clock, [(1, 1.0)])
+    assert run_generation(osparc_map, clock, [[0.1, 0.02]] * 2)
+
+    assert osparc_map.evaluation_store is None
+    assert list(tmp_path.rglob("*.sqlite")) == []
+
+
+def test_request_before_engine_registers_replayed(
+    map_main, tmp_path, monkeypatch
+):
+    monkeypatch.setenv(
+        "OSPARC_MAP_STORE_FILE", str(tmp_path / "evaluations.sqlite")
+    )
+    clock = VirtualClock()
+    params_list = list(enumerate([[0.1, 0.02]] * 3))
+    # The map is restarted and the caller repeats its request, which
+    # arrives before the engine registers
+    for replayed in [False, True]:
+        osparc_map = create_map(map_main, clock, [])
+        caller = connect_caller(osparc_map)
+        request_id = caller.send("map", {"params_list": params_list})
+        osparc_map.check_caller_transmitter()
+        # Held until there is a model to key the stored results on
+        assert len(osparc_map.task_table.tasks) == 0
+
+        add_engine(osparc_map, clock, "engine-0", 1, 1.0)
+        osparc_map.register_model_id("engine-0", "model-a")
+        assert run_until(
+            osparc_map, clock, lambda: request_id in caller.replies
+        )
+        assert caller.replies[request_id] == [
+            [[1.0] * len(OBJECTIVE_NAMES)] * len(params_list)
+        ]
+        n_tasks = osparc_map.engine_transmitters["engine-0"].n_tasks
+        assert n_tasks == (0 if replayed else len(params_list))
+        osparc_map.evaluation_store.close()
+
+
+def test_failed_tasks_not_cached_stored_or_replayed(
+    map_main, tmp_path, monkeypatch
+):
+    monkeypatch.setenv(
+        "OSPARC_MAP_STORE_FILE", str(tmp_path / "evaluations.sqlite")
+    )
+    monkeypatch.setenv("OSPARC_MAP_CACHE_SIZE", "100")
+    monkeypatch.setenv("OSPARC_MAP_CACHE_FILE", str(tmp_path / "cache.jsonl"))
+    monkeypatch.setenv("OSPARC_MAP_PRESCREEN", "1")
+    clock = VirtualClock()
+    param_rows = [[0.1, 0.02], [0.2, 0.02]]
+    # (engine fails, evaluated tasks, samples of the pre-screen), the map
+    # is restarted for every request and its pre-screen learns from the
+    # replayed results
+    for failing, n_evaluated, n_samples in [
+        (True, 2, 0),
+        (False, 2, 2),
+        (False, 0, 2),
+    ]:
+        osparc_map = create_map(map_main, clock, [(1, 1.0)])
+        osparc_map.register_model_id("engine-0", "model-a")
+        transmitter = osparc_map.engine_transmitters["engine-0"]
+        transmitter.failing = failing
+        assert run_generation(osparc_map, clock, param_rows)
+        assert transmitter.n_tasks == n_evaluated
+        assert len(osparc_map.prescreen.samples) == n_samples
+        # The caller gets the failed scores
+        assert osparc_map.result_table.get_objs() == [
+            [250.0 if failing else 1.0] * len(OBJECTIVE_NAMES)
+        ] * len(param_rows)
+        assert osparc_map.result_cache.stats()["size"] == (
+            0 if failing else len(param_rows)
+        )
+        osparc_map.evaluation_store.close()
@@ -0,0 +1,64 @@
+import sys
+import pathlib
+import urllib.request
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+import tools.metrics
+
+
+def test_disabled_metrics():
+    metrics = tools.metrics.Metrics("map")
+    assert not metrics.enabled
+    assert metrics.counter("tasks_total", "Tasks") is tools.metrics.NULL_METRIC
+    metrics.export()
+    metrics.close()
+
+
+def test_metrics_export(tmp_path):
+    file_path = tmp_path / "map.prom"
+    metrics = tools.metrics.Metrics("map", file_path=file_path, port=0)
+    counter = metrics.counter("idle_seconds_total", "Idle time")
+    histogram = metrics.histogram("wait_seconds", "Wait", buckets=[0.1, 1.0])
+    counter.inc(2.0, engine="a")
+    counter.inc(engine="a")
+    histogram.observe(0.5)
+    histogram.observe(5.0)
+
+    expected_lines = [
+        "# TYPE osparc_map_idle_seconds_total counter",
+        'osparc_map_idle_seconds_total{engine="a"} 3.0',
+        "# TYPE osparc_map_wait_seconds histogram",
+        'osparc_map_wait_seconds_bucket{le="0.1"} 0',
+        'osparc_map_wait_seconds_bucket{le="1.0"} 1',
+        'osparc_map_wait_seconds_bucket{le="+Inf"} 2',
+        "osparc_map_wait_seconds_sum 5.5",
+        "osparc_map_wait_seconds_count 2",
+    ]
+
+    metrics.start()
+    port = metrics.server.server_address[1]
+    with urllib.request.urlopen(f"http://localhost:{port}/metrics") as reply:
+        served_lines = reply.read().decode().splitlines()
+    metrics.close()
+
+    for lines in [served_lines, file_path.read_text().splitlines()]:
+        assert all(line in lines for line in expected_lines)
+
+
+def test_metrics_port_taken(tmp_path):
+    metrics = tools.metrics.Metrics("map", port=0)
+    metrics.start()
+    port = metrics.server.server_address[1]
+
+    # Another process on the host with the same OSPARC_METRICS_PORT
+    file_path = tmp_path / "engine.prom"
+    other_metrics = tools.metrics.Metrics(
+        "engine", file_path=file_path, port=port
+    )
+    other_metrics.counter("tasks_total", "Tasks").inc()
+    other_metrics.start()
+    assert other_metrics.server is None
+    other_metrics.close()
+    metrics.close()
+
+    assert "osparc_engine_tasks_total 1.0" in file_path.read_text()
@@ -0,0 +1,84 @@
+import sys
+import json
+import time
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+import tools.profiling
+
+
+def test_nested_phases():
+    timer = tools.profiling.PhaseTimer()
+    with timer.phase("instantiate"):
+        time.sleep(0.01)
+        with timer.phase("simulate"):
+            time.sleep(0.02)
+
+    assert [name for name, _, _ in timer.spans] == ["simulate", "instantiate"]
+    # The time of a phase excludes the phases nested in it
+    assert 0.01 <= timer.times["instantiate"][0] < 0.02
+    assert timer.times["simulate"][0] >= 0.02
+    _, start, end = timer.spans[1]
+    assert end - start >= 0.03
+
+
+def test_profiler_export(tmp_path):
+    profiler = tools.profiling.Profiler(
+        "engine", "a", profile_dir=tmp_path, profile_every=2
+    )
+    assert [profiler.get_profile_path() for _ in range(3)] == [
+        str(tmp_path / "engine_a_1.prof"),
+        None,
+        str(tmp_path / "engine_a_3.prof"),
+    ]
+
+    profiler.add_evaluation(1.0, {"simulate": [0.5, 0.4]})
+    profiler.add_evaluation(2.0, {"simulate": [1.5, 1.0]})
+    profiler.close()
+
+    stats = json.loads((tmp_path / "engine_a.profile.json").read_text())
+    assert stats["evaluations"] == 2
+    assert stats["evaluation_seconds"] == 3.0
+    assert stats["phases"]["simulate"] == {
+        "count": 2,
+        "wall_seconds": 2.0,
+        "cpu_seconds": 1.4,
+        "mean_wall_seconds": 1.0,
+        "max_wall_seconds": 1.5,
+    }
+
+
+def test_profiler_batches(tmp_path):
+    profiler = tools.profiling.Profiler(
+        "engine", "a", profile_dir=tmp_path, profile_every=3
+    )
+    # Batches of the evaluations 1-2, 3-4, 5-6 and 7-9
+    assert [profiler.get_profile_path(n) for n in [2, 2, 2, 3]] == [
+        str(tmp_path / "engine_a_1.prof"),
+        str(tmp_path / "engine_a_4.prof"),
+        None,
+        str(tmp_path / "engine_a_7.prof"),
+    ]
+
+    # The phases of a batch come with one of its evaluations
+    profiler.add_evaluation(1.0, {"simulate": [2.0, 1.6]}, batch_size=2)
+    profiler.add_evaluation(1.0, {})
+    profiler.add_evaluation(1.0, {"simulate": [0.5, 0.4]})
+    stats = profiler.get_stats()
+    assert stats["evaluations"] == 3
+    assert stats["phases"]["simulate"] == {
+        "count": 3,
+        "wall_seconds": 2.5,
+        "cpu_seconds": 2.0,
+        "mean_wall_seconds": 2.5 / 3,
+        "max_wall_seconds": 1.0,
+    }
+
+
+def test_disabled_profiler():
+    profiler = tools.profiling.Profiler("engine", "a")
+    assert not profiler.enabled
+    assert profiler.get_profile_path() is None
+    with tools.profiling.NULL_TIMER.phase("simulate"):
+        pass
+    profiler.close()
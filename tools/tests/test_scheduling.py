@@ -0,0 +1,38 @@
+import sys
+import random
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+import tools.scheduling
+
+
+def test_cost_model():
+    cost_model = tools.scheduling.CostModel(min_param_samples=10)
+    assert cost_model.predict([[0.1], [0.2]]).tolist() == [1.0, 1.0]
+    assert cost_model.get_slowness("fast") == 1.0
+
+    # Evaluations take longer with the parameter, the slow engine takes
+    # twice as long
+    rng = random.Random(1)
+    for engine_id, slowness in [("fast", 1.0), ("slow", 2.0)]:
+        param_rows = [[rng.random()] for _ in range(20)]
+        cost_model.add_samples(
+            engine_id,
+            param_rows,
+            [slowness * (1.0 + 4.0 * row[0]) for row in param_rows],
+        )
+
+    short_cost, long_cost = cost_model.predict([[0.0], [1.0]]).tolist()
+    assert 0.5 < short_cost < 1.5 < 3.5 < long_cost < 6.5
+    assert 1.8 < cost_model.get_slowness("slow") < 2.2
+    assert cost_model.get_slowness("fast") == 1.0
+
+
+def test_plan_tasks():
+    # The long task goes to the engine that is 4 times as fast, the short
+    # ones to the slow engine until waiting for the fast one is quicker
+    engine_indices, end_time = tools.scheduling.plan_tasks(
+        [4.0, 1.0, 1.0, 1.0], [0.0, 0.0], [1.0, 4.0], [1, 1]
+    )
+    assert engine_indices == [0, 1, 0, 0]
+    assert end_time == 6.0
@@ -0,0 +1,34 @@
+import sys
+import math
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+import tools.schema
+
+
+def test_result_table_grows_in_request_order():
+    schema = tools.schema.Schema(param_names=["a"], objective_names=["f"])
+    assert schema.get_params([0.5]) == {"a": 0.5}
+
+    table = tools.schema.ResultTable(schema.objective_names)
+    first_row = table.add_rows(list(range(10)))
+    for row in reversed(range(first_row, first_row + 10)):
+        table.set_result(row, {"f": row, "other": -1})
+
+    # Appended rows keep the existing values when the table grows
+    assert table.add_rows(list(range(100, 200))) == 10
+    table.set_result(109, {"f": 109})
+    table.set_objs(108, [108.5])
+
+    objs = table.get_objs()
+    assert len(objs) == 110
+    assert objs[:10] == [[row] for row in range(10)]
+    assert objs[108:] == [[108.5], [109.0]]
+    # Rows without a result are NaN
+    assert math.isnan(objs[100][0])
+    assert table.get_objs([3, 1]) == [[3.0], [1.0]]
+    task_ids, objs = table.get_arrays([0, 109])
+    assert task_ids.tolist() == [0, 199]
+    assert objs.tolist() == [[0.0], [109.0]]
+    task_ids, objs = table.get_arrays([])
+    assert len(task_ids) == 0 and objs.shape == (0, 1)
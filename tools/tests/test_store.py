@@ -0,0 +1,26 @@
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+import tools.store
+import tools.tasks
+
+
+def test_replay_after_reopen(tmp_path):
+    params_list = [(0, [0.1, 0.2]), (1, [0.3, 0.4])]
+    request_key = tools.store.get_request_key(params_list, "model")
+    assert request_key != tools.store.get_request_key(params_list[:1], "model")
+    assert request_key != tools.store.get_request_key(params_list, "other")
+
+    store = tools.store.EvaluationStore(tmp_path / "evaluations.sqlite")
+    task = tools.tasks.Task(1, {"a": 0.3})
+    task.result = {"obj": 2.0}
+    store.add_results(request_key, [task])
+    # Results are append-only, a duplicate is ignored
+    task.result = {"obj": 3.0}
+    store.add_results(request_key, [task])
+    store.close()
+
+    store = tools.store.EvaluationStore(tmp_path / "evaluations.sqlite")
+    assert store.get_results(request_key) == {1: {"obj": 2.0}}
+    assert store.get_results("other_request") == {}
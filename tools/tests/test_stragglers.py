@@ -0,0 +1,56 @@
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+import tools.stragglers
+
+
+def test_deadline_and_blacklist():
+    monitor = tools.stragglers.StragglerMonitor(
+        percentile=50,
+        min_samples=3,
+        factor=2.0,
+        min_deadline=0.5,
+        max_misses=2,
+    )
+    monitor.add_request_time("engine", 1, 1.0)
+    monitor.add_request_time("engine", 2, 4.0)
+    assert monitor.get_deadline(100.0, 1, "engine") is None
+
+    monitor.add_request_time("engine", 1, 3.0)
+    # Median of the per-task times [1.0, 2.0, 3.0]
+    assert monitor.get_deadline(100.0, 3, "engine") == 112.0
+    assert monitor.get_deadline(100.0, 0, "engine") == 100.5
+
+    assert not monitor.add_miss("engine")
+    assert monitor.add_miss("engine")
+
+
+def test_deadline_of_engine():
+    monitor = tools.stragglers.StragglerMonitor(
+        percentile=50, min_samples=3, factor=2.0, min_deadline=0.5
+    )
+    for elapsed in [1.0, 1.0, 1.0]:
+        monitor.add_request_time("fast", 1, elapsed)
+    for elapsed in [3.0, 3.0]:
+        monitor.add_request_time("slow", 1, elapsed)
+
+    # Until it has enough samples, an engine gets the deadline of all
+    assert monitor.get_deadline(100.0, 1, "slow") == 102.0
+    monitor.add_request_time("slow", 1, 3.0)
+    assert monitor.get_deadline(100.0, 1, "slow") == 106.0
+    assert monitor.get_deadline(100.0, 1, "fast") == 102.0
+    # A predicted time replaces the per-task times
+    assert monitor.get_deadline(100.0, 1, "fast", expected_time=5.0) == 110.0
+
+
+def test_misses_in_a_row_and_probation():
+    monitor = tools.stragglers.StragglerMonitor(max_misses=2)
+    assert not monitor.add_miss("engine")
+    monitor.add_on_time("engine")
+    assert not monitor.add_miss("engine")
+    assert monitor.add_miss("engine")
+
+    monitor.set_probation("engine")
+    assert monitor.add_miss("engine")
+    assert monitor.stats()["engine_misses"] == {"engine": 4}
@@ -0,0 +1,64 @@
+import sys
+import pathlib
+
+import numpy as np
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+import tools.surrogate
+
+
+def get_objs(param_rows):
+    """Two objectives, minimal at the origin."""
+
+    param_rows = np.asarray(param_rows)
+
+    return np.stack(
+        [
+            np.sum(param_rows**2, axis=1),
+            np.sum((param_rows - 0.2) ** 2, axis=1),
+        ],
+        axis=1,
+    )
+
+
+def test_gaussian_process_fits_smooth_function():
+    rng = np.random.default_rng(1)
+    param_rows = rng.uniform(-1, 1, size=(60, 2))
+    model = tools.surrogate.GaussianProcess()
+    model.fit(param_rows, get_objs(param_rows))
+
+    test_rows = rng.uniform(-0.8, 0.8, size=(20, 2))
+    means, stds = model.predict(test_rows)
+    assert np.max(np.abs(means - get_objs(test_rows))) < 0.05
+    assert np.all(stds < 0.1)
+    _, far_stds = model.predict([[5.0, 5.0]])
+    assert np.all(far_stds > stds.max())
+
+
+def test_nothing_screened_before_min_samples():
+    rng = np.random.default_rng(2)
+    prescreen = tools.surrogate.PreScreen(min_samples=30)
+    param_rows = rng.uniform(-1, 1, size=(29, 2))
+    prescreen.add_samples(param_rows, get_objs(param_rows))
+    # Failed evaluations aren't samples
+    prescreen.add_samples([[0.0, 0.0]], [[np.nan, 1.0]])
+
+    screened, means = prescreen.screen([[1.0, 1.0]])
+    assert not screened.any()
+    assert means is None
+
+
+def test_only_confidently_poor_screened():
+    rng = np.random.default_rng(3)
+    prescreen = tools.surrogate.PreScreen(min_samples=30)
+    param_rows = rng.uniform(-1, 1, size=(60, 2))
+    prescreen.add_samples(param_rows, get_objs(param_rows))
+
+    # Poor, good, and poor but far from every sample
+    screened, means = prescreen.screen(
+        [[0.85, -0.85], [0.1, 0.1], [20.0, 20.0]]
+    )
+    assert screened.tolist() == [True, False, False]
+    assert np.allclose(means[0], get_objs([[0.85, -0.85]])[0], atol=0.2)
+    assert prescreen.stats()["screened"] == 1
+    assert prescreen.stats()["candidates"] == 3
@@ -0,0 +1,31 @@
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+import tools.tasks
+
+
+def test_task_table():
+    table = tools.tasks.TaskTable()
+    tasks = [tools.tasks.Task(task_id, [0.1, 0.02]) for task_id in range(4)]
+    for task in tasks:
+        table.add(task)
+
+    assert table.pop_ready(3) == tasks[:3]
+    table.start("engine1", tasks[:2])
+    table.start("engine2", tasks[2:3])
+    assert table.n_running("engine1") == 2
+
+    assert table.finish(tasks[0], {"obj": 1.0})
+    assert not table.finish(tasks[0], {"obj": 2.0})
+    table.stop("engine1", tasks[:1])
+
+    # The unfinished task of engine1 goes in front of the queue
+    assert table.remove_engine("engine1") == [tasks[1]]
+    assert table.n_running("engine1") == 0
+    assert table.pop_ready(4) == [tasks[1], tasks[3]]
+
+    for task in tasks[1:]:
+        table.finish(task, {"obj": 1.0})
+    assert table.is_done()
+    assert table.n_finished() == 4
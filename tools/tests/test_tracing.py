@@ -0,0 +1,49 @@
+import sys
+import json
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+import tools.tracing
+
+
+def test_disabled_tracer():
+    tracer = tools.tracing.Tracer("map", "a")
+    assert not tracer.enabled
+    tracer.add_span("wait", 1.0, 2.0)
+    tracer.add_async_span("request", 1.0, 2.0, "id")
+    assert tracer.events == []
+    tracer.close()
+
+
+def test_trace_export_and_merge(tmp_path):
+    map_tracer = tools.tracing.Tracer(
+        "map", "a", file_path=tmp_path / "map_a.trace.json"
+    )
+    engine_tracer = tools.tracing.Tracer(
+        "engine", "b", file_path=tmp_path / "engine_b.trace.json"
+    )
+    map_tracer.add_span("submit_tasks", 1.0, 1.5, engine="b")
+    map_tracer.export()
+    map_tracer.add_async_span("eval_batch", 1.5, 3.0, "request-1")
+    engine_tracer.name_thread(42, "worker 42")
+    engine_tracer.add_span("simulate", 2.0, 2.5, tid=42, task_id=0)
+    # The file of a running process is readable before it is closed
+    assert len(tools.tracing.read_trace_file(map_tracer.file_path)) == 2
+    map_tracer.close()
+    engine_tracer.close()
+
+    output_path = tmp_path / "trace.json"
+    tools.tracing.merge_trace_files(
+        [map_tracer.file_path, engine_tracer.file_path], output_path
+    )
+    events = json.loads(output_path.read_text())["traceEvents"]
+
+    phases = [event["ph"] for event in events]
+    assert phases == ["M", "X", "b", "e", "M", "M", "X"]
+    submit, begin, end = events[1:4]
+    assert (submit["ts"], submit["dur"]) == (1e6, 0.5e6)
+    assert submit["args"] == {"engine": "b"}
+    assert begin["id"] == end["id"] == "request-1"
+    assert (begin["ts"], end["ts"]) == (1.5e6, 3e6)
+    assert events[-1]["tid"] == 42
+    assert events[-1]["pid"] != submit["pid"]
@@ -0,0 +1,46 @@
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent.parent))
+import tools.wire
+
+
+def test_packed_round_trip():
+    packed = tools.wire.pack_dicts(
+        [7, 3], [{"b": 2.0, "a": 0.1}, {"a": 0.3, "b": 4}]
+    )
+    assert isinstance(packed["values"], bytes)
+    assert tools.wire.unpack_dicts(packed) == [
+        (7, {"a": 0.1, "b": 2.0}),
+        (3, {"a": 0.3, "b": 4.0}),
+    ]
+    # In the order of the caller's names
+    assert tools.wire.unpack_values(packed, ["b", "a"]) == [
+        [2.0, 0.1],
+        [4.0, 0.3],
+    ]
+    assert tools.wire.unpack_durations(packed) is None
+    assert tools.wire.unpack_failed(packed) == [False, False]
+    packed = tools.wire.pack_dicts(
+        [7, 3],
+        [{"a": 0.1}, {"a": 0.2}],
+        durations=[1.5, 2.0],
+        failed=[False, True],
+    )
+    assert tools.wire.unpack_durations(packed) == [1.5, 2.0]
+    assert tools.wire.unpack_failed(packed) == [False, True]
+
+    names, task_ids, values = tools.wire.unpack_rows(
+        tools.wire.pack_rows(["x"], [], [])
+    )
+    assert names == ["x"] and len(task_ids) == 0 and values.shape == (0, 1)
+    assert tools.wire.unpack_values(tools.wire.pack_dicts([], []), ["x"]) == []
+
+
+def test_choose_encoding():
+    assert tools.wire.choose_encoding(None) == tools.wire.LISTS_ENCODING
+    assert (
+        tools.wire.choose_encoding(["lists", "packed"])
+        == tools.wire.PACKED_ENCODING
+    )
+    assert tools.wire.choose_encoding(["other"]) == tools.wire.LISTS_ENCODING
@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import time
+import uuid
+import zlib
+import pathlib
+
+EXPORT_INTERVAL = 5.0  # seconds between writes of the trace file
+# Name of the optional "trace" parameter of the map, map_stream, eval and
+# eval_batch commands, peers announce that they accept it when they connect
+TRACE_PARAM = "trace"
+
+
+def from_env(component, instance_id):
+    """Tracer of a component, writing to OSPARC_TRACE_DIR if it is set."""
+
+    trace_dir = os.environ.get("OSPARC_TRACE_DIR")
+
+    return Tracer(
+        component,
+        instance_id,
+        file_path=(
+            pathlib.Path(trace_dir) / f"{component}_{instance_id}.trace.json"
+            if trace_dir
+            else None
+        ),
+    )
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+class Tracer:
+    """Spans of a process in the Chrome trace event format.
+
+    Times are in seconds since the epoch, so that the spans of processes on
+    different hosts line up. The events are appended to file_path as a JSON
+    array without its closing bracket, which chrome://tracing and Perfetto
+    load as it is, merge_trace_files combines the files of all processes.
+    A disabled tracer, without file_path, records nothing.
+    """
+
+    def __init__(self, component, instance_id, file_path=None):
+        """Constructor."""
+
+        self.file_path = file_path
+        self.enabled = file_path is not None
+        # Processes on different hosts can have the same pid
+        self.pid = zlib.crc32(f"{component}_{instance_id}".encode())
+        self.events = []
+        self.export_time = None
+
+        if self.enabled:
+            self.file_path.write_text("[\n")
+            self.add_metadata(
+                "process_name", {"name": f"{component} {instance_id}"}
+            )
+
+    def add_metadata(self, name, args, tid=0):
+        if not self.enabled:
+            return
+
+        self.events.append(
+            {
+                "name": name,
+                "ph": "M",
+                "pid": self.pid,
+                "tid": tid,
+                "args": args,
+            }
+        )
+
+    def name_thread(self, tid, name):
+        self.add_metadata("thread_name", {"name": name}, tid=tid)
+
+    def add_span(self, name, start, end, tid=0, **args):
+        """Record a span of thread tid, spans of a thread have to nest."""
+
+        if not self.enabled:
+            return
+
+        self.events.append(
+            {
+                "name": name,
+                "ph": "X",
+                "ts": 1e6 * start,
+                "dur": 1e6 * (end - start),
+                "pid": self.pid,
+                "tid": tid,
+                "args": args,
+            }
+        )
+
+    def add_async_span(self, name, start, end, span_id, **args):
+        """Record a span that can overlap others, e.g. of requests in
+        flight, span_id has to be unique among the spans of name."""
+
+        if not self.enabled:
+            return
+
+        event = {
+            "name": name,
+            "cat": name,
+            "id": str(span_id),
+            "pid": self.pid,
+        }
+        self.events.append(
+            {**event, "ph": "b", "ts": 1e6 * start, "args": args}
+        )
+        self.events.append({**event, "ph": "e", "ts": 1e6 * end})
+
+    def export(self, force=False):
+        """Append the new events to the trace file if EXPORT_INTERVAL
+        passed since the last write."""
+
+        if not self.enabled or len(self.events) == 0:
+            return
+
+        now = time.time()
+        if (
+            not force
+            and self.export_time is not None
+            and now - self.export_time < EXPORT_INTERVAL
+        ):
+            return
+        self.export_time = now
+
+        with open(self.file_path, "a") as trace_file:
+            trace_file.writelines(
+                json.dumps(event) + ",\n" for event in self.events
+            )
+        self.events = []
+
+    def close(self):
+        self.export(force=True)
+
+
+def read_trace_file(file_path):
+    text = pathlib.Path(file_path).read_text().rstrip().rstrip(",")
+    if not text.endswith("]"):
+        text += "]"
+
+    return json.loads(text)
+
+
+def merge_trace_files(file_paths, output_path):
+    """Combine the trace files of several processes into one trace."""
+
+    events = []
+    for file_path in file_paths:
+        events.extend(read_trace_file(file_path))
+
+    pathlib.Path(output_path).write_text(
+        json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+    )
+
+
+if __name__ == "__main__":
+    # e.g. python -m tools.tracing trace.json traces/*.trace.json
+    merge_trace_files(sys.argv[2:], sys.argv[1])
@@ -0,0 +1,118 @@
+import numpy as np
+
+# Rows of values as lists of (task_id, values) and dicts of names to values
+LISTS_ENCODING = "lists"
+# Rows of values as contiguous arrays, with a header of the value names
+PACKED_ENCODING = "packed"
+
+# In order of preference
+SUPPORTED_ENCODINGS = [PACKED_ENCODING, LISTS_ENCODING]
+
+
+def choose_encoding(remote_encodings):
+    """Return the preferred encoding that the remote side also supports.
+
+    Remotes that don't advertise encodings only support lists.
+    """
+
+    if remote_encodings is None:
+        return LISTS_ENCODING
+
+    for encoding in SUPPORTED_ENCODINGS:
+        if encoding in remote_encodings:
+            return encoding
+
+    return LISTS_ENCODING
+
+
+def pack_rows(names, task_ids, values):
+    """Pack a row of values per task id, in the order of names.
+
+    The arrays are sent as bytes, which msgpack carries without converting
+    every value.
+    """
+
+    values = np.ascontiguousarray(values, dtype="<f8").reshape(
+        len(task_ids), len(names)
+    )
+
+    return {
+        "names": list(names),
+        "task_ids": np.asarray(task_ids, dtype="<i8").tobytes(),
+        "values": values.tobytes(),
+    }
+
+
+def unpack_rows(packed):
+    """Return the names, task ids and a 2D array of values of packed."""
+
+    task_ids = np.frombuffer(packed["task_ids"], dtype="<i8")
+    values = np.frombuffer(packed["values"], dtype="<f8").reshape(
+        len(task_ids), len(packed["names"])
+    )
+
+    return packed["names"], task_ids, values
+
+
+def pack_dicts(task_ids, dicts, durations=None, failed=None):
+    """Pack dicts with the same keys, e.g. parameters or results.
+
+    The durations of the tasks, e.g. their evaluation times, and whether
+    their evaluations failed are packed as extra arrays when given.
+    """
+
+    names = sorted(dicts[0]) if len(dicts) != 0 else []
+
+    packed = pack_rows(
+        names,
+        task_ids,
+        [[values_dict[name] for name in names] for values_dict in dicts],
+    )
+    if durations is not None:
+        packed["durations"] = np.asarray(durations, dtype="<f8").tobytes()
+    if failed is not None:
+        packed["failed"] = np.asarray(failed, dtype=np.bool_).tobytes()
+
+    return packed
+
+
+def unpack_dicts(packed):
+    """Return a list of (task_id, dict of name to value) of packed."""
+
+    names, task_ids, values = unpack_rows(packed)
+
+    return [
+        (task_id, dict(zip(names, row)))
+        for task_id, row in zip(task_ids.tolist(), values.tolist())
+    ]
+
+
+def unpack_values(packed, names):
+    """Return the rows of values of packed as lists, in the order of
+    names."""
+
+    packed_names, task_ids, values = unpack_rows(packed)
+    if len(task_ids) == 0:
+        return []
+    columns = [packed_names.index(name) for name in names]
+
+    return values[:, columns].tolist()
+
+
+def unpack_durations(packed):
+    """Return the list of durations of packed, None if it has none."""
+
+    if "durations" not in packed:
+        return None
+
+    return np.frombuffer(packed["durations"], dtype="<f8").tolist()
+
+
+def unpack_failed(packed):
+    """Return whether the evaluation of every task of packed failed, none
+    did if it doesn't say."""
+
+    if "failed" not in packed:
+        return [False] * (len(packed["task_ids"]) // 8)
+
+    return np.frombuffer(packed["failed"], dtype=np.bool_).tolist()